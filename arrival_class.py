@@ -0,0 +1,154 @@
+import numpy as np
+
+##############################################
+# A class for estimating when each frame arrived from the time of a bulk read
+#
+# Reading the serial port one byte at a time lets every frame be stamped as it
+# completes, but costs a system call per byte.  With bulk reads many frames come
+# back from one read() and would all share its time stamp.  This class gives
+# each frame its own estimate:
+#
+#   1. Byte offsets.  The serial line carries bits_per_byte bits per byte (10
+#      for 8N1) at baud bits/s, so a frame that ended k bytes before the end of
+#      a read arrived about k*bits_per_byte/baud seconds before the read
+#      returned (0.26 ms per byte at 38400 8N1).
+#   2. TDMA cadence.  The nodes transmit in turn in fixed slots, so frame k
+#      arrives at about t0 + k*slot_period, and the rxId of a frame tells which
+#      slot it was sent in.  The raw times from step 1 are late by however long
+#      the bytes sat in the OS buffer before the read, but never early, so each
+#      is an upper bound.  The smoothed time is the schedule prediction (the
+#      previous frame's time plus the slots in between), pulled toward a later
+#      raw time by gain, and moved back to the raw time when the raw time is
+#      earlier than the prediction.  The slot period is learned from frames that
+#      ended on the last byte of a read, over spans of min_span_slots slots, or
+#      can be given.
+#
+# Without slot ids the slots between frames are rounded from the raw times once
+# the slot period is known, and frames are taken to be one slot apart before.
+# After a gap longer than max_gap_slots slots (e.g. the listen node was
+# unplugged) the schedule starts over from the raw time.
+class ArrivalEstimator:
+    # Constructor:
+
+    # baud - the serial baud rate
+    # bits_per_byte - bits on the line per byte (start + data + parity + stop)
+    # num_slots - slots in a TDMA cycle (maxNodes), for slot ids passed to stamp()
+    # slot_period - the time between slots (s), or None to learn it
+    # gain - how far the schedule moves toward a later raw time per frame
+    # period_gain - how fast the slot period follows the data once learned
+    # min_span_slots - slots between the frames used to measure the slot period
+    # max_gap_slots - gaps longer than this many slots restart the schedule
+
+    # byte_time - time on the line of one byte (s)
+    # last_time - the smoothed time of the previous frame (None before the first)
+    # last_slot - the slot id of the previous frame
+    # slot_count - slots counted since the schedule started
+    # ref_time, ref_count - raw time and slot_count of the frame the next slot
+    #                       period measurement starts at (None if none yet)
+    def __init__(self, baud=38400, bits_per_byte=10, num_slots=None, slot_period=None, gain=0.001,
+                 period_gain=0.1, min_span_slots=100, max_gap_slots=500):
+        self.byte_time = bits_per_byte/float(baud)
+        self.num_slots = num_slots
+        self.slot_period = slot_period
+        self.gain = gain
+        self.period_gain = period_gain
+        self.min_span_slots = min_span_slots
+        self.max_gap_slots = max_gap_slots
+
+        self.last_time = None
+        self.last_slot = None
+        self.slot_count = 0
+        self.ref_time = None
+        self.ref_count = None
+        self.num_frames = 0
+        self.num_restarts = 0
+
+    ############
+    # Methods
+    ############
+
+    # Return the raw arrival time of frames that ended at end_offsets (bytes
+    # from the start of a read of num_bytes bytes that returned at read_time)
+    def get_raw_times(self, read_time, num_bytes, end_offsets):
+        return read_time - (num_bytes - np.asarray(end_offsets, dtype=float))*self.byte_time
+
+    # Return the smoothed arrival time of each frame completed by a read.
+    # end_offsets is FrameParser.last_end_offsets for the data of that read and
+    # slot_ids the rxId of each frame (or None).
+    def stamp(self, read_time, num_bytes, end_offsets, slot_ids=None):
+        raw = self.get_raw_times(read_time, num_bytes, end_offsets)
+        out = np.zeros(raw.size)
+        for jj in range(raw.size):
+            tight = end_offsets[jj] == num_bytes
+            slot = None if slot_ids is None else slot_ids[jj]
+            out[jj] = self.__smooth(raw[jj], tight, slot)
+        return out
+
+    # Return the current slot period estimate (None until learned)
+    def get_period(self):
+        return self.slot_period
+
+    # Start over, e.g. after the serial port is reopened.  The slot period is kept.
+    def reset(self):
+        self.last_time = None
+        self.last_slot = None
+        self.ref_time = None
+        self.ref_count = None
+
+    # Return the number of slots between the previous frame and this one.  Only
+    # the raw time of a tight frame is trusted to show whole cycles with nothing
+    # heard; other raw times may be late by more than a cycle.
+    def __slots_since_last(self, raw, tight, slot):
+        P = self.slot_period
+        if slot is not None and self.last_slot is not None and self.num_slots:
+            d = (slot - self.last_slot) % self.num_slots
+            if d == 0:
+                d = self.num_slots
+            if P is not None and tight:
+                d += self.num_slots*max(0, int(round((raw - self.last_time - d*P)/(self.num_slots*P))))
+            return d
+        if P is not None:
+            return max(1, int(round((raw - self.last_time)/P)))
+        return 1
+
+    def __smooth(self, raw, tight, slot):
+        self.num_frames += 1
+        P = self.slot_period
+        restart = self.last_time is None or raw < self.last_time
+        if P is not None and not restart:
+            restart = raw - self.last_time > self.max_gap_slots*P
+
+        d = None if restart else self.__slots_since_last(raw, tight, slot)
+        if d is None:
+            if self.last_time is not None:
+                self.num_restarts += 1
+            self.slot_count = 0
+            self.ref_time = None
+            est = raw
+        else:
+            self.slot_count += d
+            if P is None:
+                est = raw
+            else:
+                pred = self.last_time + d*P
+                if raw <= pred:
+                    est = raw
+                else:
+                    est = pred + self.gain*(raw - pred)
+
+        # measure the slot period between frames that ended on the last byte of
+        # a read, whose raw times are the least delayed
+        if tight:
+            if self.ref_time is None:
+                self.ref_time, self.ref_count = raw, self.slot_count
+            elif self.slot_count - self.ref_count >= self.min_span_slots:
+                step = (raw - self.ref_time)/(self.slot_count - self.ref_count)
+                if P is None:
+                    self.slot_period = step
+                elif abs(step - P) < 0.2*P:
+                    self.slot_period = P + self.period_gain*(step - P)
+                self.ref_time, self.ref_count = raw, self.slot_count
+
+        self.last_time = est
+        self.last_slot = slot
+        return est
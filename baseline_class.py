@@ -0,0 +1,135 @@
+import numpy as np
+
+##############################################
+# A class for the baseline (no motion) RSS of every link at several time scales
+#
+# A myCircBuff needs buff_len samples of every link to give a mean, which is a
+# lot of memory for an hour long baseline.  This class keeps an exponentially
+# weighted mean and variance of every link for each time constant in
+# time_consts, so the state is num_scales x num_links no matter how long the
+# time constants are.
+#
+# The weights follow the time between measurements of a link, not the number of
+# lines: a link heard dt seconds after its previous measurement is updated with
+#
+#     a = 1 - exp(-dt/tau)
+#     mean += a*(x - mean)
+#     var = (1 - a)*(var + a*(x - mean_old)**2)
+#
+# so missed packets (127) just leave the link untouched, and a link that misses
+# many packets is not updated more slowly than one that misses none.  When no
+# times are given, each call counts as one time unit and the time constants are
+# in lines.
+#
+# The baseline can be frozen (e.g. while a detector reports motion) so a person
+# standing in the network is not learned into it.  The frozen time is skipped:
+# after unfreezing, the next update is weighted as if the freeze never
+# happened.
+class RssBaseline:
+    # Constructor:
+
+    # num_links - the number of links in each RSS vector
+    # time_consts - the time constants (s, or lines when no times are given)
+
+    # mean, var - num_scales x num_links.  nan until a link is first heard
+    # last_time - the time each link was last heard (or skipped while frozen)
+    # first_time - the time each link was first heard
+    # frozen - 1 while updates are suspended
+    def __init__(self, num_links, time_consts=(10., 60., 600., 3600.)):
+        self.num_links = num_links
+        self.time_consts = np.asarray(time_consts, dtype=float)
+        self.num_scales = self.time_consts.size
+
+        self.mean = np.nan*np.ones((self.num_scales, num_links))
+        self.var = np.zeros((self.num_scales, num_links))
+        self.last_time = np.nan*np.ones(num_links)
+        self.first_time = np.nan*np.ones(num_links)
+        self.frozen = 0
+        self.num_obs = 0
+
+    ############
+    # Methods - We assume that cur_rss is a numpy array of the links
+    ############
+
+    # Update the baseline with a new RSS vector taken at cur_time (s)
+    def observe(self, cur_rss, cur_time=None):
+        if cur_time is None:
+            cur_time = float(self.num_obs)
+        self.num_obs += 1
+
+        x = np.asarray(cur_rss, dtype=float)
+        heard = x != 127
+        known = ~np.isnan(self.last_time)
+        if self.frozen:
+            self.last_time[heard & known] = cur_time
+            return
+
+        first = heard & ~known
+        if np.any(first):
+            self.mean[:, first] = x[first]
+            self.var[:, first] = 0.
+            self.first_time[first] = cur_time
+            self.last_time[first] = cur_time
+
+        update = heard & known
+        if not np.any(update):
+            return
+
+        dt = np.maximum(cur_time - self.last_time[update], 0.)
+        a = 1. - np.exp(-dt.reshape(1, -1)/self.time_consts.reshape(-1, 1))
+        delta = x[update] - self.mean[:, update]
+        self.mean[:, update] += a*delta
+        self.var[:, update] = (1. - a)*(self.var[:, update] + a*delta**2)
+        self.last_time[update] = cur_time
+
+    # Stop (1) or resume (0) learning
+    def set_frozen(self, flag):
+        self.frozen = int(flag)
+
+    def freeze(self):
+        self.set_frozen(1)
+
+    def unfreeze(self):
+        self.set_frozen(0)
+
+    # returns a 1 if learning is suspended, 0 otherwise
+    def is_frozen(self):
+        return self.frozen
+
+    # Return the index of the time constant closest to tau
+    def get_scale_idx(self, tau):
+        return int(np.argmin(np.abs(self.time_consts - tau)))
+
+    # Return the baseline mean of each link at time scale idx (nan if never heard)
+    def get_mean(self, idx=0):
+        return self.mean[idx, :].copy()
+
+    # Return the baseline variance of each link at time scale idx
+    def get_var(self, idx=0):
+        return self.var[idx, :].copy()
+
+    # Return the baseline standard deviation of each link at time scale idx
+    def get_std(self, idx=0):
+        return np.sqrt(self.var[idx, :])
+
+    # Return the attenuation (baseline mean - current RSS) of each link at time
+    # scale idx.  Missed packets and links never heard give 0.
+    def get_attenuation(self, cur_rss, idx=0):
+        x = np.asarray(cur_rss, dtype=float)
+        atten = self.mean[idx, :] - x
+        atten[(x == 127) | np.isnan(atten)] = 0.
+        return atten
+
+    # Return a boolean vector of the links heard for at least one time
+    # constant at time scale idx, i.e. whose baseline has settled
+    def get_ready_links(self, idx=0):
+        span = self.last_time - self.first_time
+        return np.nan_to_num(span) >= self.time_consts[idx]
+
+    # Forget everything learned
+    def reset(self):
+        self.mean[:] = np.nan
+        self.var[:] = 0.
+        self.last_time[:] = np.nan
+        self.first_time[:] = np.nan
+        self.num_obs = 0
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+
+# This script compares ways of storing a recorded session: the text format
+# the listen scripts write, raw int8 (as in binary sessions), zlib (as gzip) of
+# both, and the RSS codec of codec_class.py.  For each it prints the size, the
+# compression ratio against text and raw int8, and the encode/decode
+# throughput in MB of raw int8 RSS per second (median of --repeat runs).  The
+# session is coded in blocks of --block-lines lines, like a recorder would, and
+# the codec output is checked against the input.
+#
+# Operation:
+#   python bench_codec.py data/rss_id1_2016_01_27_000.txt
+#   python bench_codec.py data/rss_id1_2016_01_27_000.rssd --block-lines 500 --max-lines 20000
+#   python bench_codec.py data/rss_id1_2016_01_27_000.rssc
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import sys
+import time
+import zlib
+import argparse
+import numpy as np
+import session_io as aSession
+import codec_class as aCodec
+
+# Return (rss, times) of a session as int8 and seconds
+def load_session(fname, max_lines):
+    if aSession.is_binary_session(fname):
+        session = aSession.BinarySession(fname)
+        return np.array(session.rss[:max_lines]), np.array(session.time[:max_lines])
+    if aSession.is_column_session(fname):
+        session = aSession.ColumnSession(fname)
+        num_lines = session.num_samples if max_lines is None else min(max_lines, session.num_samples)
+        return session.get_sample_range(np.arange(session.num_links), 0, num_lines)
+    reader = aSession.TextSessionReader(fname)
+    rss_all, times = reader.read_all()
+    return rss_all[:max_lines], reader.to_seconds(times[:max_lines])
+
+# Return the median time (s) of calling func() repeat times, and its last result
+def time_it(func, repeat):
+    secs = []
+    for ii in range(repeat):
+        t_start = time.time()
+        result = func()
+        secs.append(time.time() - t_start)
+    return float(np.median(secs)), result
+
+# Each format is a pair of functions: encode(blocks) -> list of bytes, and
+# decode(list of bytes) -> list of (rss, times)
+def text_encode(blocks):
+    out = []
+    for rss_block, times in blocks:
+        vals = np.column_stack((rss_block.astype(float), times))
+        fmt = ' '.join(['%d']*rss_block.shape[1] + ['%.3f'])
+        out.append(('\n'.join([fmt % tuple(row) for row in vals]) + '\n').encode('ascii'))
+    return out
+
+def text_decode(coded):
+    out = []
+    for data in coded:
+        num_lines = data.count(b'\n')
+        vals = np.fromstring(data, sep=' ').reshape(num_lines, -1)
+        out.append((vals[:, :-1].astype(np.int8), vals[:, -1]))
+    return out
+
+def raw_encode(blocks):
+    return [rss_block.tobytes() + times.tobytes() for rss_block, times in blocks]
+
+def raw_decode_for(num_links):
+    def raw_decode(coded):
+        out = []
+        for data in coded:
+            num_lines = len(data) // (num_links + 8)
+            rss_block = np.frombuffer(data, dtype=np.int8, count=num_lines*num_links).reshape(num_lines, num_links)
+            out.append((rss_block, np.frombuffer(data, dtype=np.float64, offset=num_lines*num_links)))
+        return out
+    return raw_decode
+
+def zlib_for(encode, decode, level):
+    def zlib_encode(blocks):
+        return [zlib.compress(data, level) for data in encode(blocks)]
+    def zlib_decode(coded):
+        return decode([zlib.decompress(data) for data in coded])
+    return zlib_encode, zlib_decode
+
+def codec_for(num_links):
+    def codec_encode(blocks):
+        encoder = aCodec.RssEncoder(num_links)
+        return [encoder.header()] + [encoder.encode(rss_block, times) for rss_block, times in blocks]
+    def codec_decode(coded):
+        return list(aCodec.RssDecoder().iter_blocks(b''.join(coded)))
+    return codec_encode, codec_decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the size and speed of RSS storage formats")
+    parser.add_argument("session", help="text session file or binary/columnar session directory")
+    parser.add_argument("--block-lines", type=int, default=1000, help="lines coded per block (default 1000)")
+    parser.add_argument("--max-lines", type=int, help="only use the first lines of the session")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (default 3)")
+    parser.add_argument("--level", type=int, default=6, help="zlib compression level (default 6)")
+    args = parser.parse_args()
+
+    rss_all, times = load_session(args.session, args.max_lines)
+    num_lines, num_links = rss_all.shape
+    if num_lines == 0:
+        sys.stderr.write('Error: no lines in ' + args.session + '\n')
+        return
+    blocks = [(rss_all[ii:ii+args.block_lines], times[ii:ii+args.block_lines])
+              for ii in range(0, num_lines, args.block_lines)]
+    raw_mb = rss_all.nbytes/1e6
+    sys.stderr.write('%d lines x %d links (%.1f%% missed), %d block(s)\n' %
+                     (num_lines, num_links, 100.*np.mean(rss_all == 127), len(blocks)))
+
+    raw_decode = raw_decode_for(num_links)
+    formats = [('text', text_encode, text_decode),
+               ('raw int8', raw_encode, raw_decode),
+               ('zlib text',) + zlib_for(text_encode, text_decode, args.level),
+               ('zlib int8',) + zlib_for(raw_encode, raw_decode, args.level),
+               ('codec',) + codec_for(num_links)]
+
+    sizes = {}
+    print('%-10s %12s %10s %10s %12s %12s' % ('format', 'bytes', 'vs text', 'vs int8', 'enc MB/s', 'dec MB/s'))
+    for name, encode, decode in formats:
+        enc_secs, coded = time_it(lambda: encode(blocks), args.repeat)
+        dec_secs, decoded = time_it(lambda: decode(coded), args.repeat)
+        sizes[name] = sum([len(data) for data in coded])
+        print('%-10s %12d %10.2f %10.2f %12.1f %12.1f' %
+              (name, sizes[name], sizes.get('text', sizes[name])/float(sizes[name]),
+               sizes.get('raw int8', sizes[name])/float(sizes[name]),
+               raw_mb/max(enc_secs, 1e-9), raw_mb/max(dec_secs, 1e-9)))
+
+        if name == 'codec':
+            rss_out = np.concatenate([rss_block for rss_block, t in decoded])
+            time_out = np.concatenate([t for rss_block, t in decoded])
+            if not np.array_equal(rss_out, rss_all) or np.max(np.abs(time_out - times)) > 1e-6:
+                sys.stderr.write('Error: the codec output does not match the session\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+
+# This script measures the start up (import) time of each module and entry
+# point script, so slow imports on the embedded boards can be spotted.  Each
+# measurement runs in a fresh interpreter.  The entry point scripts open the
+# serial port as soon as they run, so for those we time the imports at the top
+# of the script instead of running it.  Modules that are not installed on this
+# machine (e.g. Adafruit_BBIO off the BeagleBone) are reported and skipped.
+#
+# For every target it prints the median time over --repeat runs and which of
+# the heavy packages (scipy, matplotlib, serial) ended up loaded.
+#
+# Operation:
+#   python bench_startup.py
+#   python bench_startup.py --repeat 10 rss rti_class junk_mod.py
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import os
+import sys
+import ast
+import json
+import argparse
+import subprocess
+import numpy as np
+
+MODULES = ['rss', 'network_class_v1', 'rss_editor_class', 'circ_buff_class', 'circ_buff_class_v2',
+           'latency_class', 'metrics_class', 'framing_class', 'detector_class', 'rti_class',
+           'session_io', 'myPlotter']
+SCRIPTS = ['listenAllLinks.py', 'plot_any_link.py', 'plot_one_link.py', 'junk_mod.py', 'temp_listen.py']
+HEAVY = ['scipy', 'matplotlib', 'serial']
+
+# Run in the child interpreter: time the imports and report the result as json
+CHILD_CODE = """
+import sys, time, json
+heavy = %r
+t0 = time.time()
+missing = []
+for name in %r:
+    try:
+        __import__(name)
+    except ImportError as e:
+        missing.append(str(e))
+dt = time.time() - t0
+loaded = [h for h in heavy if h in sys.modules]
+sys.stdout.write(json.dumps({'secs': dt, 'loaded': loaded, 'missing': missing}))
+"""
+
+# Return the modules imported at the top level of a script
+def script_imports(fname):
+    f = open(fname, 'r')
+    tree = ast.parse(f.read(), fname)
+    f.close()
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+            names.append(node.module)
+    return names
+
+# Time importing names in a fresh interpreter.  Returns the child's json dict.
+def time_imports(names, repo_dir):
+    code = CHILD_CODE % (HEAVY, names)
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=repo_dir)
+    return json.loads(out.decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the start up time of each module and entry point")
+    parser.add_argument("targets", nargs='*', help="module names or script files (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per target (default 5)")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    targets = args.targets or (MODULES + SCRIPTS)
+
+    numpy_secs = np.median([time_imports(['numpy'], repo_dir)['secs'] for ii in range(args.repeat)])
+    sys.stdout.write('%-22s %9s  %s\n' % ('target', 'ms', 'heavy modules loaded'))
+    sys.stdout.write('%-22s %9.1f\n' % ('(numpy alone)', 1000*numpy_secs))
+
+    for target in targets:
+        if target.endswith('.py'):
+            names = script_imports(os.path.join(repo_dir, target))
+        else:
+            names = [target]
+
+        runs = [time_imports(names, repo_dir) for ii in range(args.repeat)]
+        secs = np.median([r['secs'] for r in runs])
+        loaded = ', '.join(runs[0]['loaded']) or '-'
+        sys.stdout.write('%-22s %9.1f  %s\n' % (target, 1000*secs, loaded))
+        for msg in runs[0]['missing']:
+            sys.stdout.write('%-22s %9s  not installed: %s\n' % ('', '', msg))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import sys
+import numpy as np
+
+##############################################
+# A class for choosing the most useful channels of every link line
+#
+# An aNetwork fixes its channels when it is built, so every link line is
+# processed on all num_ch_subset channels even though only a few of them are in
+# a useful fade state at any time.  This class keeps running statistics of every
+# link of the network (exponentially weighted mean, variance and missed packet
+# ratio, updated for all links at once) and every update_period samples ranks
+# the channels of each link line by one of these scores:
+#   'fade' - the fade level: the mean RSS of the channel minus the mean RSS of
+#            all channels of the link line.  Channels in anti-fade (high fade
+#            level) change the most predictably when a person crosses the link.
+#   'var'  - the RSS variance of the channel
+# Channels missing more than max_missed of their packets are ranked last.  When
+# a network uses both directions of a link line ('fb' or 'a'), the scores of the
+# two directions on a channel are averaged so both are kept or dropped together.
+#
+# The top_k channels of each link line make up the selected links.  They are
+# given as indexes into the full RSS line (get_indexes(), a subset of
+# master_indexes in the same order) and as positions in the network's subset
+# vector (get_positions(), e.g. to slice RssEditor.get_rss()), so the detection
+# and imaging stages only process top_k/num_ch_subset of the links.  After the
+# network's subset changes (aNetwork.update_subset()), remap() keeps the
+# statistics of the links that remain and selects again.
+class ChannelSelector:
+    # Constructor:
+
+    # network - an aNetwork object.  Its master_indexes are the candidate links
+    # top_k - the number of channels kept per link line (at most num_ch_subset)
+    # win_len - the effective window (in samples) of the running statistics
+    # score - 'fade' or 'var'
+    # max_missed - channels with a higher missed packet ratio are ranked last
+    # update_period - number of samples between selections
+
+    # line_of_link, ch_of_link - the link line and channel position (in ch_list)
+    #                            of every candidate link
+    # run_mean, run_var, run_missed - the running statistics of every candidate link
+    # num_obs - number of samples seen
+    # positions - the positions of the selected links in the subset vector
+    def __init__(self, network, top_k=4, win_len=100, score='fade', max_missed=0.5, update_period=100):
+        if score not in ['fade', 'var']:
+            sys.stderr.write('Error in ChannelSelector: score must be fade or var\n')
+        self.network = network
+        self.max_top_k = top_k
+        self.top_k = min(top_k, network.num_ch_subset)
+        self.win_len = win_len
+        self.score = score
+        self.max_missed = max_missed
+        self.update_period = update_period
+        self.alpha = 1.0/win_len
+
+        self.line_of_link = None
+        self.ch_of_link = None
+        self.num_lines = 0
+        self.__set_groups()
+
+        L = network.num_links_subset
+        self.run_mean = np.nan*np.ones(L)
+        self.run_var = np.zeros(L)
+        self.run_missed = np.zeros(L)
+        self.num_obs = 0
+
+        # use every link until there are statistics to rank them
+        self.positions = np.arange(L)
+
+    ############
+    # Methods - We assume that cur_rss is a numpy array of the network's links
+    #           (e.g. from RssEditor.get_rss())
+    ############
+
+    # Update the running statistics with a new RSS vector.  Returns 1 if the
+    # selected links changed.
+    def observe(self, cur_rss):
+        cur_rss = np.asarray(cur_rss, dtype=float)
+        missed = cur_rss == 127
+        heard = ~missed
+        a = self.alpha
+
+        self.run_missed += a*(missed - self.run_missed)
+
+        first = heard & np.isnan(self.run_mean)
+        self.run_mean[first] = cur_rss[first]
+        delta = cur_rss[heard] - self.run_mean[heard]
+        self.run_mean[heard] += a*delta
+        self.run_var[heard] = (1 - a)*(self.run_var[heard] + a*delta**2)
+
+        self.num_obs += 1
+        if (self.num_obs >= self.win_len) and (self.num_obs % self.update_period == 0):
+            return self.select()
+        return 0
+
+    # Rank the channels of every link line and keep the top_k.  Returns 1 if
+    # the selected links changed.
+    def select(self):
+        link_score = self.get_scores()
+        num_ch = self.network.num_ch_subset
+
+        # average the directions of each (link line, channel)
+        group = self.line_of_link*num_ch + self.ch_of_link
+        group_score = (np.bincount(group, weights=link_score, minlength=self.num_lines*num_ch) /
+                       np.maximum(np.bincount(group, minlength=self.num_lines*num_ch), 1))
+        group_score = group_score.reshape(self.num_lines, num_ch)
+
+        # top_k channels of each link line
+        order = np.argsort(-group_score, axis=1, kind='mergesort')
+        keep = np.zeros((self.num_lines, num_ch), dtype=bool)
+        keep[np.arange(self.num_lines).reshape(-1, 1), order[:, :self.top_k]] = True
+
+        new_positions = np.nonzero(keep[self.line_of_link, self.ch_of_link])[0]
+        changed = int(new_positions.size != self.positions.size or np.any(new_positions != self.positions))
+        self.positions = new_positions
+        return changed
+
+    # Call after network.update_subset() with the (old_pos, new_pos) it
+    # returned.  The statistics of link old_pos[i] move to link new_pos[i]; the
+    # other links of the new subset start with none.  Returns 1 if the selected
+    # links changed, like observe().
+    def remap(self, old_pos, new_pos):
+        L = self.network.num_links_subset
+        self.top_k = min(self.max_top_k, self.network.num_ch_subset)
+        self.__set_groups()
+
+        run_mean = np.nan*np.ones(L)
+        run_var = np.zeros(L)
+        run_missed = np.zeros(L)
+        run_mean[new_pos] = self.run_mean[old_pos]
+        run_var[new_pos] = self.run_var[old_pos]
+        run_missed[new_pos] = self.run_missed[old_pos]
+        self.run_mean = run_mean
+        self.run_var = run_var
+        self.run_missed = run_missed
+
+        if self.num_obs >= self.win_len:
+            self.positions = np.zeros(0, dtype=int)
+            return self.select()
+        self.positions = np.arange(L)
+        return 1
+
+    # Return the score of every candidate link (higher is better)
+    def get_scores(self):
+        mean = np.where(np.isnan(self.run_mean), -np.inf, self.run_mean)
+        if self.score == 'fade':
+            heard = np.isfinite(mean)
+            line_sum = np.bincount(self.line_of_link[heard], weights=mean[heard], minlength=self.num_lines)
+            line_count = np.bincount(self.line_of_link[heard], minlength=self.num_lines)
+            line_mean = line_sum/np.maximum(line_count, 1)
+            link_score = mean - line_mean[self.line_of_link]
+        else:
+            link_score = 1.0*self.run_var
+
+        # rank unreliable channels last, but still in order among themselves
+        bad = (self.run_missed > self.max_missed) | ~np.isfinite(link_score)
+        link_score = np.where(np.isfinite(link_score), link_score, -1e6)
+        link_score[bad] -= 1e9
+        return link_score
+
+    # Return the selected links as indexes into the full RSS line
+    def get_indexes(self):
+        return self.network.master_indexes[self.positions]
+
+    # Return the positions of the selected links in the network's subset vector
+    def get_positions(self):
+        return 1*self.positions
+
+    # Return the fraction of the network's links that are selected
+    def get_fraction(self):
+        return self.positions.size/float(self.network.num_links_subset)
+
+    # Find the link line and channel of every candidate link
+    def __set_groups(self):
+        link_info = self.network.link_ch_database[self.network.master_indexes, :]
+        tx = np.minimum(link_info[:, 1], link_info[:, 2])
+        rx = np.maximum(link_info[:, 1], link_info[:, 2])
+        unique_codes, self.line_of_link = np.unique(tx*(self.network.num_nodes_all+1) + rx, return_inverse=True)
+        self.num_lines = unique_codes.size
+
+        ch_list = np.asarray(self.network.ch_list).tolist()
+        self.ch_of_link = np.array([ch_list.index(ch) for ch in link_info[:, 3]], dtype=int)
@@ -1,7 +1,7 @@
 #An example of a class
 
+import warnings
 import numpy as np
-from scipy import stats
 
 #
 # Author: Peter Hillyard
@@ -17,20 +17,24 @@ class myCircBuff:
     # C:        The matrix that will act as our circular buffer
     # num_obs:  number of observations in the circular buffer
     # open_idx: the index where we can add the next observation
+    # T:        the receive time of each observation (nan if not given)
     def __init__(self,buff_len_,num_obs_):
         self.B = buff_len_
         self.L = num_obs_
         self.C = np.nan*np.ones((num_obs_,buff_len_))
+        self.T = np.nan*np.ones(buff_len_)
         self.num_obs = 0
         self.open_idx = 0
         self.prev_med = np.nan*np.ones(num_obs_)
 
-    # Adds a new observation to the circular buffer
-    def add_observation(self,obs_):
+    # Adds a new observation to the circular buffer.  time_ is the receive
+    # time of the observation
+    def add_observation(self,obs_,time_=np.nan):
         # Overwrite the oldest observation with the current observation
         # Update the index of the open index
         # Increment the number of values in the buffer as needed
         self.C[:,self.open_idx] = obs_
+        self.T[self.open_idx] = time_
         self.open_idx = (self.open_idx+1) % self.B
         self.num_obs = np.minimum(self.B,self.num_obs+1)
 
@@ -87,13 +91,13 @@ class myCircBuff:
     def get_median(self):
         tmp = 1*self.C
         tmp[tmp == 127] = np.nan
-        return stats.nanmedian(tmp,axis=1)
+        return self.my_nanmedian(tmp)
     
     # Get the median of the buffer.  If nans appear, use the previous median value.
     def get_no_nan_median(self):
         tmp = 1*self.C
         tmp[tmp == 127] = np.nan
-        cur_med = stats.nanmedian(tmp,axis=1)
+        cur_med = self.my_nanmedian(tmp)
         
         if np.sum(np.isnan(cur_med)) > 0:
             cur_med_is_not_nan_idx = np.logical_not(np.isnan(cur_med))
@@ -116,8 +120,8 @@ class myCircBuff:
     
     # return the mode of the buffer.
     def get_mode(self):
-        vals,counts = stats.stats.mode(self.C,axis=1)
-        return vals[0,0]
+        vals,counts = np.unique(self.C[0,:],return_counts=True)
+        return vals[np.argmax(counts)]
     
     # return the entire buffer as is
     def get_buffer(self):
@@ -126,6 +130,10 @@ class myCircBuff:
     # return the entire buffer in the order they were added
     def get_ordered_buffer(self):
         return 1*(np.append(self.C[:,self.open_idx:],self.C[:,0:self.open_idx],1))
+
+    # return the receive times in the order they were added
+    def get_ordered_times(self):
+        return np.append(self.T[self.open_idx:],self.T[0:self.open_idx])
     
     # return the mean of the buffer.  This converts 127 values to nans and we 
     # compute the mean excluding the nans
@@ -141,9 +149,23 @@ class myCircBuff:
     # reset this buffer to have nothing in it
     def reset_buffer(self):
         self.C = np.nan*np.ones((self.L,self.B))
+        self.T = np.nan*np.ones(self.B)
         self.num_obs = 0
         self.open_idx = 0
 
+    # Change the number of rows (links) to new_num_rows, keeping the history of
+    # the links that remain.  Row old_rows[i] moves to row new_rows[i]; the
+    # other new rows start empty (nan).
+    def remap_rows(self,old_rows,new_rows,new_num_rows):
+        new_C = np.nan*np.ones((new_num_rows,self.B))
+        new_C[new_rows,:] = self.C[old_rows,:]
+        new_prev_med = np.nan*np.ones(new_num_rows)
+        new_prev_med[new_rows] = self.prev_med[old_rows]
+
+        self.C = new_C
+        self.prev_med = new_prev_med
+        self.L = new_num_rows
+
     # Couldn't load nanvar, so I wrote my own
     def my_nanvar(self,my_mat):
         nrows,ncols = my_mat.shape
@@ -155,6 +177,13 @@ class myCircBuff:
         
         return tmp_var
     
+    # Compute the median of each row, excluding nans.  Rows with only nans give
+    # nan.  This keeps the buffer free of scipy.stats, which is slow to import.
+    def my_nanmedian(self,my_mat):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmedian(my_mat,axis=1)
+    
     # Compute the product of the elements per row
     def get_per_row_prod(self):
         return np.prod(self.C,axis=1)
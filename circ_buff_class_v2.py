@@ -1,7 +1,7 @@
 #An example of a class
 
+import warnings
 import numpy as np
-from scipy import stats
 
 #
 # Author: Peter Hillyard
@@ -102,13 +102,13 @@ class myCircBuff:
     def get_median(self):
         tmp = 1*self.C
         tmp[tmp == 127] = np.nan
-        return stats.nanmedian(tmp,axis=1)
+        return self.my_nanmedian(tmp)
     
     # Get the median of the buffer.  If nans appear, use the previous median value.
     def get_no_nan_median(self):
         tmp = 1*self.C
         tmp[tmp == 127] = np.nan
-        cur_med = stats.nanmedian(tmp,axis=1)
+        cur_med = self.my_nanmedian(tmp)
         
         if np.sum(np.isnan(cur_med)) > 0:
             cur_med_is_not_nan_idx = np.logical_not(np.isnan(cur_med))
@@ -131,8 +131,8 @@ class myCircBuff:
     
     # return the mode of the buffer.
     def get_mode(self):
-        vals,counts = stats.stats.mode(self.C,axis=1)
-        return vals[0,0]
+        vals,counts = np.unique(self.C[0,:],return_counts=True)
+        return vals[np.argmax(counts)]
     
     # return the entire buffer as is
     def get_buffer(self):
@@ -159,6 +159,24 @@ class myCircBuff:
         self.num_obs = 0
         self.open_idx = 0
 
+    # Change the number of rows (links) to new_num_rows, keeping the history of
+    # the links that remain.  Row old_rows[i] moves to row new_rows[i]; the
+    # other new rows start empty (nan) at column 0.
+    def remap_rows(self,old_rows,new_rows,new_num_rows):
+        new_C = np.nan*np.ones((new_num_rows,self.B))
+        new_C[new_rows,:] = self.C[old_rows,:]
+        new_prev_med = np.nan*np.ones(new_num_rows)
+        new_prev_med[new_rows] = self.prev_med[old_rows]
+        if isinstance(self.open_idx, np.ndarray):
+            new_open_idx = np.zeros((new_num_rows,1),dtype=int)
+            new_open_idx[new_rows] = self.open_idx[old_rows]
+            self.open_idx = new_open_idx
+
+        self.C = new_C
+        self.prev_med = new_prev_med
+        self.L = new_num_rows
+        self.row_idx = np.reshape(np.arange(new_num_rows), (-1, 1))
+
     # Couldn't load nanvar, so I wrote my own
     def my_nanvar(self,my_mat):
         nrows,ncols = my_mat.shape
@@ -170,6 +188,13 @@ class myCircBuff:
         
         return tmp_var
     
+    # Compute the median of each row, excluding nans.  Rows with only nans give
+    # nan.  This keeps the buffer free of scipy.stats, which is slow to import.
+    def my_nanmedian(self,my_mat):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmedian(my_mat,axis=1)
+    
     # Compute the product of the elements per row
     def get_per_row_prod(self):
         return np.prod(self.C,axis=1)
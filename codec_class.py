@@ -0,0 +1,239 @@
+import struct
+import numpy as np
+
+##############################################
+# A streaming codec for sequences of RSS lines
+#
+# Recorded RSS is int8, changes slowly on each link and has many 127s for the
+# links not heard in a line.  A block of lines is coded link by link (the lines
+# of a block transposed, so each link's values are next to each other):
+#   - which values are 127 is run-length coded: the lengths of the alternating
+#     runs of heard and missed values, starting with a (maybe empty) heard run
+#   - each heard value is coded as the difference from the previous heard value
+#     of the same link, carried over from block to block
+#   - the time stamps (optional) are coded as differences in microseconds
+# The run lengths and differences (zigzag mapped to unsigned) are bit-packed in
+# groups of GROUP_LEN values, each group with the fewest bits that hold its
+# largest value.  Everything is done with array operations on the whole block.
+#
+# A stream is the header from RssEncoder.header() followed by the blocks from
+# RssEncoder.encode().  Time stamps are rounded to 1 us, the RSS is lossless.
+
+MAGIC = b'RSSZ'
+VERSION = 1
+GROUP_LEN = 64
+HEADER_FMT = '<4sBI'
+BLOCK_FMT = '<IIB'
+
+
+class RssEncoder:
+    # Constructor:
+
+    # num_links - number of links per line
+
+    # prev_rss - the last heard RSS of each link (0 before the first)
+    # prev_time - the last time stamp coded (us)
+    def __init__(self, num_links):
+        self.num_links = num_links
+        self.prev_rss = np.zeros(num_links, dtype=np.int32)
+        self.prev_time = 0
+        self.num_lines = 0
+
+    ############
+    # Methods
+    ############
+
+    # Return the stream header
+    def header(self):
+        return struct.pack(HEADER_FMT, MAGIC, VERSION, self.num_links)
+
+    # Return the coded bytes of a block of lines (lines x num_links, 127 for a
+    # missed packet) and their times (s, or None)
+    def encode(self, rss_block, times=None):
+        rss_block = np.asarray(rss_block, dtype=np.int8)
+        num_lines = rss_block.shape[0]
+        cols = rss_block.T.astype(np.int32)
+        heard = (cols != 127).ravel()
+
+        # run lengths of heard / missed values, starting with a heard run
+        change = np.nonzero(heard[1:] != heard[:-1])[0] + 1
+        bounds = np.concatenate(([0], change, [heard.size]))
+        runs = np.diff(bounds)
+        if heard.size > 0 and not heard[0]:
+            runs = np.concatenate(([0], runs))
+
+        # differences from the previous heard value of each link
+        link_of = np.nonzero(heard)[0] // num_lines
+        vals = cols.ravel()[heard]
+        prev = np.empty_like(vals)
+        prev[1:] = vals[:-1]
+        first = np.ones(vals.size, dtype=bool)
+        first[1:] = link_of[1:] != link_of[:-1]
+        prev[first] = self.prev_rss[link_of[first]]
+        deltas = vals - prev
+        last = np.ones(vals.size, dtype=bool)
+        last[:-1] = link_of[1:] != link_of[:-1]
+        self.prev_rss[link_of[last]] = vals[last]
+
+        parts = [pack_uints(runs), pack_uints(zigzag(deltas))]
+        has_times = int(times is not None)
+        if has_times:
+            t_us = np.round(np.asarray(times, dtype=float)*1e6).astype(np.int64)
+            t_deltas = np.diff(np.concatenate(([self.prev_time], t_us)))
+            if t_us.size > 0:
+                self.prev_time = int(t_us[-1])
+            parts.append(pack_uints(zigzag(t_deltas)))
+
+        self.num_lines += num_lines
+        payload = b''.join(parts)
+        return struct.pack(BLOCK_FMT, len(payload), num_lines, has_times) + payload
+
+
+class RssDecoder:
+    # Constructor:
+
+    # num_links - number of links per line (None to read it from the header)
+
+    # prev_rss - the last heard RSS of each link (0 before the first)
+    # prev_time - the last time stamp decoded (us)
+    def __init__(self, num_links=None):
+        self.num_links = num_links
+        self.prev_rss = None
+        self.prev_time = 0
+        if num_links is not None:
+            self.prev_rss = np.zeros(num_links, dtype=np.int32)
+
+    ############
+    # Methods
+    ############
+
+    # Read the stream header from bytes.  Returns the number of bytes used.
+    def read_header(self, data):
+        magic, version, num_links = struct.unpack_from(HEADER_FMT, data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not an RSS codec stream (version ' + str(VERSION) + ')')
+        self.num_links = num_links
+        self.prev_rss = np.zeros(num_links, dtype=np.int32)
+        return struct.calcsize(HEADER_FMT)
+
+    # Decode one block (as returned by RssEncoder.encode()) from data at pos.
+    # Returns (rss, times, next_pos); times is None if the block has none.
+    def decode(self, data, pos=0):
+        payload_len, num_lines, has_times = struct.unpack_from(BLOCK_FMT, data, pos)
+        pos += struct.calcsize(BLOCK_FMT)
+        end = pos + payload_len
+        runs, pos = unpack_uints(data, pos)
+        zz, pos = unpack_uints(data, pos)
+
+        # the heard mask, link by link: it flips at the end of every run (only
+        # the first run can be empty, so the run ends are distinct)
+        flips = np.zeros(self.num_links*num_lines, dtype=bool)
+        run_ends = np.cumsum(runs.astype(np.int64))[:-1]
+        flips[run_ends[run_ends < flips.size]] = True
+        heard = ~np.logical_xor.accumulate(flips)
+        link_of = np.nonzero(heard)[0] // num_lines
+
+        # running sums of the differences within each link: the first
+        # difference of a link also removes the last value of the link before
+        # it, so one running sum over the block gives the values
+        deltas = unzigzag(zz)
+        first = np.ones(deltas.size, dtype=bool)
+        first[1:] = link_of[1:] != link_of[:-1]
+        starts = np.nonzero(first)[0]
+        deltas[starts] += self.prev_rss[link_of[starts]]
+        if starts.size > 1:
+            deltas[starts[1:]] -= np.add.reduceat(deltas, starts)[:-1]
+        vals = np.cumsum(deltas)
+        last = np.ones(vals.size, dtype=bool)
+        last[:-1] = link_of[1:] != link_of[:-1]
+        self.prev_rss[link_of[last]] = vals[last]
+
+        cols = 127*np.ones(self.num_links*num_lines, dtype=np.int8)
+        cols[heard] = vals
+        rss_block = cols.reshape(self.num_links, num_lines).T.copy()
+
+        times = None
+        if has_times:
+            t_zz, pos = unpack_uints(data, pos)
+            t_us = self.prev_time + np.cumsum(unzigzag(t_zz))
+            if t_us.size > 0:
+                self.prev_time = int(t_us[-1])
+            times = t_us/1e6
+        return rss_block, times, end
+
+    # Yield (rss, times) for the blocks of a whole stream in data
+    def iter_blocks(self, data):
+        pos = self.read_header(data)
+        while pos < len(data):
+            rss_block, times, pos = self.decode(data, pos)
+            yield rss_block, times
+
+
+# Map signed to unsigned integers: 0, -1, 1, -2, 2, ... -> 0, 1, 2, 3, 4, ...
+def zigzag(vals):
+    vals = np.asarray(vals, dtype=np.int64)
+    return ((vals << 1) ^ (vals >> 63)).astype(np.uint64)
+
+def unzigzag(vals):
+    vals = np.asarray(vals, dtype=np.uint64)
+    return (vals >> np.uint64(1)).astype(np.int64) ^ -((vals & np.uint64(1)).astype(np.int64))
+
+# Return the number of bits needed for each (unsigned) value
+def bit_widths(vals):
+    return np.frexp(np.asarray(vals, dtype=float))[1]
+
+# Return the smallest unsigned type with w bits
+def uint_type(w):
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if w <= 8*np.dtype(dtype).itemsize:
+            return dtype
+    return np.uint64
+
+# Return the width of the group of each of num_vals values
+def value_widths(widths, num_vals):
+    return np.repeat(widths, GROUP_LEN)[:num_vals]
+
+# Bit-pack unsigned integers: the number of values (uint32), the bit width of
+# each group of GROUP_LEN values (uint8), then for each width in increasing
+# order the bits of all values of the groups with that width, most significant
+# bit first
+def pack_uints(vals):
+    vals = np.asarray(vals, dtype=np.uint64)
+    if vals.size == 0:
+        return struct.pack('<I', 0)
+    widths = bit_widths(np.maximum.reduceat(vals, np.arange(0, vals.size, GROUP_LEN))).astype(np.uint8)
+    val_widths = value_widths(widths, vals.size)
+    parts = [struct.pack('<I', vals.size), widths.tobytes()]
+    for w in np.unique(widths).tolist():
+        if w == 0:
+            continue
+        be_type = np.dtype(uint_type(w)).newbyteorder('>')
+        sel = vals[val_widths == w].astype(be_type)
+        bits = np.unpackbits(sel.view(np.uint8)).reshape(sel.size, 8*be_type.itemsize)
+        parts.append(np.packbits(bits[:, 8*be_type.itemsize-w:].ravel()).tobytes())
+    return b''.join(parts)
+
+# Unpack values written by pack_uints() from data at pos.  Returns (vals, next_pos)
+def unpack_uints(data, pos):
+    num_vals = struct.unpack_from('<I', data, pos)[0]
+    pos += 4
+    vals = np.zeros(num_vals, dtype=np.uint64)
+    if num_vals == 0:
+        return vals, pos
+    num_groups = (num_vals + GROUP_LEN - 1) // GROUP_LEN
+    widths = np.frombuffer(data, dtype=np.uint8, count=num_groups, offset=pos)
+    pos += num_groups
+    val_widths = value_widths(widths, num_vals)
+    for w in np.unique(widths).tolist():
+        if w == 0:
+            continue
+        sel = val_widths == w
+        count = int(np.sum(sel))
+        num_bytes = (count*w + 7) // 8
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=num_bytes, offset=pos))[:count*w].reshape(count, w)
+        be_type = np.dtype(uint_type(w)).newbyteorder('>')
+        padded = np.zeros((count, 8*be_type.itemsize), dtype=np.uint8)
+        padded[:, 8*be_type.itemsize-w:] = bits
+        vals[sel] = np.packbits(padded.ravel()).view(be_type)
+        pos += num_bytes
+    return vals, pos
@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+# This script converts a directory of text RSS sessions (rss_*.txt, as written
+# by junk_mod.py or listenAllLinks.py) into binary sessions (see session_io.py)
+# using a pool of worker processes, one file per task.  Each file is parsed in
+# large vectorized chunks.  Files that were already converted (same size and
+# modification time as recorded in the binary session) are skipped, so the
+# script can be re-run on a growing directory.
+#
+# With --columnar the sessions are written as columnar sessions (<name>.rssc),
+# where each link is stored contiguously in chunks of --chunk-len lines, for
+# queries on a few links over a long time.
+#
+# Operation:
+#   python convert_sessions.py /root/spencer/clinical_data
+#   python convert_sessions.py data_dir --out-dir bin_dir --jobs 4 --channels 11,12,13,14,15,16,17,18,19,20,21,22,23,24,25,26
+#   python convert_sessions.py data_dir --columnar --chunk-len 4096
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+# Version 1.1:  Columnar sessions
+
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing
+import session_io as aSession
+
+# The channels programmed on the nodes, used to work out the number of nodes
+# from the number of links when --channels is not given
+DEFAULT_CHANNEL_LIST = [11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26]
+
+# Return 1 if fname has already been converted to out_name
+def is_converted(fname, out_name):
+    if not os.path.isfile(os.path.join(out_name, 'meta.json')):
+        return 0
+    meta = aSession.read_meta(out_name)
+    st = os.stat(fname)
+    return int(meta.get('source_size') == st.st_size and meta.get('source_mtime') == st.st_mtime)
+
+# Convert one text session.  Returns (fname, status, num_bytes, num_samples, seconds)
+def convert_one(task):
+    fname, out_name, channel_list, chunk_bytes, chunk_len = task
+    t_start = time.time()
+    st = os.stat(fname)
+
+    if is_converted(fname, out_name):
+        return (fname, 'skipped', 0, 0, 0.)
+
+    reader = aSession.TextSessionReader(fname, chunk_bytes)
+    if reader.num_links is None:
+        return (fname, 'empty', st.st_size, 0, time.time() - t_start)
+
+    meta = {'source': os.path.basename(fname),
+            'source_size': st.st_size,
+            'source_mtime': st.st_mtime,
+            'time_format': reader.time_format,
+            'time_units': 's',
+            'start_time': None if reader.start_time is None else str(reader.start_time),
+            'channel_list': channel_list,
+            'num_nodes': aSession.infer_num_nodes(reader.num_links, len(channel_list))}
+
+    if chunk_len:
+        writer = aSession.ColumnSessionWriter(out_name, reader.num_links, chunk_len, meta)
+    else:
+        writer = aSession.BinarySessionWriter(out_name, reader.num_links, meta)
+    for rss_block, time_block in reader.iter_chunks():
+        writer.write(rss_block, reader.to_seconds(time_block))
+    writer.close()
+
+    return (fname, 'converted', st.st_size, writer.num_samples, time.time() - t_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert text RSS sessions to binary sessions")
+    parser.add_argument("in_dir", help="directory with the text sessions")
+    parser.add_argument("--pattern", default="rss_*.txt", help="file name pattern (default rss_*.txt)")
+    parser.add_argument("--out-dir", help="directory for the binary sessions (default: in_dir)")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    parser.add_argument("--channels", help="comma separated channel list programmed on the nodes")
+    parser.add_argument("--chunk-mb", type=float, default=8., help="MB of text parsed per chunk (default 8)")
+    parser.add_argument("--columnar", action="store_true", help="write columnar sessions (.rssc) instead of binary sessions (.rssd)")
+    parser.add_argument("--chunk-len", type=int, default=aSession.DEFAULT_CHUNK_LEN, help="lines per chunk of a columnar session (default %d)" % aSession.DEFAULT_CHUNK_LEN)
+    args = parser.parse_args()
+
+    if args.channels:
+        channel_list = [int(c) for c in args.channels.split(',')]
+    else:
+        channel_list = DEFAULT_CHANNEL_LIST
+
+    out_dir = args.out_dir or args.in_dir
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    file_list = sorted(glob.glob(os.path.join(args.in_dir, args.pattern)))
+    ext = aSession.COLUMN_EXT if args.columnar else aSession.BINARY_EXT
+    chunk_len = args.chunk_len if args.columnar else 0
+    tasks = [(fname, aSession.binary_name_for(fname, out_dir, ext), channel_list, int(args.chunk_mb*1024*1024), chunk_len)
+             for fname in file_list]
+    sys.stderr.write('Converting ' + str(len(tasks)) + ' file(s) with ' + str(args.jobs) + ' process(es)\n')
+
+    t_start = time.time()
+    total_bytes = 0
+    num_converted = 0
+    num_skipped = 0
+    pool = multiprocessing.Pool(args.jobs)
+    for fname, status, num_bytes, num_samples, secs in pool.imap_unordered(convert_one, tasks):
+        total_bytes += num_bytes
+        if status == 'converted':
+            num_converted += 1
+            sys.stderr.write('%s: %d samples, %.1f MB in %.2f s (%.1f MB/s)\n' %
+                             (os.path.basename(fname), num_samples, num_bytes/1e6, secs, num_bytes/1e6/max(secs, 1e-9)))
+        elif status == 'skipped':
+            num_skipped += 1
+        else:
+            sys.stderr.write('%s: %s\n' % (os.path.basename(fname), status))
+    pool.close()
+    pool.join()
+
+    secs = time.time() - t_start
+    sys.stderr.write('Done: %d converted, %d skipped, %.1f MB in %.2f s (%.1f MB/s)\n' %
+                     (num_converted, num_skipped, total_bytes/1e6, secs, total_bytes/1e6/max(secs, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
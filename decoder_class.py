@@ -0,0 +1,227 @@
+import numpy as np
+import rss as rss
+
+##############################################
+# A class for turning frames from the listen node into lines of RSS
+#
+# The listen scripts decode every frame in Python: for every tx they look up the
+# channel with prevChannel(), the link number with linkNumForTxRxChLists() and
+# store the RSS in a list, and they start a new line (and emit the old one) when
+# a link that already has an RSS in the current line is stored again.
+#
+# This class does the same for a whole batch of frames with a few NumPy
+# operations:
+#   - the frames are viewed as a structured array (header, rxId, int8 RSS per
+#     tx, channel, trailer) with np.frombuffer, without copying
+#   - the link number of every (rx, channel, tx) is read from a table built once
+#     from linkNumForTxRxChLists() and prevChannel(), so the channel rules are
+#     exactly those of the scripts
+#   - the stores of the batch are flattened in the order the scripts make them,
+#     the positions where a new line starts are found with a sort per line, and
+#     each line is scattered into a preallocated int8 buffer
+# The lines and their receive times are the same as the scripts produce.
+#
+# decode_sparse() returns each line as the (link, RSS) pairs of the links heard
+# in it instead, and only resets the links stored in the line, so its work
+# grows with the packets received rather than with the number of links.
+class FrameDecoder:
+    # Constructor:
+
+    # max_nodes - the number of nodes the sensors are programmed with
+    # node_list - the node ids to decode (starting at 1)
+    # channel_list - the channels programmed on the nodes, in the order they are measured
+    # metrics - an optional MetricsRegistry.  rss_frames_filtered_node_total and
+    #           rss_frames_filtered_channel_total are updated when given.
+
+    # num_links - number of links in a line
+    # frame_dtype - the structured type of one frame
+    # link_table - link number for [rx_enum, ch_enum, tx_enum], -1 if tx == rx
+    # line_buf - the int8 line being filled, 127 for links not stored yet
+    # line_oldest_time, line_newest_time - receive times of the first and the
+    #                                      last frame stored in line_buf
+    # line_stores - the link numbers stored in line_buf, one array per store
+    def __init__(self, max_nodes, node_list, channel_list, metrics=None):
+        self.max_nodes = max_nodes
+        self.node_list = list(node_list)
+        self.channel_list = list(channel_list)
+        self.rss_index = 3
+
+        num_nodes = len(self.node_list)
+        num_ch = len(self.channel_list)
+        self.num_links = num_nodes*(num_nodes-1)*num_ch
+
+        self.frame_dtype = np.dtype([('header', np.uint8, 2), ('rx', np.uint8), ('rss', np.int8, max_nodes),
+                                     ('ch', np.uint8), ('pad', np.uint8), ('trailer', np.uint8, 2)])
+        self.frame_len = self.frame_dtype.itemsize
+
+        # byte value -> position in node_list / channel_list (-1 if absent)
+        self.node_enum = -np.ones(256, dtype=int)
+        self.node_enum[self.node_list] = np.arange(num_nodes)
+        self.ch_enum = -np.ones(256, dtype=int)
+        self.ch_enum[self.channel_list] = np.arange(num_ch)
+        self.tx_cols = np.array(self.node_list) - 1
+
+        self.link_table = -np.ones((num_nodes, num_ch, num_nodes), dtype=int)
+        for rr, rxId in enumerate(self.node_list):
+            for cc, currentCh in enumerate(self.channel_list):
+                for tt, txId in enumerate(self.node_list):
+                    if txId == rxId:
+                        continue
+                    if rxId > txId:
+                        ch = currentCh
+                    else:
+                        ch = rss.prevChannel(self.channel_list, currentCh)
+                    self.link_table[rr, cc, tt] = rss.linkNumForTxRxChLists(txId, rxId, ch, self.node_list, self.channel_list)
+
+        self.line_buf = 127*np.ones(self.num_links, dtype=np.int8)
+        self.line_oldest_time = None
+        self.line_newest_time = None
+        self.line_stores = []
+
+        self.num_filtered_node = 0
+        self.num_filtered_ch = 0
+        self.node_counter = None
+        self.ch_counter = None
+        if metrics is not None:
+            self.node_counter = metrics.counter('rss_frames_filtered_node_total')
+            self.ch_counter = metrics.counter('rss_frames_filtered_channel_total')
+
+    ############
+    # Methods
+    ############
+
+    # Decode a batch of frames (a list of frame_len byte frames, or their bytes
+    # one after the other).  frame_times is the receive time of each frame, or
+    # one time for all of them.  Returns (lines, oldest, newest): the completed
+    # lines (num_lines x num_links int8, 127 for missed packets) and the receive
+    # times of the first and last frame stored in each line.
+    def decode(self, frames, frame_times=None):
+        lines, oldest, newest = self.__decode_lines(frames, frame_times, 0)
+        if len(lines) == 0:
+            return np.zeros((0, self.num_links), dtype=np.int8), np.zeros(0), np.zeros(0)
+        return np.array(lines), np.array(oldest, dtype=float), np.array(newest, dtype=float)
+
+    # Same as decode(), but each completed line is a pair (links, rss) of the
+    # link numbers heard in the line (increasing) and their int8 RSS
+    def decode_sparse(self, frames, frame_times=None):
+        lines, oldest, newest = self.__decode_lines(frames, frame_times, 1)
+        return lines, np.array(oldest, dtype=float), np.array(newest, dtype=float)
+
+    # Forget the line being filled
+    def reset(self):
+        self.line_buf[:] = 127
+        self.line_oldest_time = None
+        self.line_newest_time = None
+        self.line_stores = []
+
+    def __decode_lines(self, frames, frame_times, sparse):
+        if isinstance(frames, list):
+            frames = bytearray().join(frames)
+        rec = np.frombuffer(bytes(frames), dtype=self.frame_dtype)
+        num_frames = rec.size
+        if frame_times is None:
+            frame_times = np.nan
+        frame_times = np.broadcast_to(np.asarray(frame_times, dtype=float), (num_frames,))
+
+        rx_e = self.node_enum[rec['rx']]
+        ch_e = self.ch_enum[rec['ch']]
+        node_bad = rx_e < 0
+        ch_bad = ~node_bad & (ch_e < 0)
+        self.__count_filtered(int(np.sum(node_bad)), int(np.sum(ch_bad)))
+        keep = ~(node_bad | ch_bad)
+
+        # the stores of the batch, in the order the scripts make them
+        links = self.link_table[rx_e[keep], ch_e[keep], :]
+        vals = rec['rss'][keep][:, self.tx_cols]
+        times = np.repeat(frame_times[keep], len(self.node_list)).reshape(links.shape)
+        is_link = links >= 0
+        links = links[is_link]
+        vals = vals[is_link]
+        times = times[is_link]
+
+        lines = []
+        oldest = []
+        newest = []
+        start = 0
+        first_segment = 1
+        while start < links.size:
+            end = self.__find_line_end(links, vals, start, first_segment)
+            self.__store(links, vals, times, start, end)
+            if end == links.size:
+                break
+            if sparse:
+                lines.append(self.__take_sparse_line())
+            else:
+                lines.append(self.line_buf.copy())
+                self.line_buf[:] = 127
+                self.line_stores = []
+            oldest.append(self.line_oldest_time)
+            newest.append(self.line_newest_time)
+            self.line_oldest_time = None
+            start = end
+            first_segment = 0
+        return lines, oldest, newest
+
+    # Return (links, rss) of the links heard in line_buf, and set only the
+    # links stored in it back to 127
+    def __take_sparse_line(self):
+        if len(self.line_stores) > 0:
+            stored = np.unique(np.concatenate(self.line_stores))
+        else:
+            stored = np.zeros(0, dtype=int)
+        rss_stored = self.line_buf[stored]
+        heard = rss_stored != 127
+        self.line_buf[stored] = 127
+        self.line_stores = []
+        return stored[heard], rss_stored[heard]
+
+    # Return the position of the first store at or after start that begins a
+    # new line: a store to a link that already has a non-127 RSS in the
+    # current line.  Returns links.size if the line is not complete yet.
+    def __find_line_end(self, links, vals, start, first_segment):
+        n = links.size
+        win = 2*self.num_links
+        while True:
+            stop = min(n, start + win)
+            seg_links = links[start:stop]
+            heard = (vals[start:stop] != 127).astype(int)
+
+            # group the stores by link, keeping their order within each link
+            order = np.argsort(seg_links, kind='mergesort')
+            sorted_links = seg_links[order]
+            sorted_heard = heard[order]
+            heard_before = np.cumsum(sorted_heard) - sorted_heard
+            group_first = np.ones(order.size, dtype=bool)
+            group_first[1:] = sorted_links[1:] != sorted_links[:-1]
+            group_start = np.maximum.accumulate(np.where(group_first, np.arange(order.size), 0))
+            ends_line = (heard_before - heard_before[group_start]) > 0
+            if first_segment:
+                ends_line |= self.line_buf[sorted_links] != 127
+
+            if np.any(ends_line):
+                return start + int(np.min(order[ends_line]))
+            if stop == n:
+                return n
+            win *= 2
+
+    # Put stores [start, end) in the line buffer.  A link is stored twice in
+    # one line only when the first RSS is 127, so the 127 stores go first.
+    def __store(self, links, vals, times, start, end):
+        if end <= start:
+            return
+        seg_links = links[start:end]
+        seg_vals = vals[start:end]
+        self.line_stores.append(seg_links)
+        missed = seg_vals == 127
+        self.line_buf[seg_links[missed]] = 127
+        self.line_buf[seg_links[~missed]] = seg_vals[~missed]
+        if self.line_oldest_time is None:
+            self.line_oldest_time = times[start]
+        self.line_newest_time = times[end-1]
+
+    def __count_filtered(self, num_node, num_ch):
+        self.num_filtered_node += num_node
+        self.num_filtered_ch += num_ch
+        if self.node_counter is not None:
+            self.node_counter.inc(num_node)
+            self.ch_counter.inc(num_ch)
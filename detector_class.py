@@ -0,0 +1,312 @@
+import sys
+import time
+import numpy as np
+
+##############################################
+# A class for detecting motion/occupancy from lines of RSS
+#
+# The detector watches every link selected by the network object of an
+# RssEditor.  For every new sample it updates the windowed mean and variance of
+# every link at once using running sums (the oldest sample is subtracted and the
+# newest is added), so the cost per sample is one pass over the links no matter
+# how long the window is.  Missed packets (127) are excluded from the window
+# statistics.
+#
+# Two decision rules are available:
+#   'threshold' - a link is flagged when its windowed variance exceeds
+#                 var_thresh or its windowed mean deviates from the baseline
+#                 mean by more than dev_thresh.  Motion is declared when at
+#                 least min_links links are flagged.
+#   'lr'        - a Gaussian log-likelihood ratio of "motion" (variance
+#                 inflated by lr_var_scale) versus "no motion" (baseline
+#                 variance) is summed over the window and over all links.
+#                 Motion is declared when it exceeds lr_thresh.
+#
+# The baseline mean and variance of each link are learned from the first
+# calib_len samples, or can be set by the user with set_baseline().  A link with
+# no baseline (nan, e.g. never heard during calibration) is left out of the
+# decision until calib_len samples of it have been heard and its baseline is
+# learned from them.
+#
+# When the network's subset changes (aNetwork.update_subset()), remap() keeps
+# the window and the baseline of the links that remain.  New links start with
+# an empty window and learn their baseline as above.
+class RssDetector:
+    # Constructor:
+
+    # rss_editor - an RssEditor object.  Its network decides the links we watch
+    # win_len - number of samples in the short-term window
+    # calib_len - number of samples used to learn the baseline
+    # method - 'threshold' or 'lr'
+    # var_thresh - windowed variance threshold (dB^2) for the 'threshold' method
+    # dev_thresh - windowed mean deviation threshold (dB) for the 'threshold' method
+    # min_links - number of flagged links needed to declare motion
+    # lr_thresh - log-likelihood ratio threshold for the 'lr' method
+    # lr_var_scale - how much the variance grows under motion for the 'lr' method
+    # min_var - floor on the baseline variance so quiet links do not dominate
+
+    # W - circular buffer of the window (links x win_len), nan for missed packets
+    # open_idx - the column in W where the next sample goes
+    # win_sum, win_sumsq, win_count - running sums over the window
+    # base_mean, base_var - the baseline mean and variance of each link (nan
+    #                       for links that have no baseline yet)
+    # num_uncalibrated - number of links with no baseline yet
+    # cur_state - 1 if motion is currently detected, 0 otherwise
+    # events - list of (time, 'start'/'end', score, num_flagged) not yet read
+    # latencies - the per-sample processing time (s) of the last num_latencies samples
+    def __init__(self, rss_editor, win_len=10, calib_len=100, method='threshold',
+                 var_thresh=4.0, dev_thresh=5.0, min_links=1,
+                 lr_thresh=20.0, lr_var_scale=4.0, min_var=0.5):
+        self.rss_editor = rss_editor
+        self.L = rss_editor.network.num_links_subset
+        self.win_len = win_len
+        self.calib_len = calib_len
+
+        if method not in ['threshold', 'lr']:
+            sys.stderr.write('Error in RssDetector: method must be threshold or lr\n')
+        self.method = method
+        self.var_thresh = var_thresh
+        self.dev_thresh = dev_thresh
+        self.min_links = min_links
+        self.lr_thresh = lr_thresh
+        self.lr_var_scale = lr_var_scale
+        self.min_var = min_var
+
+        self.W = np.nan*np.ones((self.L, self.win_len))
+        self.open_idx = 0
+        self.win_sum = np.zeros(self.L)
+        self.win_sumsq = np.zeros(self.L)
+        self.win_count = np.zeros(self.L)
+
+        self.calib_sum = np.zeros(self.L)
+        self.calib_sumsq = np.zeros(self.L)
+        self.calib_count = np.zeros(self.L)
+        self.num_calib = 0
+        self.base_mean = None
+        self.base_var = None
+        self.num_uncalibrated = 0
+
+        self.cur_state = 0
+        self.cur_score = 0.0
+        self.cur_flagged = np.zeros(self.L, dtype=bool)
+        self.events = []
+
+        self.num_latencies = 1000
+        self.latencies = np.zeros(self.num_latencies)
+        self.num_obs = 0
+
+    ############
+    # Methods - We assume that cur_rss is a numpy array of the selected links
+    ############
+
+    # Add a new sample of the selected links and update the decision.  Returns
+    # 1 if motion is detected, 0 otherwise
+    def observe(self, cur_rss, cur_time=None):
+        t_start = time.time()
+
+        x = np.asarray(cur_rss, dtype=float)
+        valid = x != 127
+        x_clean = np.where(valid, x, 0.)
+
+        # Remove the oldest sample from the running sums, then add the newest
+        old = self.W[:, self.open_idx]
+        old_valid = np.logical_not(np.isnan(old))
+        old_clean = np.where(old_valid, old, 0.)
+        self.win_sum += x_clean - old_clean
+        self.win_sumsq += x_clean**2 - old_clean**2
+        self.win_count += valid.astype(float) - old_valid
+        self.W[:, self.open_idx] = np.where(valid, x, np.nan)
+        self.open_idx = (self.open_idx + 1) % self.win_len
+
+        # Learn the baseline
+        if self.base_mean is None:
+            self.calib_sum += x_clean
+            self.calib_sumsq += x_clean**2
+            self.calib_count += valid
+            self.num_calib += 1
+            if self.num_calib >= self.calib_len:
+                self.__finish_calibration()
+        else:
+            if self.num_uncalibrated > 0:
+                self.__learn_missing_baseline(x_clean, valid)
+            self.__decide(cur_time)
+
+        self.latencies[self.num_obs % self.num_latencies] = time.time() - t_start
+        self.num_obs += 1
+
+        return self.cur_state
+
+    # Set the baseline mean and variance of each link directly.  Links with a
+    # nan mean learn their baseline from their next calib_len heard samples.
+    def set_baseline(self, base_mean, base_var):
+        self.base_mean = np.asarray(base_mean, dtype=float).copy()
+        self.base_var = np.maximum(np.asarray(base_var, dtype=float), self.min_var)
+        missing = np.isnan(self.base_mean)
+        self.base_var[missing] = np.nan
+        self.calib_sum[missing] = 0
+        self.calib_sumsq[missing] = 0
+        self.calib_count[missing] = 0
+        self.num_uncalibrated = int(np.sum(missing))
+
+    # Forget the baseline and learn it again from the next calib_len samples
+    def reset_baseline(self):
+        self.calib_sum[:] = 0
+        self.calib_sumsq[:] = 0
+        self.calib_count[:] = 0
+        self.num_calib = 0
+        self.base_mean = None
+        self.base_var = None
+        self.num_uncalibrated = 0
+        self.cur_state = 0
+
+    # Call after network.update_subset() with the (old_pos, new_pos) it
+    # returned.  The state of link old_pos[i] moves to link new_pos[i]; the
+    # other links of the new subset start empty.
+    def remap(self, old_pos, new_pos):
+        L = self.rss_editor.network.num_links_subset
+
+        def move(vals, fill):
+            new_vals = fill*np.ones((L,) + vals.shape[1:], dtype=vals.dtype)
+            new_vals[new_pos] = vals[old_pos]
+            return new_vals
+
+        self.W = move(self.W, np.nan)
+        self.win_sum = move(self.win_sum, 0)
+        self.win_sumsq = move(self.win_sumsq, 0)
+        self.win_count = move(self.win_count, 0)
+        self.calib_sum = move(self.calib_sum, 0)
+        self.calib_sumsq = move(self.calib_sumsq, 0)
+        self.calib_count = move(self.calib_count, 0)
+        self.cur_flagged = move(self.cur_flagged, False)
+        if self.base_mean is not None:
+            self.base_mean = move(self.base_mean, np.nan)
+            self.base_var = move(self.base_var, np.nan)
+            self.num_uncalibrated = int(np.sum(np.isnan(self.base_mean)))
+        self.L = L
+
+    # returns a 1 if the baseline has been learned, 0 otherwise
+    def is_calibrated(self):
+        return int(self.base_mean is not None)
+
+    # Return the windowed mean of each link (nan if the window has no RSS)
+    def get_win_mean(self):
+        denom = np.where(self.win_count > 0, self.win_count, np.nan)
+        return self.win_sum/denom
+
+    # Return the windowed variance of each link (0 if the window has no RSS)
+    def get_win_var(self):
+        denom = np.where(self.win_count > 0, self.win_count, np.nan)
+        tmp_mean = self.win_sum/denom
+        tmp_var = self.win_sumsq/denom - tmp_mean**2
+        tmp_var[np.isnan(tmp_var)] = 0
+        return np.maximum(tmp_var, 0)
+
+    # Return the score of the latest sample.  This is the number of flagged
+    # links for the 'threshold' method and the log-likelihood ratio for 'lr'
+    def get_score(self):
+        return self.cur_score
+
+    # Return a boolean vector of the links that were flagged on the latest sample
+    def get_flagged_links(self):
+        return self.cur_flagged.copy()
+
+    # Return the events since the last call and forget them
+    def get_events(self):
+        tmp = self.events
+        self.events = []
+        return tmp
+
+    # Return the mean, median, 99th percentile and max per-sample processing
+    # time in seconds
+    def get_latency_stats(self):
+        tmp = self.latencies[:min(self.num_obs, self.num_latencies)]
+        if tmp.size == 0:
+            return (np.nan, np.nan, np.nan, np.nan)
+        return (tmp.mean(), np.median(tmp), np.percentile(tmp, 99), tmp.max())
+
+    # Turn the calibration sums into the baseline
+    def __finish_calibration(self):
+        denom = np.where(self.calib_count > 0, self.calib_count, np.nan)
+        tmp_mean = self.calib_sum/denom
+        tmp_var = self.calib_sumsq/denom - tmp_mean**2
+
+        # links never heard during calibration keep a nan baseline
+        self.set_baseline(tmp_mean, tmp_var)
+
+    # Add a sample to the calibration sums of the links with no baseline, and
+    # set the baseline of those that now have calib_len heard samples
+    def __learn_missing_baseline(self, x_clean, valid):
+        missing = np.isnan(self.base_mean)
+        add = missing & valid
+        self.calib_sum[add] += x_clean[add]
+        self.calib_sumsq[add] += x_clean[add]**2
+        self.calib_count[add] += 1
+        done = missing & (self.calib_count >= self.calib_len)
+        if np.any(done):
+            tmp_mean = self.calib_sum[done]/self.calib_count[done]
+            tmp_var = self.calib_sumsq[done]/self.calib_count[done] - tmp_mean**2
+            self.base_mean[done] = tmp_mean
+            self.base_var[done] = np.maximum(tmp_var, self.min_var)
+            self.num_uncalibrated -= int(np.sum(done))
+
+    # Apply the decision rule to the current window
+    def __decide(self, cur_time):
+        # links with no baseline yet are left out
+        known = np.logical_not(np.isnan(self.base_mean))
+        has_rss = (self.win_count > 0) & known
+        n = self.win_count
+        base_mean = np.where(known, self.base_mean, 0.)
+        base_var = np.where(known, self.base_var, 1.)
+
+        if self.method == 'threshold':
+            win_var = self.get_win_var()
+            denom = np.where(has_rss, n, 1.)
+            dev = np.abs(self.win_sum/denom - base_mean)
+            self.cur_flagged = has_rss & ((win_var > self.var_thresh) | (dev > self.dev_thresh))
+            self.cur_score = float(np.sum(self.cur_flagged))
+            new_state = int(self.cur_score >= self.min_links)
+        else:
+            # sum over the window of (x - mu0)^2, from the running sums
+            sq_dev = self.win_sumsq - 2*base_mean*self.win_sum + n*base_mean**2
+            s0 = base_var
+            s1 = self.lr_var_scale*base_var
+            llr = -0.5*n*np.log(s1/s0) + 0.5*sq_dev*(1./s0 - 1./s1)
+            llr[np.logical_not(has_rss)] = 0.
+            self.cur_flagged = llr > 0
+            self.cur_score = float(np.sum(llr))
+            new_state = int(self.cur_score > self.lr_thresh)
+
+        if new_state != self.cur_state:
+            if new_state:
+                self.events.append((cur_time, 'start', self.cur_score, int(np.sum(self.cur_flagged))))
+            else:
+                self.events.append((cur_time, 'end', self.cur_score, int(np.sum(self.cur_flagged))))
+        self.cur_state = new_state
+
+
+################################
+# Report the per-sample processing time for networks with thousands of links.
+# Run: python detector_class.py
+if __name__ == '__main__':
+    import network_class_v1 as aNetwork
+    import rss_editor_class as aRssEdit
+
+    num_samples = 2000
+    for num_nodes in [10, 20, 30]:
+        num_ch = 16
+        node_locs = np.random.random((num_nodes, 2))
+        node_list = np.arange(1, num_nodes+1)
+        ch_list = np.arange(1, num_ch+1)
+        myNetwork = aNetwork.aNetwork(node_locs, num_nodes, num_ch, node_list, ch_list, 'a')
+        myRssEdit = aRssEdit.RssEditor(myNetwork)
+
+        for method in ['threshold', 'lr']:
+            myDetector = RssDetector(myRssEdit, win_len=20, calib_len=200, method=method)
+            rss_mat = np.random.randint(-90, -40, (num_samples, myNetwork.num_links_subset))
+            rss_mat[np.random.random(rss_mat.shape) < 0.1] = 127
+            for ii in range(num_samples):
+                myDetector.observe(rss_mat[ii, :], ii)
+
+            mean_t, med_t, p99_t, max_t = myDetector.get_latency_stats()
+            sys.stdout.write('%5d links, %-9s: mean %.3f ms, median %.3f ms, p99 %.3f ms, max %.3f ms\n' %
+                             (myNetwork.num_links_subset, method, 1e3*mean_t, 1e3*med_t, 1e3*p99_t, 1e3*max_t))
@@ -0,0 +1,218 @@
+#! /usr/bin/env python
+
+# This script builds a dataset of windowed per-link features from a directory
+# of recorded sessions, for model training.  For every window of win_len lines
+# (one window every step lines) and every link selected by an aNetwork view,
+# it computes:
+#
+#   mean, variance, median, range (max - min) of the non-missed RSS, and
+#   missed ratio (fraction of 127 values in the window)
+#
+# Windows are taken from each chunk of the session with a strided NumPy view,
+# so there is no per-sample Python loop.  Sessions are read chunk by chunk
+# (text or binary, see session_io.py) and the features are appended to disk as
+# they are computed.  The nan statistics copy the windows they work on, so the
+# windows of a chunk are done a block at a time.  Both the chunks and the
+# window blocks are sized from --max-mb, so a worker uses a few times --max-mb
+# of memory whatever the session length, number of links and window settings.
+# Files are spread across worker processes.
+#
+# Output, one directory per session (<name>.feat):
+#   features.bin - float32, num_windows x num_links_subset x 5 (FEATURE_NAMES order)
+#   time.bin     - float64, num_windows.  Time of the last line of each window.
+#   meta.json    - the feature names, window settings and network view
+#
+# Operation:
+#   python feature_builder.py data_dir out_dir --node-list 1,2 --ch-list 1,2,3 --link-order f --win-len 50 --step 10
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import warnings
+import multiprocessing
+import numpy as np
+import session_io as aSession
+import network_class_v1 as aNetwork
+
+FEATURE_NAMES = ['mean', 'var', 'median', 'range', 'missed_ratio']
+DEFAULT_MAX_MB = 64
+
+# Return the windows of X (rows x links) starting every step rows as a
+# read-only strided view (num_windows x win_len x links).  No data is copied.
+def sliding_windows(X, win_len, step):
+    num_win = (X.shape[0] - win_len)//step + 1
+    if num_win <= 0:
+        return X[:0].reshape(0, win_len, X.shape[1])
+    s0, s1 = X.strides
+    return np.lib.stride_tricks.as_strided(X, shape=(num_win, win_len, X.shape[1]),
+                                           strides=(step*s0, s0, s1), writeable=False)
+
+# Compute the features of every window.  X is rows x links with nan for missed
+# packets.  Returns num_windows x links x len(FEATURE_NAMES).  The windows are
+# done in blocks whose copy (windows x win_len x links float64) is at most
+# max_bytes.
+def window_features(X, win_len, step, max_bytes=DEFAULT_MAX_MB*2**20):
+    W = sliding_windows(X, win_len, step)
+    out = np.zeros((W.shape[0], W.shape[2], len(FEATURE_NAMES)), dtype=np.float32)
+    block = max(1, max_bytes//(8*win_len*max(W.shape[2], 1)))
+    for ii in range(0, W.shape[0], block):
+        Wb = W[ii:ii+block]
+        ob = out[ii:ii+block]
+
+        # windows where a link was never heard give nan features
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            ob[:, :, 0] = np.nanmean(Wb, axis=1)
+            ob[:, :, 1] = np.nanvar(Wb, axis=1)
+            ob[:, :, 2] = np.nanmedian(Wb, axis=1)
+            ob[:, :, 3] = np.nanmax(Wb, axis=1) - np.nanmin(Wb, axis=1)
+        ob[:, :, 4] = np.mean(np.isnan(Wb), axis=1)
+    return out
+
+# Return the number of lines read per chunk so that the float64 chunk of the
+# selected links is at most max_bytes (and no more than chunk_rows)
+def rows_for_budget(num_links, chunk_rows, max_bytes):
+    return max(1, min(chunk_rows, max_bytes//(8*max(num_links, 1))))
+
+# Yield (rss, times) chunks of a session, restricted to the columns in
+# link_idx.  Binary sessions are read chunk_rows lines at a time and text
+# sessions chunk_bytes of text at a time.
+def iter_session_chunks(fname, link_idx, chunk_rows, chunk_bytes=8*1024*1024):
+    if aSession.is_binary_session(fname):
+        session = aSession.BinarySession(fname)
+        for ii in range(0, session.num_samples, chunk_rows):
+            yield session.rss[ii:ii+chunk_rows, :][:, link_idx], np.array(session.time[ii:ii+chunk_rows])
+    else:
+        reader = aSession.TextSessionReader(fname, chunk_bytes)
+        for rss_block, time_block in reader.iter_chunks():
+            yield rss_block[:, link_idx], reader.to_seconds(time_block)
+
+# Return the number of links in a session, and the channel list if it is known
+def session_size(fname):
+    if aSession.is_binary_session(fname):
+        meta = aSession.BinarySession(fname).meta
+        return meta['num_links'], meta.get('channel_list')
+    return aSession.TextSessionReader(fname).num_links, None
+
+# Build the features of one session.  Returns (fname, num_windows, seconds)
+def build_one(task):
+    fname, out_name, link_idx, win_len, step, chunk_rows, max_bytes, view = task
+    t_start = time.time()
+
+    tmp_name = out_name + '.tmp'
+    if not os.path.isdir(tmp_name):
+        os.makedirs(tmp_name)
+    f_feat = open(os.path.join(tmp_name, 'features.bin'), 'wb')
+    f_time = open(os.path.join(tmp_name, 'time.bin'), 'wb')
+
+    # carry holds the rows needed by windows that are not complete yet
+    carry = np.zeros((0, len(link_idx)))
+    carry_time = np.zeros(0)
+    num_windows = 0
+    # a text line is at least 2 bytes per link, so chunk_bytes/2 lines of the
+    # selected links are at most 4*chunk_bytes as float64
+    chunk_rows = rows_for_budget(len(link_idx), chunk_rows, max_bytes)
+    for rss_block, time_block in iter_session_chunks(fname, link_idx, chunk_rows, max(max_bytes//4, 65536)):
+        X = rss_block.astype(float)
+        X[rss_block == 127] = np.nan
+        X = np.concatenate((carry, X))
+        T = np.concatenate((carry_time, time_block))
+
+        feats = window_features(X, win_len, step, max_bytes)
+        num_new = feats.shape[0]
+        f_feat.write(feats.tobytes())
+        f_time.write(T[win_len-1 + step*np.arange(num_new)].astype(np.float64).tobytes())
+        num_windows += num_new
+
+        carry = X[num_new*step:, :]
+        carry_time = T[num_new*step:]
+    f_feat.close()
+    f_time.close()
+
+    meta = {'source': os.path.basename(fname),
+            'feature_names': FEATURE_NAMES,
+            'num_windows': num_windows,
+            'num_links': len(link_idx),
+            'win_len': win_len,
+            'step': step}
+    meta.update(view)
+    f = open(os.path.join(tmp_name, 'meta.json'), 'w')
+    json.dump(meta, f, indent=1, sort_keys=True)
+    f.close()
+    os.rename(tmp_name, out_name)
+
+    return (fname, num_windows, time.time() - t_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build windowed per-link features from recorded sessions")
+    parser.add_argument("in_dir", help="directory with text (rss_*.txt) or binary (*.rssd) sessions")
+    parser.add_argument("out_dir", help="directory for the feature files")
+    parser.add_argument("--node-list", required=True, help="comma separated node ids to include (starting at 1)")
+    parser.add_argument("--ch-list", required=True, help="comma separated channel numbers to include (starting at 1)")
+    parser.add_argument("--link-order", default='f', choices=['f', 'b', 'fb', 'a'], help="link order choice (default f)")
+    parser.add_argument("--num-ch", type=int, help="number of channels programmed on the nodes (default: from the session)")
+    parser.add_argument("--win-len", type=int, default=50, help="window length in lines (default 50)")
+    parser.add_argument("--step", type=int, default=10, help="lines between windows (default 10)")
+    parser.add_argument("--chunk-rows", type=int, default=20000, help="most lines read per chunk (default 20000)")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_MB, help="MB per chunk and per block of window copies (default %d)" % DEFAULT_MAX_MB)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    file_list = sorted(glob.glob(os.path.join(args.in_dir, '*' + aSession.BINARY_EXT)))
+    converted = set([os.path.splitext(os.path.basename(f))[0] for f in file_list])
+    for fname in sorted(glob.glob(os.path.join(args.in_dir, 'rss_*.txt'))):
+        if os.path.splitext(os.path.basename(fname))[0] not in converted:
+            file_list.append(fname)
+    if len(file_list) == 0:
+        sys.stderr.write('Error: no sessions in ' + args.in_dir + '\n')
+        return
+
+    node_list = np.array([int(n) for n in args.node_list.split(',')])
+    ch_list = np.array([int(c) for c in args.ch_list.split(',')])
+
+    # All sessions must have the same network as the first one
+    num_links, channel_list = session_size(file_list[0])
+    num_ch = args.num_ch or (len(channel_list) if channel_list else None)
+    if num_ch is None:
+        sys.stderr.write('Error: --num-ch is needed for text sessions\n')
+        return
+    num_nodes = aSession.infer_num_nodes(num_links, num_ch)
+    if num_nodes is None:
+        sys.stderr.write('Error: ' + str(num_links) + ' links does not match ' + str(num_ch) + ' channels\n')
+        return
+    myNetwork = aNetwork.aNetwork(np.zeros((num_nodes, 2)), num_nodes, num_ch, node_list, ch_list, args.link_order)
+    link_idx = myNetwork.master_indexes
+    view = {'num_nodes': num_nodes, 'num_ch': num_ch, 'node_list': node_list.tolist(),
+            'ch_list': ch_list.tolist(), 'link_order_choice': args.link_order,
+            'master_indexes': link_idx.tolist()}
+
+    if not os.path.isdir(args.out_dir):
+        os.makedirs(args.out_dir)
+    tasks = []
+    for fname in file_list:
+        out_name = os.path.join(args.out_dir, os.path.splitext(os.path.basename(fname))[0] + '.feat')
+        if os.path.isdir(out_name):
+            continue
+        tasks.append((fname, out_name, link_idx, args.win_len, args.step, args.chunk_rows, int(args.max_mb*2**20), view))
+    sys.stderr.write('Building features for ' + str(len(tasks)) + ' session(s) (' + str(len(file_list) - len(tasks)) +
+                     ' already done) with ' + str(args.jobs) + ' process(es)\n')
+
+    t_start = time.time()
+    pool = multiprocessing.Pool(args.jobs)
+    for fname, num_windows, secs in pool.imap_unordered(build_one, tasks):
+        sys.stderr.write('%s: %d windows in %.2f s\n' % (os.path.basename(fname), num_windows, secs))
+    pool.close()
+    pool.join()
+    sys.stderr.write('Done in %.2f s\n' % (time.time() - t_start))
+
+
+if __name__ == '__main__':
+    main()
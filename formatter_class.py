@@ -0,0 +1,149 @@
+import sys
+import time
+import threading
+import numpy as np
+import rss as rss
+
+##############################################
+# Classes for writing lines of RSS as text quickly
+#
+# The listen scripts write each line as ' '.join(map(str, rss)) + ' ' + str(t)
+# and flush stdout after every line.  With many links the str() of every value
+# and the flush per line take most of the time the scripts spend on a line.
+#
+# An int8 RSS has only 256 possible values, so RssLineFormatter builds the text
+# of each (the value followed by a space) once.  A line is made by looking up
+# the token of every link in the table: for long lines with np.take into a
+# reusable links x TOKEN_WIDTH byte buffer, keeping the bytes of each token,
+# and for short lines by joining the token strings.  The text is byte for byte
+# what the scripts wrote.
+#
+# BufferedLineWriter collects lines and writes and flushes them together once
+# the first one has waited max_latency seconds.  That is checked when a line is
+# written and by flush_if_due().  The listener blocks in the serial read while
+# no bytes come in, so start_flush_thread() calls flush_if_due() from a daemon
+# thread; then no line waits more than max_latency plus the thread's period.
+
+TOKEN_WIDTH = 5            # '-128 '
+MIN_TABLE_LINKS = 64       # shorter lines are joined from the token strings
+
+
+class RssLineFormatter:
+    # Constructor:
+
+    # num_links - number of links per line
+
+    # tokens - the text of each RSS value followed by a space, indexed by the
+    #          value as uint8 (so -1 is tokens[255])
+    # token_bytes - the same as a 256 x TOKEN_WIDTH uint8 table, zero padded
+    # token_len - the length of each token
+    # char_buf, keep_buf - the reusable buffers a line is built in
+    def __init__(self, num_links):
+        self.num_links = num_links
+        self.tokens = [str(u - 256*(u >= 128)) + ' ' for u in range(256)]
+        self.token_bytes = np.zeros((256, TOKEN_WIDTH), dtype=np.uint8)
+        self.token_len = np.zeros(256, dtype=int)
+        for u, token in enumerate(self.tokens):
+            self.token_bytes[u, :len(token)] = bytearray(token)
+            self.token_len[u] = len(token)
+
+        self.cols = np.arange(TOKEN_WIDTH)
+        self.char_buf = np.zeros((num_links, TOKEN_WIDTH), dtype=np.uint8)
+        self.keep_buf = np.zeros((num_links, TOKEN_WIDTH), dtype=bool)
+
+    ############
+    # Methods
+    ############
+
+    # Return the text of a line: the RSS of every link (int8, num_links) and
+    # the time stamp t (written with str())
+    def format_line(self, rss_line, t):
+        return self.format_rss(rss_line) + str(t) + '\n'
+
+    # Return the RSS of every link as text, each value followed by a space
+    def format_rss(self, rss_line):
+        idx = np.asarray(rss_line, dtype=np.int8).view(np.uint8)
+        if self.num_links < MIN_TABLE_LINKS:
+            return ''.join(map(self.tokens.__getitem__, idx.tolist()))
+        np.take(self.token_bytes, idx, axis=0, out=self.char_buf)
+        np.less(self.cols, self.token_len[idx][:, None], out=self.keep_buf)
+        return self.char_buf[self.keep_buf].tobytes()
+
+
+class BufferedLineWriter:
+    # Constructor:
+
+    # out - the file the lines go to (e.g. sys.stdout)
+    # max_latency - the longest (s) a line is held before it is flushed.  0
+    #               writes and flushes every line.
+    # max_bytes - flush when this much text is held
+
+    # pending - the lines held
+    # first_time - monotonic time the first held line was written
+    # lock - held while the lines are changed or written, since the flush
+    #        thread and the listener both write
+    def __init__(self, out=None, max_latency=0.05, max_bytes=65536):
+        if out is None:
+            out = sys.stdout
+        self.out = out
+        self.max_latency = max_latency
+        self.max_bytes = max_bytes
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.first_time = None
+        self.num_flushes = 0
+        self.lock = threading.Lock()
+
+    ############
+    # Methods
+    ############
+
+    # Hold a line, and flush the held lines if the first one has waited
+    # max_latency or max_bytes are held
+    def write(self, text):
+        now = rss.monotonic_time()
+        with self.lock:
+            if self.first_time is None:
+                self.first_time = now
+            self.pending.append(text)
+            self.pending_bytes += len(text)
+            if now - self.first_time >= self.max_latency or self.pending_bytes >= self.max_bytes:
+                self.__flush()
+
+    # Flush the held lines if the first one has waited max_latency
+    def flush_if_due(self):
+        with self.lock:
+            if self.first_time is not None and rss.monotonic_time() - self.first_time >= self.max_latency:
+                self.__flush()
+
+    # Write and flush the held lines
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    # Call flush_if_due() every period seconds (max_latency/4 by default) from
+    # a daemon thread, so held lines are written while no new lines come in
+    def start_flush_thread(self, period=None):
+        if period is None:
+            period = self.max_latency/4.
+        period = max(period, 1e-3)
+
+        def flush_loop():
+            while True:
+                time.sleep(period)
+                self.flush_if_due()
+
+        thread = threading.Thread(target=flush_loop)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def __flush(self):
+        if len(self.pending) > 0:
+            self.out.write(''.join(self.pending))
+            self.pending = []
+            self.pending_bytes = 0
+            self.num_flushes += 1
+        self.out.flush()
+        self.first_time = None
@@ -0,0 +1,187 @@
+##############################################
+# A class for cutting the serial byte stream of the listen node into frames
+#
+# Every frame from the listen node is exactly max_nodes + 7 bytes long and ends
+# with the 0xBEEF trailer (bytes 0xef 0xbe).  Splitting the stream on the
+# trailer alone fails when an RSS pair inside the payload happens to be -17,-66
+# (0xef 0xbe): the frame is cut in two and both halves are thrown away, along
+# with the next frame.
+#
+# This parser uses the length and the trailer together:
+#   - In sync, the frame starting at the current position is accepted if the
+#     trailer sits exactly at its last two bytes.  Trailer bytes inside the
+#     payload are never looked at.
+#   - Out of sync (at start up, or when the trailer is not where it should be),
+#     we scan forward for the next trailer.  The candidate frame ending at that
+#     trailer is accepted only if it starts right after a trailer (or exactly
+#     one frame after the start of the frame whose trailer was bad, so the
+#     frame after a frame with a damaged trailer is kept) and the following
+#     frame also ends with a trailer at the right place.  Otherwise
+#     the scan continues from the next byte, so a stray 0xBEEF in a payload
+#     cannot pull us out of sync, a frame that lost or gained a byte is not
+#     mistaken for a good one, and the valid frames next to it are kept.
+#
+# Counts kept:
+#   num_frames - frames accepted
+#   num_recovered - accepted frames with 0xBEEF inside the payload.  A parser
+#                   that splits on the trailer would have dropped them.
+#   num_dropped - estimated number of frames lost in corrupted stretches
+#   num_skipped_bytes - bytes thrown away while resynchronizing
+#   num_resyncs - number of times we lost sync
+class FrameParser:
+    # Constructor:
+
+    # max_nodes - the number of nodes the sensors are programmed with
+    # metrics - an optional MetricsRegistry.  rss_packets_total and
+    #           rss_frames_corrupted_total are updated when given.
+
+    # frame_len - the length of a frame in bytes
+    # buf - the bytes received but not yet returned as frames, preceded by up
+    #       to two already used bytes (head) so we can see the previous trailer
+    # in_sync - 1 if buf starts at a frame boundary
+    # lost_start - position in buf of the start of the frame whose trailer was
+    #              not where it should be (None when in sync or unknown)
+    # last_end_offsets - for each frame returned by the last call to feed(), the
+    #                    offset just past its last byte, counted from the start
+    #                    of the data passed to that call.  Zero or negative if
+    #                    the frame ended in earlier data.
+    def __init__(self, max_nodes, metrics=None):
+        self.max_nodes = max_nodes
+        self.frame_len = max_nodes + 7
+        self.trailer = bytearray(b'\xef\xbe')
+
+        self.buf = bytearray()
+        self.head = 0
+        self.in_sync = 0
+        self.lost_start = None
+        self.last_end_offsets = []
+        self.pending_skip = 0
+
+        self.num_frames = 0
+        self.num_recovered = 0
+        self.num_dropped = 0
+        self.num_skipped_bytes = 0
+        self.num_resyncs = 0
+
+        self.packet_counter = None
+        self.corrupt_counter = None
+        self.recovered_counter = None
+        if metrics is not None:
+            self.packet_counter = metrics.counter('rss_packets_total')
+            self.corrupt_counter = metrics.counter('rss_frames_corrupted_total')
+            self.recovered_counter = metrics.counter('rss_frames_recovered_total',
+                                                     'Frames kept despite 0xBEEF inside the payload')
+
+    ############
+    # Methods
+    ############
+
+    # Add newly received bytes and return the list of complete frames (each a
+    # bytearray of frame_len bytes) in the order they were received
+    def feed(self, data):
+        self.buf.extend(data)
+        buf = self.buf
+        L = self.frame_len
+        n = len(buf)
+        frames = []
+        ends = []
+
+        pos = self.head
+        while True:
+            if self.in_sync:
+                if pos + L > n:
+                    break
+                if buf[pos+L-2] == 0xef and buf[pos+L-1] == 0xbe:
+                    frames.append(buf[pos:pos+L])
+                    ends.append(pos+L)
+                    pos += L
+                    continue
+                # the trailer is not where it should be
+                self.in_sync = 0
+                self.lost_start = pos
+                self.num_resyncs += 1
+
+            new_pos = self.__resync(pos)
+            if new_pos < 0:
+                # not enough bytes to confirm a frame boundary yet.  Keep the
+                # last frame_len*2 bytes (and the two before them), which
+                # might still hold one.
+                keep_from = max(pos, n - 2*L)
+                self.pending_skip += keep_from - pos
+                pos = keep_from
+                break
+            self.pending_skip += new_pos - pos
+            self.__account_skip()
+            pos = new_pos
+            self.in_sync = 1
+            self.lost_start = None
+
+        # report offsets relative to the start of the new data
+        shift = n - len(data)
+        self.last_end_offsets = [e - shift for e in ends]
+
+        del buf[:max(0, pos-2)]
+        self.head = min(pos, 2)
+        if self.lost_start is not None:
+            self.lost_start -= max(0, pos-2)
+
+        self.num_frames += len(frames)
+        if self.packet_counter is not None:
+            self.packet_counter.inc(len(frames))
+        for frame in frames:
+            if frame.find(self.trailer, 0, L-2) >= 0:
+                self.num_recovered += 1
+                if self.recovered_counter is not None:
+                    self.recovered_counter.inc()
+        return frames
+
+    # Return (num_frames, num_recovered, num_dropped, num_skipped_bytes)
+    def get_counts(self):
+        return (self.num_frames, self.num_recovered, self.num_dropped, self.num_skipped_bytes)
+
+    # Forget the buffered bytes and start searching for a frame boundary again
+    def reset(self):
+        del self.buf[:]
+        self.head = 0
+        self.in_sync = 0
+        self.lost_start = None
+        self.pending_skip = 0
+
+    # Starting at pos, find the first position that follows a trailer (or is
+    # one frame after lost_start) and starts a frame with a trailer, which is
+    # followed by another frame with a trailer.  Returns -1 if the buffer ends
+    # before we can tell.
+    def __resync(self, pos):
+        buf = self.buf
+        L = self.frame_len
+        n = len(buf)
+
+        q = buf.find(self.trailer, pos + L - 2)
+        while q >= 0:
+            start = q + 2 - L
+            if start + 2*L > n:
+                return -1
+            if self.lost_start is not None and start == self.lost_start + L:
+                # the frame after one whose trailer was damaged
+                after_trailer = 1
+            elif start >= 2:
+                after_trailer = buf[start-2] == 0xef and buf[start-1] == 0xbe
+            else:
+                # the very first byte of the stream may start a frame
+                after_trailer = self.num_frames == 0 and self.num_skipped_bytes == 0 and self.pending_skip == 0
+            if after_trailer and buf[start+2*L-2] == 0xef and buf[start+2*L-1] == 0xbe:
+                return start
+            q = buf.find(self.trailer, q + 1)
+        return -1
+
+    # Account for the bytes thrown away while we were out of sync, once we are
+    # back in sync
+    def __account_skip(self):
+        if self.pending_skip <= 0:
+            return
+        self.num_skipped_bytes += self.pending_skip
+        num_lost = max(1, int(round(self.pending_skip/float(self.frame_len))))
+        self.num_dropped += num_lost
+        if self.corrupt_counter is not None:
+            self.corrupt_counter.inc(num_lost)
+        self.pending_skip = 0
@@ -0,0 +1,132 @@
+import numpy as np
+
+##############################################
+# A class for watching the health of the links, nodes and channels of a network
+#
+# myCircBuff.get_nonnan_row_count() and RssEditor.all_nonmiss_flag only tell
+# whether a link has ever been heard.  This class keeps, for every link of the
+# full network (in the order of aNetwork.link_ch_database, like the lines of
+# listenAllLinks.py):
+#   - the packet reception ratio (PRR) over the last win_len lines, from a ring
+#     of heard flags and a running count of heard packets
+#   - the number of lines since the link was last heard
+# Each line is one O(num_links) update.  The PRR is rolled up per node (all
+# links the node sends or receives on) and per channel with np.bincount over
+# the link_ch_database columns.
+#
+# A node is reported dead when none of its links has been heard for dead_lines
+# lines, so a node that drops out is found within dead_lines lines.  A channel
+# is reported interfered when its PRR over the links between live nodes is
+# below ch_ratio times the median PRR of the channels, found within win_len
+# lines.  Node ids and channels (positions in the channel list) start at 1, as
+# in link_ch_database.
+class LinkHealth:
+    # Constructor:
+
+    # network - a network object.  Its full network (all nodes and channels)
+    #           is watched.
+    # win_len - number of lines the PRR is computed over
+    # dead_lines - lines without any link of a node heard before it is dead
+    # ch_ratio - a channel with a PRR below ch_ratio times the median is interfered
+
+    # link_tx, link_rx, link_ch - node and channel index (from 0) of each link
+    # heard_win - ring of heard flags, win_len x num_links
+    # heard_count - number of lines each link was heard in heard_win
+    # missed_run - lines since each link was last heard
+    # node_num_links - number of links each node sends or receives on
+    def __init__(self, network, win_len=100, dead_lines=20, ch_ratio=0.5):
+        db = network.link_ch_database
+        self.num_links = db.shape[0]
+        self.num_nodes = network.num_nodes_all
+        self.num_ch = network.num_ch_all
+        self.win_len = win_len
+        self.dead_lines = dead_lines
+        self.ch_ratio = ch_ratio
+
+        self.link_tx = db[:, 1] - 1
+        self.link_rx = db[:, 2] - 1
+        self.link_ch = db[:, 3] - 1
+
+        self.heard_win = np.zeros((win_len, self.num_links), dtype=bool)
+        self.win_pos = 0
+        self.num_obs = 0
+        self.heard_count = np.zeros(self.num_links, dtype=int)
+        self.missed_run = np.zeros(self.num_links, dtype=int)
+
+        self.node_num_links = self.__per_node(np.ones(self.num_links))
+
+    ############
+    # Methods
+    ############
+
+    # Update with a line of RSS of all links (127 for a missed packet)
+    def observe(self, rss_all):
+        self.observe_heard(np.asarray(rss_all) != 127)
+
+    # Update with a sparse line: the link numbers heard in the line
+    def observe_sparse(self, links):
+        heard = np.zeros(self.num_links, dtype=bool)
+        heard[np.asarray(links, dtype=int)] = True
+        self.observe_heard(heard)
+
+    # Update with the heard flag of every link for one line
+    def observe_heard(self, heard):
+        self.heard_count += heard.astype(int) - self.heard_win[self.win_pos]
+        self.heard_win[self.win_pos] = heard
+        self.win_pos = (self.win_pos + 1) % self.win_len
+        self.num_obs += 1
+        self.missed_run += 1
+        self.missed_run[heard] = 0
+
+    # Return the number of lines the PRR is currently computed over
+    def get_window_len(self):
+        return min(self.num_obs, self.win_len)
+
+    # Return the PRR of every link over the window
+    def get_link_prr(self):
+        return self.heard_count/float(max(self.get_window_len(), 1))
+
+    # Return the PRR of every node over all the links it sends or receives on
+    def get_node_prr(self):
+        return self.__per_node(self.get_link_prr())/self.node_num_links
+
+    # Return the PRR of every channel.  With alive_only, only the links between
+    # nodes that are not dead count.  nan for a channel with no such links.
+    def get_channel_prr(self, alive_only=1):
+        weights = np.ones(self.num_links)
+        if alive_only:
+            node_alive = self.__get_node_alive()
+            weights = (node_alive[self.link_tx] & node_alive[self.link_rx]).astype(float)
+        num = np.bincount(self.link_ch, weights=weights*self.get_link_prr(), minlength=self.num_ch)
+        den = np.bincount(self.link_ch, weights=weights, minlength=self.num_ch)
+        prr = np.nan*np.ones(self.num_ch)
+        prr[den > 0] = num[den > 0]/den[den > 0]
+        return prr
+
+    # Return the ids of the nodes none of whose links was heard in the last
+    # dead_lines lines
+    def get_dead_nodes(self):
+        return np.nonzero(~self.__get_node_alive())[0] + 1
+
+    # Return the channels (positions in the channel list, from 1) whose PRR
+    # is below ch_ratio times the median PRR of the channels
+    def get_interfered_channels(self):
+        prr = self.get_channel_prr()
+        valid = ~np.isnan(prr)
+        if self.num_obs == 0 or np.sum(valid) < 2:
+            return np.zeros(0, dtype=int)
+        low = np.zeros(self.num_ch, dtype=bool)
+        low[valid] = prr[valid] < self.ch_ratio*np.median(prr[valid])
+        return np.nonzero(low)[0] + 1
+
+    # Return a flag for each node: 0 if none of its links was heard in the last
+    # dead_lines lines (all nodes are alive until dead_lines lines are seen)
+    def __get_node_alive(self):
+        if self.num_obs < self.dead_lines:
+            return np.ones(self.num_nodes, dtype=bool)
+        return self.__per_node((self.missed_run < self.dead_lines).astype(float)) > 0
+
+    # Sum a value of every link for the tx and the rx node of the link
+    def __per_node(self, link_vals):
+        return (np.bincount(self.link_tx, weights=link_vals, minlength=self.num_nodes) +
+                np.bincount(self.link_rx, weights=link_vals, minlength=self.num_nodes))
@@ -0,0 +1,219 @@
+import numpy as np
+
+##############################################
+# Classes for keeping the RSS of a long live session at several resolutions
+#
+# myCircBuff and MYPLOTTER only hold the last num_samples lines, but clinical
+# sessions run for hours.  RssHistory keeps:
+#   - the most recent recent_len lines at full rate, and
+#   - one HistoryTier per (bucket width, number of buckets) in tiers, e.g. 1 s
+#     buckets for the last hour and 1 min buckets for the last day.  Each bucket
+#     holds the min, mean, max and valid count (non-127 values) of every link.
+# Every tier is a ring of fixed size updated as each line arrives, so memory is
+# bounded and a query over any time span is a few array slices: query() picks
+# the finest resolution that still covers the span within max_points.
+#
+# Buckets are aligned to multiples of their width (in the time units of the
+# lines, normally seconds).  Buckets in which no line arrived are not stored.
+# A tier takes num_buckets*num_links*14 bytes and the full rate ring
+# recent_len*num_links*4 bytes, so choose the tiers with the network size in mind.
+
+class HistoryTier:
+    # Constructor:
+
+    # num_links - the number of links in each RSS vector
+    # width - the bucket width (s)
+    # num_buckets - the number of closed buckets kept
+
+    # b_time - the start time of each stored bucket
+    # b_min, b_max, b_sum, b_count - the aggregates of each stored bucket
+    # next_idx - the ring position of the next closed bucket
+    # num_stored - number of closed buckets stored
+    # num_closed - number of buckets closed so far, stored or not
+    # cur_start - the start time of the open bucket (nan if none)
+    # cur_min, cur_max, cur_sum, cur_count - the aggregates of the open bucket
+    def __init__(self, num_links, width, num_buckets):
+        self.num_links = num_links
+        self.width = float(width)
+        self.num_buckets = num_buckets
+
+        self.b_time = np.nan*np.ones(num_buckets)
+        self.b_min = np.zeros((num_buckets, num_links), dtype=np.float32)
+        self.b_max = np.zeros((num_buckets, num_links), dtype=np.float32)
+        self.b_sum = np.zeros((num_buckets, num_links), dtype=np.float32)
+        self.b_count = np.zeros((num_buckets, num_links), dtype=np.uint16)
+        self.next_idx = 0
+        self.num_stored = 0
+        self.num_closed = 0
+
+        self.cur_start = np.nan
+        self.cur_min = np.zeros(num_links)
+        self.cur_max = np.zeros(num_links)
+        self.cur_sum = np.zeros(num_links)
+        self.cur_count = np.zeros(num_links, dtype=int)
+        self.__clear_open()
+
+    # Add a line.  x is float with nan for missed packets.
+    def observe(self, x, valid, cur_time):
+        start = np.floor(cur_time/self.width)*self.width
+        if start != self.cur_start:
+            if not np.isnan(self.cur_start):
+                self.__close()
+            self.cur_start = start
+
+        x0 = np.where(valid, x, 0.)
+        self.cur_sum += x0
+        self.cur_count += valid
+        np.fmin(self.cur_min, x, out=self.cur_min)
+        np.fmax(self.cur_max, x, out=self.cur_max)
+
+    # Return (times, min, mean, max, count) for the buckets starting in
+    # [t0, t1), oldest first, including the open bucket
+    def query(self, t0, t1):
+        order = (self.next_idx - self.num_stored + np.arange(self.num_stored)) % self.num_buckets
+        times = self.b_time[order]
+        i0 = np.searchsorted(times, t0)
+        i1 = np.searchsorted(times, t1)
+        idx = order[i0:i1]
+
+        times = self.b_time[idx]
+        b_min = self.b_min[idx, :].astype(float)
+        b_max = self.b_max[idx, :].astype(float)
+        b_count = self.b_count[idx, :].astype(int)
+        b_sum = self.b_sum[idx, :].astype(float)
+
+        if (not np.isnan(self.cur_start)) and t0 <= self.cur_start < t1:
+            times = np.append(times, self.cur_start)
+            b_min = np.vstack((b_min, self.cur_min))
+            b_max = np.vstack((b_max, self.cur_max))
+            b_count = np.vstack((b_count, self.cur_count))
+            b_sum = np.vstack((b_sum, self.cur_sum))
+
+        b_mean = b_sum/np.where(b_count > 0, b_count, np.nan)
+        return times, b_min, b_mean, b_max, b_count
+
+    # returns a 1 if buckets have been dropped from the ring, 0 otherwise
+    def has_dropped(self):
+        return int(self.num_closed > self.num_buckets)
+
+    # Return the start time of the oldest bucket kept (nan if empty)
+    def get_oldest_time(self):
+        if self.num_stored == 0:
+            return self.cur_start
+        return self.b_time[(self.next_idx - self.num_stored) % self.num_buckets]
+
+    # Move the open bucket into the ring
+    def __close(self):
+        ii = self.next_idx
+        self.b_time[ii] = self.cur_start
+        self.b_min[ii, :] = self.cur_min
+        self.b_max[ii, :] = self.cur_max
+        self.b_sum[ii, :] = self.cur_sum
+        self.b_count[ii, :] = np.minimum(self.cur_count, np.iinfo(np.uint16).max)
+        self.next_idx = (ii + 1) % self.num_buckets
+        self.num_stored = min(self.num_stored + 1, self.num_buckets)
+        self.num_closed += 1
+        self.__clear_open()
+
+    def __clear_open(self):
+        self.cur_min[:] = np.nan
+        self.cur_max[:] = np.nan
+        self.cur_sum[:] = 0.
+        self.cur_count[:] = 0
+
+
+class RssHistory:
+    # Constructor:
+
+    # num_links - the number of links in each RSS vector
+    # recent_len - the number of lines kept at full rate
+    # tiers - a list of (bucket width (s), number of buckets) from fine to coarse
+
+    # R, T - the full rate ring of lines (nan for missed packets) and times
+    # open_idx - the ring position of the next line
+    # num_recent - number of lines in the full rate ring
+    # num_lines - number of lines seen
+    # tier_list - the HistoryTier objects
+    def __init__(self, num_links, recent_len=3000, tiers=((1.0, 3600), (60.0, 1440))):
+        self.num_links = num_links
+        self.recent_len = recent_len
+
+        self.R = np.nan*np.ones((recent_len, num_links), dtype=np.float32)
+        self.T = np.nan*np.ones(recent_len)
+        self.open_idx = 0
+        self.num_recent = 0
+        self.num_lines = 0
+
+        self.tier_list = [HistoryTier(num_links, width, num_buckets) for width, num_buckets in tiers]
+
+    ############
+    # Methods - We assume that cur_rss is a numpy array of the links
+    ############
+
+    # Add a line of RSS taken at cur_time (s)
+    def observe(self, cur_rss, cur_time):
+        x = np.asarray(cur_rss, dtype=float)
+        valid = x != 127
+        x = np.where(valid, x, np.nan)
+
+        self.R[self.open_idx, :] = x
+        self.T[self.open_idx] = cur_time
+        self.open_idx = (self.open_idx + 1) % self.recent_len
+        self.num_recent = min(self.num_recent + 1, self.recent_len)
+        self.num_lines += 1
+
+        for tier in self.tier_list:
+            tier.observe(x, valid, cur_time)
+
+    # Return the full rate lines in [t0, t1) as (times, rss), with nan for
+    # missed packets
+    def get_recent(self, t0, t1):
+        order = (self.open_idx - self.num_recent + np.arange(self.num_recent)) % self.recent_len
+        times = self.T[order]
+        i0 = np.searchsorted(times, t0)
+        i1 = np.searchsorted(times, t1)
+        return times[i0:i1], self.R[order[i0:i1], :].astype(float)
+
+    # returns a 1 if data has been dropped from level (0 for full rate, else
+    # tier level-1), 0 otherwise
+    def has_dropped(self, level):
+        if level == 0:
+            return int(self.num_lines > self.recent_len)
+        return self.tier_list[level-1].has_dropped()
+
+    # Return the oldest time held at full rate (level 0) or by tier level-1
+    def get_oldest_time(self, level):
+        if level == 0:
+            if self.num_recent == 0:
+                return np.nan
+            return self.T[(self.open_idx - self.num_recent) % self.recent_len]
+        return self.tier_list[level-1].get_oldest_time()
+
+    # Return the span [t0, t1) at the finest resolution that holds all of it
+    # and gives at most max_points points (if given).  Returns
+    # (resolution, times, min, mean, max, count) where resolution is 0 for full
+    # rate lines or the bucket width.  At full rate min = mean = max and count
+    # is 1 for a received packet, 0 for a missed one.
+    def query(self, t0, t1, max_points=None):
+        for level in range(len(self.tier_list) + 1):
+            oldest = self.get_oldest_time(level)
+            covers = (not self.has_dropped(level)) or oldest <= t0
+            last = level == len(self.tier_list)
+            if level == 0:
+                num_points = np.sum((self.T >= t0) & (self.T < t1))
+            else:
+                num_points = (t1 - t0)/self.tier_list[level-1].width
+            if (covers or last) and (max_points is None or num_points <= max_points or last):
+                return self.get_level(level, t0, t1)
+        return self.get_level(len(self.tier_list), t0, t1)
+
+    # Return the span [t0, t1) at level (0 for full rate, else tier level-1) in
+    # the same format as query()
+    def get_level(self, level, t0, t1):
+        if level == 0:
+            times, rss = self.get_recent(t0, t1)
+            count = (~np.isnan(rss)).astype(int)
+            return 0, times, rss, rss, rss, count
+        tier = self.tier_list[level-1]
+        times, b_min, b_mean, b_max, b_count = tier.query(t0, t1)
+        return tier.width, times, b_min, b_mean, b_max, b_count
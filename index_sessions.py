@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+
+# This script writes the sparse time index (<name>.txt.idx, see session_io.py)
+# of text RSS sessions that were recorded without one, using a pool of worker
+# processes, one file per task.  Each file is read once, in large vectorized
+# chunks.  Files whose index already matches are skipped unless --force is
+# given.
+#
+# Operation:
+#   python index_sessions.py /root/spencer/clinical_data
+#   python index_sessions.py data_dir --every 500 --jobs 4 --force
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing
+import session_io as aSession
+
+# Index one text session.  Returns (fname, status, num_bytes, num_entries, seconds)
+def index_one(task):
+    fname, every, chunk_bytes, force = task
+    t_start = time.time()
+    num_bytes = os.path.getsize(fname)
+
+    reader = aSession.TextSessionReader(fname, chunk_bytes)
+    if reader.num_links is None:
+        return (fname, 'empty', num_bytes, 0, time.time() - t_start)
+    if not force and aSession.load_index(fname, reader.data_offset) is not None:
+        return (fname, 'skipped', 0, 0, 0.)
+
+    index = aSession.build_index(fname, every, chunk_bytes)
+    return (fname, 'indexed', num_bytes, index.samples.size, time.time() - t_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the time index of text RSS sessions")
+    parser.add_argument("in_dir", help="directory with the text sessions")
+    parser.add_argument("--pattern", default="rss_*.txt", help="file name pattern (default rss_*.txt)")
+    parser.add_argument("--every", type=int, default=aSession.DEFAULT_INDEX_EVERY, help="lines between index entries (default %d)" % aSession.DEFAULT_INDEX_EVERY)
+    parser.add_argument("--force", action="store_true", help="rebuild indexes that already exist")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunk-mb", type=float, default=8., help="MB of text parsed per chunk (default 8)")
+    args = parser.parse_args()
+
+    file_list = sorted(glob.glob(os.path.join(args.in_dir, args.pattern)))
+    tasks = [(fname, args.every, int(args.chunk_mb*1024*1024), args.force) for fname in file_list]
+    sys.stderr.write('Indexing ' + str(len(tasks)) + ' file(s) with ' + str(args.jobs) + ' process(es)\n')
+
+    t_start = time.time()
+    total_bytes = 0
+    num_indexed = 0
+    num_skipped = 0
+    pool = multiprocessing.Pool(args.jobs)
+    for fname, status, num_bytes, num_entries, secs in pool.imap_unordered(index_one, tasks):
+        total_bytes += num_bytes
+        if status == 'indexed':
+            num_indexed += 1
+            sys.stderr.write('%s: %d entries, %.1f MB in %.2f s (%.1f MB/s)\n' %
+                             (os.path.basename(fname), num_entries, num_bytes/1e6, secs, num_bytes/1e6/max(secs, 1e-9)))
+        elif status == 'skipped':
+            num_skipped += 1
+        else:
+            sys.stderr.write('%s: %s\n' % (os.path.basename(fname), status))
+    pool.close()
+    pool.join()
+
+    secs = time.time() - t_start
+    sys.stderr.write('Done: %d indexed, %d skipped, %.1f MB in %.2f s (%.1f MB/s)\n' %
+                     (num_indexed, num_skipped, total_bytes/1e6, secs, total_bytes/1e6/max(secs, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
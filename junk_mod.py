@@ -15,9 +15,16 @@ import argparse
 import time
 import datetime
 import serial
+import os
 import sys
 import platform
 import glob
+import rss as rss
+import metrics_class as aMetrics
+import listener_class as aListener
+import formatter_class as aFormatter
+import profiler_class as aProfiler
+import session_io as aSession
 
 # Define function to turn off leds gracefully
 def Exit_gracefully(signal, frame):
@@ -32,6 +39,9 @@ LOG_LEVEL = logging.INFO  # Could be e.g. "DEBUG" or "WARNING"
 # Define and parse command line arguments
 parser = argparse.ArgumentParser(description="My simple Python service")
 parser.add_argument("-l", "--log", help="file to write log to (default '" + LOG_FILENAME + "')")
+parser.add_argument("--metrics-port", type=int, default=9110, help="localhost port of the metrics endpoint, 0 to turn it off (default 9110)")
+parser.add_argument("--summary-period", type=float, default=60.0, help="seconds between metrics summary lines in the log (default 60)")
+parser.add_argument("--profile-mode", choices=["sample", "cprofile"], default="sample", help="profile taken on SIGUSR1 (default sample)")
  
 # If the log file is specified on the command line then override the default
 args = parser.parse_args()
@@ -198,8 +208,10 @@ class rss_measurement():
         self.start_stop_obj = start_stop_obj
         self.fname = None
         self.f_out = None
+        self.listener = None
         self.bbb_id = 'id1'
         self.__init_ser()
+        self.__init_metrics()
         
     # Initialize serial
     def __init_ser(self):    
@@ -214,33 +226,9 @@ class rss_measurement():
         
         self.ser = serial.Serial(serial_filename,38400)
         
-    # Get previous channel
-    def __prevChannel(self,channelList,ch_now):
-        if (channelList.count(ch_now) > 0):
-            i = channelList.index(ch_now)
-            rval = channelList[(i-1) % len(channelList)]
-        else:
-            rval = -1  # Key for bad ch_now input
-        return rval
-    
-    # Hex to signed int
-    def __hex2signedint(self,he):
-        # Convert from hexidecimal 2's complement to signed 8 bit integer
-        return (int(he,16) + 2**7) % 2**8 - 2**7
-    
-    # Get the link number for a given tx, rx, ch
-    def __linkNumForTxRxChLists(self,tx, rx, ch, nodeList, channelList):
-        if (nodeList.count(tx) == 0) or (nodeList.count(rx) == 0) or (channelList.count(ch) == 0):
-            sys.stderr.write('Error in linkNumForTxRx: tx, rx, or ch number invalid')
-        rx_enum = nodeList.index(rx)
-        tx_enum = nodeList.index(tx)
-        ch_enum = channelList.index(ch)
-        nodes = len(nodeList)
-        links = nodes*(nodes-1)
-        linknum = ch_enum*links + tx_enum*(nodes-1) + rx_enum
-        if (rx_enum > tx_enum):
-            linknum -= 1
-        return linknum
+    # Initialize the runtime counters updated by the listener in observe()
+    def __init_metrics(self):
+        self.metrics = aMetrics.add_acquisition_metrics()
         
     # Get the next file number
     def __get_next_file_name(self):
@@ -288,6 +276,12 @@ class rss_measurement():
         # If we have arrived here, we haven't created any files on this day
         return fname + '000.txt'
     
+    # Return the queue depths of the current recording (see RssListener)
+    def get_queue_depths(self):
+        if self.listener is None:
+            return []
+        return self.listener.get_queue_depths()
+    
     # observe a new line
     def observe(self):
         
@@ -301,100 +295,46 @@ class rss_measurement():
         # USER:  THIS SHOULD NOT BE CHANGED, IT IS 6 FOR ALL GROUPS IN OUR CLASS
         maxNodes      = 2
         
-        # Parameters that are due to our implementation of the listen node.
-        startTime     = time.time()
-        numNodes      = len(nodeList)
-        numChs        = len(channelList)
-        numLinks      = numNodes*(numNodes-1)*numChs
-        rssIndex      = 3
-        string_length = maxNodes + 7
-        suffix        = ['ef','be']  # "0xBEEF"
+        # Times are written in ms since the start of the recording
+        startTime     = rss.monotonic_time()
         
-        # Initialize data, output file
-        nodeSet       = set(nodeList)
-        channelSet    = set(channelList)
-        currentLine   = []  # Init serial data buffer "currentLine" as empty.
-        currentLinkRSS = [127] * numLinks
+        # The listener reads the serial port in bulk, finds and stamps the frames
+        # (with the estimated monotonic time their last byte was received),
+        # decodes them into lines of RSS and hands each line to write_line().
+        # A line is stamped with the receive time of its newest frame.
+        listener      = aListener.RssListener(self.ser, maxNodes, nodeList, channelList, self.metrics)
+        self.listener = listener
         
         # Find the last file number, and add one
         self.fname = self.__get_next_file_name()
-        self.f_out = open(self.fname,'w')
+        # The session is written with a sparse time index next to it
+        # (<fname>.idx) for seeking by time
+        self.f_out = aSession.TextSessionWriter(self.fname)
         
         # Put in a header line
         first_line = 'Started at: ' + str(datetime.datetime.now()) + '\n'
         self.f_out.write(first_line)
         
-        # Run forever, adding one integer at a time from the serial port, 
-        #   whenever an integer is available.
-        while(1):
-            
-            my_start_stop_obj.observe()
-            
-            tempInt = self.ser.read().encode('hex')
-            currentLine.append(tempInt)
+        # Lines are made from a table of the text of every int8 RSS
+        formatter     = aFormatter.RssLineFormatter(listener.num_links)
         
-            # Whenever the end-of-line sequence is read, operate on the "packet" of data.
-            if currentLine[-2:] == suffix:
-                if len(currentLine) != string_length:
-                    sys.stderr.write('packet corrupted - wrong string length\n')
-                    del currentLine[:]
-                    continue
-                currentLineInt = [int(x, 16) for x in currentLine]
-                rxId = currentLineInt[2]
-                currentCh = currentLineInt[-4]
-                #print [currentLineInt[0:3], [hex2signedint(he) for he in currentLine[3:9]], currentLineInt[9:]]
-                #print rxId
-                if (rxId not in nodeSet) or (currentCh not in channelSet):
-                    del currentLine[:]
-                    continue
-                timeStampSec = time.time()
-                            
-                
-                # Each line in the serial data has RSS values for multiple txids.
-                # Output one line per txid, rxid, ch combo.
-                for txId in nodeList:
-                    # If the rxId is after the txId, then no problem -- currentCh
-                    # is also the channel that node txId was transmitting on when
-                    # node rxId made the measurement, because nodes transmit on a
-                    # channel in increasing order.
-                    if rxId > txId: 
-                        ch = currentCh
-                    else: 
-                        ch = self.__prevChannel(channelList, currentCh)
-                    
-                    # If the link (tx, rx, ch) is one we are supposed to watch
-                    if txId != rxId:  
-                        i = self.__linkNumForTxRxChLists(txId, rxId, ch, nodeList, channelList)
-                        
-                        # If the RSS has already been recorded for this link on 
-                        # this "line", then output the line first, and then restart 
-                        # with a new line.
-                        if currentLinkRSS[i] < 127:
-                            # Calc time in ms since start of script
-                            timeDiff_ms = int((time.time() - startTime)*1000)
-                            # Calc the ADC value of RIP belts
-                            
-                            # Output currentLinkRSS vector
-                            #sys.stdout.write(' '.join(map(str,currentLinkRSS)) + ' ' + str(timeDiff_ms) + '\n')
-                            #sys.stdout.flush()
-                            
-                            # Write to file
-                            self.f_out.write(' '.join(map(str,currentLinkRSS)) + ' ' + str(timeDiff_ms) + '\n')
-                            
-                            # If the button has been pressed, close the file and
-                            # get out of observe.
-                            if not self.start_stop_obj.is_listen_state_on():
-                                self.f_out.close()
-                                return 0
-                            
-                            # Restart with a new line by resetting currentLinkRSS
-                            currentLinkRSS = [127] * numLinks
-                        
-                        # Store the RSS 
-                        currentLinkRSS[i] = self.__hex2signedint(currentLine[rssIndex+txId-1])
+        # Write each line to the file with the time in ms since the start of
+        # the recording
+        def write_line(line, lineNewestRxTime):
+            timeDiff_ms = int((lineNewestRxTime - startTime)*1000)
+            self.f_out.write_line(formatter.format_line(line, timeDiff_ms), timeDiff_ms)
+            
+            # If the button has been pressed, close the file and
+            # get out of observe.
+            if not self.start_stop_obj.is_listen_state_on():
+                self.f_out.close()
+                listener.stop()
+        listener.add_consumer(write_line, 'writer')
         
-                # Remove serial data from the buffer.
-                currentLine = []
+        # Run until the button is pressed again, checking the button before
+        # every read
+        listener.run(my_start_stop_obj.observe)
+        return 0
     
 ################################
 # Start of the main function
@@ -408,6 +348,17 @@ my_rss_measurement_obj = rss_measurement(my_start_stop_obj)
 # Setup the cleanup procedure
 signal.signal(signal.SIGTERM, Exit_gracefully)
 
+# On SIGUSR1 start or stop profiling (the profile is written next to the log).
+# On SIGUSR2 log the latency histograms of each stage and the queue depths.
+profiler = aProfiler.SignalProfiler(os.path.dirname(os.path.abspath(LOG_FILENAME)), args.profile_mode, out=sys.stdout)
+profiler.add_queue_source(my_rss_measurement_obj.get_queue_depths)
+profiler.install()
+
+# Log a metrics summary periodically and serve the metrics on localhost
+aMetrics.get_registry().start_summary_thread(args.summary_period, out=sys.stdout)
+if args.metrics_port > 0:
+    aMetrics.get_registry().start_http_server(args.metrics_port)
+
 
 # Loop forever
 while True:
@@ -0,0 +1,154 @@
+import sys
+import math
+import signal
+import numpy as np
+
+##############################################
+# Classes for recording latency histograms of the acquisition pipeline
+#
+# Each decoded frame carries the monotonic time (rss.monotonic_time()) at which
+# its last byte was received.  The listen scripts record how long it took to
+# get from one stage of the pipeline to the next:
+#
+#   serial_to_frame    - last byte of the frame received -> frame parsed
+#   frame_to_vector    - oldest frame of a line received -> line vector emitted
+#   vector_to_consumer - line vector emitted -> consumer (writer, plotter) done
+#   frame_to_consumer  - newest frame of a line received -> consumer done
+#
+# A histogram has logarithmically spaced bins so that microseconds and seconds
+# can be recorded with the same relative resolution.  Adding a value costs a
+# log10 and an increment, so it is cheap enough to do for every frame.
+
+class LatencyHistogram:
+    # Constructor:
+
+    # min_val - the upper edge (s) of the first bin.  Smaller values go in bin 0
+    # max_val - the lower edge (s) of the last bin.  Larger values go in the last bin
+    # bins_per_decade - number of bins per factor of 10
+
+    # counts - number of values in each bin
+    # edges - the upper edge of each bin (the last one is inf)
+    def __init__(self, min_val=1e-6, max_val=1e2, bins_per_decade=10):
+        self.min_val = min_val
+        self.bins_per_decade = bins_per_decade
+        self.log_min = math.log10(min_val)
+        self.num_bins = int(round((math.log10(max_val) - self.log_min)*bins_per_decade)) + 2
+
+        self.edges = np.append(10**(self.log_min + np.arange(self.num_bins-1)/float(bins_per_decade)), np.inf)
+        self.counts = np.zeros(self.num_bins, dtype=np.int64)
+        self.num_vals = 0
+        self.total = 0.0
+        self.max_val = 0.0
+
+    # Add one latency (s)
+    def add(self, val):
+        if val <= self.min_val:
+            idx = 0
+        else:
+            idx = min(int(math.ceil((math.log10(val) - self.log_min)*self.bins_per_decade)), self.num_bins-1)
+        self.counts[idx] += 1
+        self.num_vals += 1
+        self.total += val
+        if val > self.max_val:
+            self.max_val = val
+
+    # Add a numpy array of latencies (s)
+    def add_many(self, vals):
+        vals = np.asarray(vals, dtype=float)
+        if vals.size == 0:
+            return
+        self.counts += np.bincount(np.searchsorted(self.edges, vals), minlength=self.num_bins)
+        self.num_vals += vals.size
+        self.total += vals.sum()
+        self.max_val = max(self.max_val, vals.max())
+
+    # return the number of recorded latencies
+    def get_count(self):
+        return self.num_vals
+
+    # return the mean latency (s)
+    def get_mean(self):
+        if self.num_vals == 0:
+            return np.nan
+        return self.total/self.num_vals
+
+    # return the largest latency (s)
+    def get_max(self):
+        return self.max_val
+
+    # return the upper edge of the bin that holds the q-th percentile (s)
+    def get_percentile(self, q):
+        if self.num_vals == 0:
+            return np.nan
+        idx = np.searchsorted(np.cumsum(self.counts), q/100.*self.num_vals)
+        return min(self.edges[idx], self.max_val)
+
+    # forget all recorded latencies
+    def reset(self):
+        self.counts[:] = 0
+        self.num_vals = 0
+        self.total = 0.0
+        self.max_val = 0.0
+
+
+class LatencyTracker:
+    # Constructor:
+
+    # stage_names - the names of the stages, in pipeline order
+    # hists - the LatencyHistogram of each stage
+    def __init__(self, stage_names=('serial_to_frame', 'frame_to_vector', 'vector_to_consumer',
+                                    'frame_to_consumer')):
+        self.stage_names = list(stage_names)
+        self.hists = {}
+        for name in self.stage_names:
+            self.hists[name] = LatencyHistogram()
+
+    # record one latency (s) for a stage.  Unknown stages are added at the end
+    def record(self, stage, val):
+        if stage not in self.hists:
+            self.stage_names.append(stage)
+            self.hists[stage] = LatencyHistogram()
+        self.hists[stage].add(val)
+
+    # return the histogram of a stage
+    def get_histogram(self, stage):
+        return self.hists[stage]
+
+    # return a one line per stage summary of count, mean, percentiles and max (ms)
+    def summary(self):
+        out = []
+        for name in self.stage_names:
+            h = self.hists[name]
+            out.append('%-20s n=%-9d mean=%.3f p50=%.3f p90=%.3f p99=%.3f max=%.3f ms' %
+                       (name, h.get_count(), 1e3*h.get_mean(), 1e3*h.get_percentile(50),
+                        1e3*h.get_percentile(90), 1e3*h.get_percentile(99), 1e3*h.get_max()))
+        return '\n'.join(out) + '\n'
+
+    # forget everything recorded so far
+    def reset(self):
+        for name in self.stage_names:
+            self.hists[name].reset()
+
+
+# The tracker shared by the listen scripts and the classes they feed
+default_tracker = LatencyTracker()
+
+def get_tracker():
+    return default_tracker
+
+# Write the summary of the shared tracker to out (stderr by default) whenever
+# the process receives signum, e.g. "kill -USR2 <pid>" while a listen script is
+# running.
+def install_dump_signal(signum=None, out=None):
+    if signum is None:
+        if not hasattr(signal, 'SIGUSR2'):
+            return
+        signum = signal.SIGUSR2
+
+    def dump_handler(sig, frame):
+        if out is None:
+            sys.stderr.write(default_tracker.summary())
+        else:
+            out.write(default_tracker.summary())
+
+    signal.signal(signum, dump_handler)
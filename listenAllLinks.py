@@ -18,8 +18,12 @@
 
 import sys
 import serial
-import time
 import rss as rss
+import latency_class as aLatency
+import metrics_class as aMetrics
+import listener_class as aListener
+import formatter_class as aFormatter
+import sparse_line as aSparse
 
 # Get the number of nodes and channel list automatically
 print "Initializing..."
@@ -41,68 +45,62 @@ nodeList      = range(1,maxNodes+1)  # 1, ..., 30
 numNodes      = len(nodeList)
 numChs        = len(channelList)
 numLinks      = numNodes*(numNodes-1)*numChs
-rssIndex      = 3
-string_length = maxNodes + 7
-suffix        = ['ef','be']  # "0xBEEF"
 
-# Initialize data, output file
-nodeSet       = set(nodeList)
-channelSet    = set(channelList)
-currentLine   = []  # Init serial data buffer "currentLine" as empty.
-currentLinkRSS = [127] * numLinks
+# Each frame is stamped with the estimated monotonic time its last byte was received.
+# A line is stamped with the receive time of its newest frame.  Send SIGUSR2 to
+# print the latency histograms of each stage.
+latency        = aLatency.get_tracker()
+aLatency.install_dump_signal()
+wallOffset     = rss.monotonic_to_wall_offset()
 
+# Runtime counters.  A summary line goes to stderr every summaryPeriod seconds
+# and all metrics are served at http://127.0.0.1:<metricsPort>/metrics
+# USER: set metricsPort to 0 to turn off the HTTP endpoint.
+metricsPort    = 9110
+summaryPeriod  = 10.0
+metrics        = aMetrics.add_acquisition_metrics()
+metrics.start_summary_thread(summaryPeriod)
+if metricsPort > 0:
+    metrics.start_http_server(metricsPort)
 
-# Run forever, adding one integer at a time from the serial port, 
-#   whenever an integer is available.
-while(1):
-    tempInt = ser.read().encode('hex')
-    currentLine.append(tempInt)
+# USER: set outputFormat to 'sparse' to print only the links heard in each line
+#       as <link>:<rss> pairs followed by the time, or to 'sparse_binary' to
+#       write them as binary records (see sparse_line.py).  With 'dense' every
+#       link is printed.  The sparse output grows with the packets received
+#       instead of with numLinks.
+outputFormat   = 'dense'
 
-    # Whenever the end-of-line sequence is read, operate on the "packet" of data.
-    if currentLine[-2:] == suffix:
-        if len(currentLine) != string_length:
-            sys.stderr.write('packet corrupted - wrong string length\n')
-            del currentLine[:]
-            continue
-        currentLineInt = [int(x, 16) for x in currentLine]
-        rxId = currentLineInt[2]
-        currentCh = currentLineInt[-4]
+# The listener reads the serial port in bulk, finds and stamps the frames,
+# decodes them into lines of RSS and hands each line to its consumers.  The time
+# spent in each consumer is recorded as a latency stage.
+listener       = aListener.RssListener(ser, maxNodes, nodeList, channelList, metrics, 38400, outputFormat != 'dense')
 
-        if (rxId not in nodeSet) or (currentCh not in channelSet):
-            del currentLine[:]
-            continue                    
-        
-        # Each line in the serial data has RSS values for multiple txids.
-        # Output one line per txid, rxid, ch combo.
-        for txId in nodeList:
-            # If the rxId is after the txId, then no problem -- currentCh
-            # is also the channel that node txId was transmitting on when
-            # node rxId made the measurement, because nodes transmit on a
-            # channel in increasing order.
-            if rxId > txId: 
-                ch = currentCh
-            else: 
-                ch = rss.prevChannel(channelList, currentCh)
-            
-            # If the link (tx, rx, ch) is one we are supposed to watch
-            if txId != rxId:  
-                i = rss.linkNumForTxRxChLists(txId, rxId, ch, nodeList, channelList)
-                
-                # If the RSS has already been recorded for this link on 
-                # this "line", then output the line first, and then restart 
-                # with a new line.
-                if currentLinkRSS[i] < 127:
-                    # Output currentLinkRSS vector
-                    cur_line = ' '.join(map(str,currentLinkRSS)) + ' ' + str(time.time()) + '\n'
-                    sys.stdout.write(cur_line)
-                    sys.stdout.flush()
-                    
-                    
-                    # Restart with a new line by resetting currentLinkRSS
-                    currentLinkRSS = [127] * numLinks
-                
-                # Store the RSS 
-                currentLinkRSS[i] = rss.hex2signedint(currentLine[rssIndex+txId-1])
+# Lines are made from a table of the text of every int8 RSS and written in
+# batches.  USER: flushLatency is how long (s) a line may be held before stdout
+# is flushed; 0 flushes every line.  A flush thread checks every flushLatency/4
+# s, so a line is written at most 1.25*flushLatency after it was made, also when
+# no more data comes in.
+flushLatency   = 0.05
+formatter      = aFormatter.RssLineFormatter(numLinks)
+writer         = aFormatter.BufferedLineWriter(sys.stdout, flushLatency)
+if flushLatency > 0:
+    writer.start_flush_thread()
 
-        # Remove serial data from the buffer.
-        currentLine = []
+# Output each completed line: the currentLinkRSS vector, or the heard links only
+def write_line(line, lineNewestRxTime):
+    if outputFormat == 'dense':
+        cur_line = formatter.format_line(line, lineNewestRxTime + wallOffset)
+    elif outputFormat == 'sparse':
+        cur_line = aSparse.format_sparse_line(line[0], line[1], lineNewestRxTime + wallOffset)
+    else:
+        cur_line = aSparse.pack_sparse_record(line[0], line[1], lineNewestRxTime + wallOffset)
+    writer.write(cur_line)
+listener.add_consumer(write_line, 'writer')
+listener.add_idle_callback(writer.flush_if_due)
+
+# Run forever, handing out lines whenever bytes are available.  The lines held
+# by the writer are written when the script is stopped.
+try:
+    listener.run()
+finally:
+    writer.flush()
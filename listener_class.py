@@ -0,0 +1,170 @@
+import sys
+import rss as rss
+import latency_class as aLatency
+import framing_class as aFraming
+import arrival_class as aArrival
+import decoder_class as aDecoder
+
+##############################################
+# A class that reads the listen node and hands each line of RSS to consumers
+#
+# listenAllLinks.py, plot_any_link.py, plot_one_link.py, temp_listen.py and
+# junk_mod.py each had their own copy of the read/frame/decode loop, written for
+# the one thing they did with a line.  This class runs that loop once:
+#   - bulk reads from the serial port, framed by framing_class.FrameParser
+#   - each frame stamped by arrival_class.ArrivalEstimator
+#   - frames decoded into lines by decoder_class.FrameDecoder
+#   - each line handed, as a NumPy array, to every consumer in the order they
+#     were added (writer, RssEditor views, plotter, detectors, ...)
+# A consumer is a function consumer(line, rx_time), where line is the int8 RSS
+# of all links (127 for a missed packet), or with sparse=1 the pair (links, rss)
+# of the links heard in the line, and rx_time the monotonic receive time of the
+# newest frame of the line.  Nothing is turned into a string unless a consumer
+# does it.
+#
+# The latency stages of latency_class are recorded as the scripts did, plus the
+# time spent in each consumer as the stage consumer_<name>, so the SIGUSR2 dump
+# and the metrics endpoint show which consumer is slow.  The line counters of
+# metrics_class are updated for every line.  get_queue_depths() tells how much
+# is waiting at each step (see profiler_class.py).
+class RssListener:
+    # Constructor:
+
+    # ser - the open serial port of the listen node
+    # max_nodes - the number of nodes the sensors are programmed with
+    # node_list - the node ids to decode (starting at 1)
+    # channel_list - the channels programmed on the nodes, in the order they are measured
+    # metrics - an optional MetricsRegistry for the frame and line counters
+    # baud - the serial baud rate, used to stamp the frames of a bulk read
+    # sparse - 1 to hand each line to the consumers as (links, rss)
+
+    # consumers - (name, function) of each consumer, in calling order
+    # idle_funcs - functions called before a read that will block
+    # running - 0 once stop() is called
+    # last_read_bytes, max_read_bytes - bytes returned by the last read and the
+    #                                   most returned by one read, i.e. how much
+    #                                   had queued up in the serial buffer
+    def __init__(self, ser, max_nodes, node_list, channel_list, metrics=None, baud=38400, sparse=0):
+        self.ser = ser
+        self.sparse = sparse
+        self.framer = aFraming.FrameParser(max_nodes, metrics)
+        self.arrival = aArrival.ArrivalEstimator(baud, num_slots=max_nodes)
+        self.decoder = aDecoder.FrameDecoder(max_nodes, node_list, channel_list, metrics)
+        self.num_links = self.decoder.num_links
+        self.latency = aLatency.get_tracker()
+
+        self.consumers = []
+        self.idle_funcs = []
+        self.running = 1
+        self.num_dropped = 0
+        self.num_lines = 0
+        self.last_read_bytes = 0
+        self.max_read_bytes = 0
+
+        self.line_counter = None
+        if metrics is not None:
+            self.line_counter = metrics.counter('rss_lines_total')
+            self.link_counter = metrics.counter('rss_line_links_total')
+            self.miss_counter = metrics.counter('rss_line_missed_links_total')
+            self.missed_ratio = metrics.gauge('rss_line_missed_ratio')
+            self.consumer_lag = metrics.gauge('rss_consumer_lag_seconds')
+
+    ############
+    # Methods
+    ############
+
+    # Add a consumer function(line, rx_time) at the end of the chain.  Its time
+    # is recorded as the latency stage consumer_<name>.
+    def add_consumer(self, consumer, name=None):
+        if name is None:
+            name = getattr(consumer, '__name__', 'consumer' + str(len(self.consumers)))
+        self.consumers.append(('consumer_' + name, consumer))
+
+    # Add a function called before every read that has to wait for bytes (e.g.
+    # BufferedLineWriter.flush_if_due, so held lines are not kept while the
+    # listener waits)
+    def add_idle_callback(self, func):
+        self.idle_funcs.append(func)
+
+    # Do one bulk read (blocking for at least one byte) and hand the lines it
+    # completes to the consumers.  Returns the number of lines.
+    def poll(self):
+        num_waiting = self.ser.inWaiting()
+        if num_waiting == 0:
+            for func in self.idle_funcs:
+                func()
+        data = self.ser.read(max(1, num_waiting))
+        read_time = rss.monotonic_time()
+        self.last_read_bytes = len(data)
+        self.max_read_bytes = max(self.max_read_bytes, len(data))
+        frames = self.framer.feed(data)
+        if self.framer.num_dropped != self.num_dropped:
+            sys.stderr.write('packet corrupted - dropped ' + str(self.framer.num_dropped - self.num_dropped) + ' frame(s) while resynchronizing\n')
+            self.num_dropped = self.framer.num_dropped
+        if len(frames) == 0:
+            return 0
+        frame_times = self.arrival.stamp(read_time, len(data), self.framer.last_end_offsets, [frame[2] for frame in frames])
+
+        if self.sparse:
+            lines, oldest, newest = self.decoder.decode_sparse(frames, frame_times)
+        else:
+            lines, oldest, newest = self.decoder.decode(frames, frame_times)
+        self.latency.record('serial_to_frame', rss.monotonic_time() - frame_times[-1])
+
+        for ii in range(len(lines)):
+            if not self.running:
+                return ii
+            self.__dispatch(lines[ii], float(oldest[ii]), float(newest[ii]))
+        return len(lines)
+
+    # Call poll() until stop() is called.  before_poll, if given, is called
+    # before every read.
+    def run(self, before_poll=None):
+        self.running = 1
+        while self.running:
+            if before_poll is not None:
+                before_poll()
+            self.poll()
+
+    # Make run() return after the current consumer.  The lines left from the
+    # current read are not handed out.
+    def stop(self):
+        self.running = 0
+
+    # Return (name, depth) of the data waiting at each step: the bytes of the
+    # last and the largest serial read, the bytes the frame parser holds that
+    # are not a complete frame yet, and the links stored in the line being
+    # filled
+    def get_queue_depths(self):
+        return [('serial_read_bytes', self.last_read_bytes),
+                ('serial_read_bytes_max', self.max_read_bytes),
+                ('framer_bytes', len(self.framer.buf) - self.framer.head),
+                ('line_links', int((self.decoder.line_buf != 127).sum()))]
+
+    def __dispatch(self, line, oldest_time, newest_time):
+        emit_time = rss.monotonic_time()
+        self.latency.record('frame_to_vector', emit_time - oldest_time)
+        self.num_lines += 1
+        if self.line_counter is not None:
+            if self.sparse:
+                num_missed = self.num_links - line[0].size
+            else:
+                num_missed = int((line == 127).sum())
+            self.line_counter.inc()
+            self.link_counter.inc(self.num_links)
+            self.miss_counter.inc(num_missed)
+            self.missed_ratio.set(num_missed/float(self.num_links))
+
+        start_time = emit_time
+        for stage, consumer in self.consumers:
+            consumer(line, newest_time)
+            end_time = rss.monotonic_time()
+            self.latency.record(stage, end_time - start_time)
+            start_time = end_time
+            if not self.running:
+                break
+
+        self.latency.record('vector_to_consumer', start_time - emit_time)
+        self.latency.record('frame_to_consumer', start_time - newest_time)
+        if self.line_counter is not None:
+            self.consumer_lag.set(start_time - newest_time)
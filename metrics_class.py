@@ -0,0 +1,202 @@
+import sys
+import time
+import socket
+import threading
+import numpy as np
+import latency_class as aLatency
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+##############################################
+# Classes for runtime throughput and error counters
+#
+# The acquisition loop keeps a reference to each Counter or Gauge it updates,
+# so an update is a single attribute increment.  The registry can be read at
+# any time:
+#   - summary_line() gives a one line summary with rates since the last call.
+#     start_summary_thread() writes it every period seconds.
+#   - exposition() gives all metrics (and the latency histograms of
+#     latency_class) in the Prometheus text exposition format.
+#     start_http_server() serves it at http://127.0.0.1:<port>/metrics
+
+class Counter:
+    # name - the metric name
+    # help_str - one line description
+    # value - the count so far.  It only goes up.
+    def __init__(self, name, help_str):
+        self.name = name
+        self.help_str = help_str
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    # name - the metric name
+    # help_str - one line description
+    # value - the most recent value
+    def __init__(self, name, help_str):
+        self.name = name
+        self.help_str = help_str
+        self.value = 0.0
+
+    def set(self, val):
+        self.value = val
+
+
+class MetricsRegistry:
+    # Constructor:
+
+    # tracker - the LatencyTracker whose histograms are also exposed
+    # metrics - the counters and gauges in the order they were created
+    # prev_summary_time, prev_summary_vals - used for the rates in summary_line()
+    def __init__(self, tracker=None):
+        if tracker is None:
+            tracker = aLatency.get_tracker()
+        self.tracker = tracker
+        self.metrics = []
+        self.by_name = {}
+        self.prev_summary_time = time.time()
+        self.prev_summary_vals = {}
+        self.lock = threading.Lock()
+
+    # return the counter with this name, creating it if needed
+    def counter(self, name, help_str=''):
+        return self.__get_or_add(name, help_str, Counter)
+
+    # return the gauge with this name, creating it if needed
+    def gauge(self, name, help_str=''):
+        return self.__get_or_add(name, help_str, Gauge)
+
+    # return the current value of a metric
+    def get(self, name):
+        return self.by_name[name].value
+
+    # Return one line with the counter values and their rates per second since
+    # the previous call, followed by the gauge values
+    def summary_line(self):
+        with self.lock:
+            now = time.time()
+            dt = max(now - self.prev_summary_time, 1e-9)
+            out = []
+            for m in self.metrics:
+                short_name = m.name
+                if short_name.startswith('rss_'):
+                    short_name = short_name[4:]
+                if isinstance(m, Counter):
+                    rate = (m.value - self.prev_summary_vals.get(m.name, 0))/dt
+                    self.prev_summary_vals[m.name] = m.value
+                    out.append('%s=%d (%.1f/s)' % (short_name, m.value, rate))
+                else:
+                    out.append('%s=%.4g' % (short_name, m.value))
+            self.prev_summary_time = now
+        return 'metrics: ' + ' '.join(out) + '\n'
+
+    # Return all metrics in the Prometheus text exposition format
+    def exposition(self):
+        out = []
+        for m in self.metrics:
+            out.append('# HELP %s %s' % (m.name, m.help_str))
+            if isinstance(m, Counter):
+                out.append('# TYPE %s counter' % m.name)
+                out.append('%s %d' % (m.name, m.value))
+            else:
+                out.append('# TYPE %s gauge' % m.name)
+                out.append('%s %r' % (m.name, float(m.value)))
+
+        name = 'rss_stage_latency_seconds'
+        out.append('# HELP %s Latency between stages of the acquisition pipeline' % name)
+        out.append('# TYPE %s histogram' % name)
+        for stage in self.tracker.stage_names:
+            h = self.tracker.get_histogram(stage)
+            cum_counts = np.cumsum(h.counts)
+            for ii in range(h.edges.size-1):
+                out.append('%s_bucket{stage="%s",le="%.3g"} %d' % (name, stage, h.edges[ii], cum_counts[ii]))
+            out.append('%s_bucket{stage="%s",le="+Inf"} %d' % (name, stage, h.get_count()))
+            out.append('%s_sum{stage="%s"} %r' % (name, stage, float(h.total)))
+            out.append('%s_count{stage="%s"} %d' % (name, stage, h.get_count()))
+        return '\n'.join(out) + '\n'
+
+    # Write summary_line() to out (stderr by default) every period seconds from
+    # a daemon thread
+    def start_summary_thread(self, period=10.0, out=None):
+        def summary_loop():
+            while True:
+                time.sleep(period)
+                if out is None:
+                    sys.stderr.write(self.summary_line())
+                else:
+                    out.write(self.summary_line())
+
+        thread = threading.Thread(target=summary_loop)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    # Serve exposition() at http://host:port/metrics from a daemon thread.
+    # Returns the server, or None if the port could not be opened.
+    def start_http_server(self, port=9110, host='127.0.0.1'):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Keep the request log out of stderr
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = HTTPServer((host, port), MetricsHandler)
+        except socket.error as e:
+            sys.stderr.write('Warning: could not start metrics server on port ' + str(port) + ': ' + str(e) + '\n')
+            return None
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def __get_or_add(self, name, help_str, metric_class):
+        with self.lock:
+            if name not in self.by_name:
+                m = metric_class(name, help_str)
+                self.metrics.append(m)
+                self.by_name[name] = m
+            return self.by_name[name]
+
+
+# The registry shared by the listen scripts and the classes they feed
+default_registry = MetricsRegistry()
+
+def get_registry():
+    return default_registry
+
+# Create the counters and gauges updated by the acquisition path, so they all
+# show up (as 0) before the first frame arrives.  Returns the registry.
+def add_acquisition_metrics(registry=None):
+    if registry is None:
+        registry = default_registry
+    registry.counter('rss_packets_total', 'Frames received with the 0xBEEF trailer')
+    registry.counter('rss_frames_corrupted_total', 'Frames dropped while resynchronizing to the frame boundaries')
+    registry.counter('rss_frames_recovered_total', 'Frames kept despite 0xBEEF inside the payload')
+    registry.counter('rss_frames_filtered_node_total', 'Frames dropped because rxId is not in nodeSet')
+    registry.counter('rss_frames_filtered_channel_total', 'Frames dropped because the channel is not in channelSet')
+    registry.counter('rss_lines_total', 'RSS lines emitted')
+    registry.counter('rss_line_links_total', 'Links in all emitted lines')
+    registry.counter('rss_line_missed_links_total', 'Links with a missed packet (127) in all emitted lines')
+    registry.gauge('rss_line_missed_ratio', 'Fraction of links missed in the most recent line')
+    registry.gauge('rss_consumer_lag_seconds', 'Time from the newest frame of a line to its consumer finishing')
+    return registry
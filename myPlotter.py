@@ -5,14 +5,17 @@
 # Initial release: 27 Jan 2016
 
 import numpy as np
-import matplotlib.pyplot as plt
 import circ_buff_class as aCircBuff
 
+COLOR_LIST = ['blue','red','black','green','orange','purple','gray',
+              'lemonchiffon','maroon','pink','coral','saddlebrown','tan','plum','olive']
+
 class MYPLOTTER:
     
     def __init__(self,rss_editor,num_samples):
         self.is_first_plot = 1
         
+        self.rss_editor = rss_editor
         self.num_links_to_plot = rss_editor.network.num_links_subset
         self.num_samples = num_samples
         
@@ -23,25 +26,18 @@ class MYPLOTTER:
         self.x_vals = np.arange(self.num_samples)-self.num_samples
     
     # Plots the current image.  This is implemented in a class so that plotting 
-    # runs as fast as possible.
-    def plot_current_image(self,cur_rss):
+    # runs as fast as possible.  rx_time is the monotonic receive time of the
+    # rss, kept with it in the buffer.
+    def plot_current_image(self,cur_rss,rx_time=None):
         
         # Set up the figure if this is the first time through
         if self.is_first_plot:
+            # matplotlib is loaded on the first plot, so importing this module
+            # stays cheap on boards that never draw
+            import matplotlib.pyplot as plt
             self.fig, self.ax = plt.subplots()
             self.link_plot_lines = []
-            
-            color_list = ['blue','red','black','green','orange','purple','gray',
-                          'lemonchiffon','maroon','pink','coral','saddlebrown','tan','plum','olive']
-            
-            if len(color_list) < self.num_links_to_plot:
-                print "Plotting too many links.  Quitting...\n"
-                quit()
-            
-            # initialize all link line line objects
-            for ii in range(self.num_links_to_plot):
-                tmp, = self.ax.plot([],[],lw=2, color=color_list[ii])
-                self.link_plot_lines.append(tmp)
+            self.__make_plot_lines()
                 
             self.ax.set_xlim(left=self.x_vals[0],right=self.x_vals[-1])
             self.ax.set_ylim(-100,-20)
@@ -54,7 +50,10 @@ class MYPLOTTER:
         ########################
         # Put next RSS into the queue
         ########################
-        self.circBuff.add_observation(cur_rss)
+        if rx_time is None:
+            self.circBuff.add_observation(cur_rss)
+        else:
+            self.circBuff.add_observation(cur_rss,rx_time)
         tmp_rss = self.circBuff.get_ordered_buffer()
         tmp_rss[tmp_rss == 127] = np.nan
         
@@ -66,6 +65,29 @@ class MYPLOTTER:
             self.ax.draw_artist(self.link_plot_lines[ii])        
         self.fig.canvas.update()
         self.fig.canvas.flush_events()
+    
+    # Call after network.update_subset() with the (old_pos, new_pos) it
+    # returned.  The buffered RSS of the links that remain moves to their new
+    # rows and the plot gets one line per link of the new subset.
+    def remap(self,old_pos,new_pos):
+        self.num_links_to_plot = self.rss_editor.network.num_links_subset
+        self.circBuff.remap_rows(old_pos,new_pos,self.num_links_to_plot)
+        if not self.is_first_plot:
+            for line in self.link_plot_lines:
+                line.remove()
+            self.link_plot_lines = []
+            self.__make_plot_lines()
+            self.fig.canvas.draw()
+    
+    # initialize all link line line objects
+    def __make_plot_lines(self):
+        if len(COLOR_LIST) < self.num_links_to_plot:
+            print "Plotting too many links.  Quitting...\n"
+            quit()
+        
+        for ii in range(self.num_links_to_plot):
+            tmp, = self.ax.plot([],[],lw=2, color=COLOR_LIST[ii])
+            self.link_plot_lines.append(tmp)
         
         
         
@@ -35,6 +35,9 @@ class aNetwork:
     #                  The elements of the vector are the link id for the [(tx,rx,ch)] list of tuples
     #                  The order of the elements determines where the link belongs with respect to the other links
     #                  The elements and the order are determined by the user's node list, channel list, and link order choice                   
+    # fw_mask - a flag for each link of link_ch_database that is a forward link (tx < rx)
+    # ch_mask - a flag for each link of link_ch_database on a channel in ch_list
+    # node_mask - a flag for each link of link_ch_database with tx and rx in node_list
     
     
     def __init__(self, node_locs, num_nodes, num_ch, node_list, ch_list, link_order_choice):
@@ -59,64 +62,91 @@ class aNetwork:
         self.link_ch_database = None
         
         self.master_indexes = None
+        self.fw_mask = None
+        self.ch_mask = None
+        self.node_mask = None
         
         self.get_idx()
         
+    # Change the node list, channel list and/or link order choice of a network
+    # that is in use.  Arguments left as None keep their current value.  Only
+    # what depends on the changed arguments is recomputed: the channel flags of
+    # the links for a new ch_list, the node flags for a new node_list, and then
+    # the master indexes.  Objects holding this network (e.g. an RssEditor) see
+    # the new subset right away.  Returns (old_pos, new_pos) from get_remap(),
+    # to pass to the remap() of the objects with per-link state sized
+    # num_links_subset (MYPLOTTER, RssDetector, ChannelSelector) so they keep
+    # the links that remain.
+    def update_subset(self, node_list=None, ch_list=None, link_order_choice=None):
+        old_master_indexes = self.master_indexes
+        
+        if node_list is not None:
+            self.node_list = np.asarray(node_list)
+            self.node_locs_subset = self.node_locs_all[self.node_list-1,:]
+            self.num_nodes_subset = self.node_list.size
+            self.num_link_lines_subset = self.num_nodes_subset*(self.num_nodes_subset-1)/2
+            self.__set_node_mask()
+        if ch_list is not None:
+            self.ch_list = np.asarray(ch_list)
+            self.num_ch_subset = self.ch_list.size
+            self.__set_ch_mask()
+        if link_order_choice is not None:
+            self.link_order_choice = link_order_choice
+        
+        self.__set_master_indexes()
+        
+        return get_remap(old_master_indexes, self.master_indexes)
+    
     # Get the indexes corresponding to user specifications
     def get_idx(self):
         
-        # create link-channel database
-        counter = 0
-        link_ch_database = []
-        for cc in range(self.num_ch_all):
-            for tx in range(self.num_nodes_all):
-                for rx in range(self.num_nodes_all):
-                    if tx != rx:
-                        link_ch_database.append([counter,tx+1,rx+1,cc+1])
-                        counter += 1
-        link_ch_database = np.array(link_ch_database)
-        self.link_ch_database = link_ch_database
-        
-        # Get indexes of forward and backward links
-        fw_idx = link_ch_database[:,1] < link_ch_database[:,2]
-        bw_idx = np.logical_not(fw_idx)
-        aw_idx = link_ch_database[:,1] > -1.
-         
-        # Get channel indexes
-        ch_idx = np.zeros(self.num_links_all)
-        for cc in self.ch_list:
-            ch_idx = (ch_idx == 1) | (link_ch_database[:,-1] == (cc))
-             
-        # Get link indexes
-        tx_idx = np.zeros(self.num_links_all)
-        rx_idx = np.zeros(self.num_links_all)
-        for nn in self.node_list:
-            tx_idx += (nn == link_ch_database[:,1])
-            rx_idx += (nn == link_ch_database[:,2])
-        link_idx = (tx_idx == 1) & (rx_idx == 1)
-         
+        # create link-channel database.  It only depends on the full network, so
+        # it is built once.
+        if self.link_ch_database is None:
+            counter = 0
+            link_ch_database = []
+            for cc in range(self.num_ch_all):
+                for tx in range(self.num_nodes_all):
+                    for rx in range(self.num_nodes_all):
+                        if tx != rx:
+                            link_ch_database.append([counter,tx+1,rx+1,cc+1])
+                            counter += 1
+            self.link_ch_database = np.array(link_ch_database)
+            self.fw_mask = self.link_ch_database[:,1] < self.link_ch_database[:,2]
+        
+        self.__set_ch_mask()
+        self.__set_node_mask()
+        self.__set_master_indexes()
+    
+    # Flag the links on a channel in ch_list
+    def __set_ch_mask(self):
+        self.ch_mask = np.in1d(self.link_ch_database[:,3], self.ch_list)
+    
+    # Flag the links whose tx and rx are both in node_list
+    def __set_node_mask(self):
+        db = self.link_ch_database
+        self.node_mask = np.in1d(db[:,1], self.node_list) & np.in1d(db[:,2], self.node_list)
+    
+    # Set the master indexes from the link flags and the link order choice
+    def __set_master_indexes(self):
+        link_ch_database = self.link_ch_database
+        subset_mask = self.ch_mask & self.node_mask
+        
         # create master index array
-        master_fw_idx = fw_idx & ch_idx & link_idx
-        master_bw_idx = bw_idx & ch_idx & link_idx
-        master_aw_idx = aw_idx & ch_idx & link_idx
-         
-        # Get the index of the backward links
-        tmp = np.zeros((link_ch_database.shape[0],3))
-        tmp[:,0:2] = link_ch_database[:,1:3]
-        tmp[:,-1] = np.arange(link_ch_database.shape[0])
-        tmp2 = tmp[master_bw_idx,:]
-         
-        tmp4 = [[] for cc in range(self.num_ch_subset)]
-         
-        for nn in self.node_list.tolist():
-            tmp3 = tmp2[tmp2[:,1] == nn]
-            val = tmp3.shape[0]/self.num_ch_subset
-            for cc in range(self.num_ch_subset):
-                tmp4[cc] += tmp3[val*cc+np.arange(val),2].tolist()
+        master_fw_idx = self.fw_mask & subset_mask
+        master_bw_idx = np.logical_not(self.fw_mask) & subset_mask
+        master_aw_idx = subset_mask
+        
+        # The backward links are ordered by channel, then by the position of
+        # their rx in node_list, then by link id
+        bw_db = link_ch_database[master_bw_idx,:]
+        rx_rank = np.zeros(self.num_nodes_all+1, dtype=int)
+        rx_rank[self.node_list] = np.arange(self.node_list.size)
+        bw_order = np.lexsort((bw_db[:,0], rx_rank[bw_db[:,2]], bw_db[:,3]))
         
         # get integer indexes of the links
         master_fw_ints = link_ch_database[master_fw_idx,0]
-        master_bw_ints = np.array(tmp4).flatten().astype(int)
+        master_bw_ints = bw_db[bw_order,0].astype(int)
         master_aw_ints = link_ch_database[master_aw_idx,0]
         
         # set the master integer indexes
@@ -135,3 +165,19 @@ class aNetwork:
         
         # compute the number of links in the new network 
         self.num_links_subset = self.master_indexes.size
+
+
+# For two master index arrays, return (old_pos, new_pos): the positions of the
+# links found in both, so that new_vec[new_pos] = old_vec[old_pos] carries the
+# state of the remaining links over to the new order
+def get_remap(old_master_indexes, new_master_indexes):
+    old_master_indexes = np.asarray(old_master_indexes)
+    new_master_indexes = np.asarray(new_master_indexes)
+    if old_master_indexes.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    old_sort = np.argsort(old_master_indexes)
+    found = np.searchsorted(old_master_indexes[old_sort], new_master_indexes)
+    found = np.minimum(found, old_master_indexes.size-1)
+    new_pos = np.nonzero(old_master_indexes[old_sort[found]] == new_master_indexes)[0]
+    old_pos = old_sort[found[new_pos]]
+    return old_pos, new_pos
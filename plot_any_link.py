@@ -17,11 +17,14 @@
 
 import sys
 import serial
-import time
 import rss as rss
 import network_class_v1 as aNetwork
 import rss_editor_class as aRssEdit
 import myPlotter as aPlotter
+import latency_class as aLatency
+import metrics_class as aMetrics
+import listener_class as aListener
+import subset_control_class as aSubset
 import numpy as np
 
 
@@ -56,15 +59,23 @@ nodeList      = range(1,maxNodes+1)  # 1, ..., 30
 numNodes      = len(nodeList)
 numChs        = len(channelList)
 numLinks      = numNodes*(numNodes-1)*numChs
-rssIndex      = 3
-string_length = maxNodes + 7
-suffix        = ['ef','be']  # "0xBEEF"
 
-# Initialize data, output file
-nodeSet       = set(nodeList)
-channelSet    = set(channelList)
-currentLine   = []  # Init serial data buffer "currentLine" as empty.
-currentLinkRSS = [127] * numLinks
+# Each frame is stamped with the estimated monotonic time its last byte was received.
+# A line is stamped with the receive time of its newest frame.  Send SIGUSR2 to
+# print the latency histograms of each stage.
+latency        = aLatency.get_tracker()
+aLatency.install_dump_signal()
+wallOffset     = rss.monotonic_to_wall_offset()
+
+# Runtime counters.  A summary line goes to stderr every summaryPeriod seconds
+# and all metrics are served at http://127.0.0.1:<metricsPort>/metrics
+# USER: set metricsPort to 0 to turn off the HTTP endpoint.
+metricsPort    = 9111
+summaryPeriod  = 10.0
+metrics        = aMetrics.add_acquisition_metrics()
+metrics.start_summary_thread(summaryPeriod)
+if metricsPort > 0:
+    metrics.start_http_server(metricsPort)
 
 ###############################
 # Set up network
@@ -88,64 +99,25 @@ myRssEdit = aRssEdit.RssEditor(myNetwork)
 num_samples = 80
 plot_obj = aPlotter.MYPLOTTER(myRssEdit,num_samples)
 
-# Run forever, adding one integer at a time from the serial port, 
-#   whenever an integer is available.
-while(1):
-    tempInt = ser.read().encode('hex')
-    currentLine.append(tempInt)
- 
-    # Whenever the end-of-line sequence is read, operate on the "packet" of data.
-    if currentLine[-2:] == suffix:
-        if len(currentLine) != string_length:
-            sys.stderr.write('packet corrupted - wrong string length\n')
-            del currentLine[:]
-            continue
-        currentLineInt = [int(x, 16) for x in currentLine]
-        rxId = currentLineInt[2]
-        currentCh = currentLineInt[-4]
- 
-        if (rxId not in nodeSet) or (currentCh not in channelSet):
-            del currentLine[:]
-            continue                    
-         
-        # Each line in the serial data has RSS values for multiple txids.
-        # Output one line per txid, rxid, ch combo.
-        for txId in nodeList:
-            # If the rxId is after the txId, then no problem -- currentCh
-            # is also the channel that node txId was transmitting on when
-            # node rxId made the measurement, because nodes transmit on a
-            # channel in increasing order.
-            if rxId > txId: 
-                ch = currentCh
-            else: 
-                ch = rss.prevChannel(channelList, currentCh)
-             
-            # If the link (tx, rx, ch) is one we are supposed to watch
-            if txId != rxId:  
-                i = rss.linkNumForTxRxChLists(txId, rxId, ch, nodeList, channelList)
-                 
-                # If the RSS has already been recorded for this link on 
-                # this "line", then output the line first, and then restart 
-                # with a new line.
-                if currentLinkRSS[i] < 127:
-                    cur_line = ' '.join(map(str,currentLinkRSS)) + ' ' + str(time.time()) + '\n'
-                    myRssEdit.observe(cur_line)
-                     
-                    plot_obj.plot_current_image(myRssEdit.get_rss())
-                     
-#                     sys.stdout.write(str(myRssEdit.get_rss().astype('int')) + '\n')
-#                     sys.stdout.flush()
-                     
-                    # Output currentLinkRSS vector
-                    # Restart with a new line by resetting currentLinkRSS
-                    currentLinkRSS = [127] * numLinks
-                 
-                # Store the RSS 
-                currentLinkRSS[i] = rss.hex2signedint(currentLine[rssIndex+txId-1])
- 
-        # Remove serial data from the buffer.
-        currentLine = []
-        
-
-    
-    
+# The listener reads the serial port in bulk, finds and stamps the frames,
+# decodes them into lines of RSS and hands each line to its consumers.  The time
+# spent in each consumer is recorded as a latency stage.
+listener = aListener.RssListener(ser, maxNodes, nodeList, channelList, metrics)
+
+# The plotted nodes and channels can be changed without a restart: write
+# "NODES:CHANNELS[:ORDER]" (e.g. "1,2,3:6,7") to subsetFile.  The change is
+# made between two lines and the links that remain keep their history.
+subsetFile = 'plot_any_link_subset.txt'
+subsetControl = aSubset.SubsetControl(myNetwork, subsetFile)
+subsetControl.add_consumer(myRssEdit)
+subsetControl.add_consumer(plot_obj)
+listener.add_consumer(subsetControl.check, 'subset_control')
+
+# Give each line to the RSS editor as a vector and plot the selected links
+def plot_line(line, lineNewestRxTime):
+    myRssEdit.observe_rss(line, lineNewestRxTime + wallOffset, lineNewestRxTime)
+    plot_obj.plot_current_image(myRssEdit.get_rss(),myRssEdit.get_rx_time())
+listener.add_consumer(plot_line, 'plotter')
+
+# Run forever, plotting lines whenever bytes are available
+listener.run()
@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import latency_class as aLatency
+
+##############################################
+# A class for profiling a long running listen script on demand
+#
+# Nothing is profiled until the process gets toggle_signum (SIGUSR1 by default):
+#   kill -USR1 <pid>    start profiling
+#   kill -USR1 <pid>    stop, and write the profile to log_dir
+#   kill -USR2 <pid>    write the latency of each stage (latency_class, with the
+#                       consumer_<name> stages of listener_class) and the
+#                       current queue depths to out
+# While it is off the only cost is the two signal handlers, so it can be left
+# installed in a service that runs for days.
+#
+# Two kinds of profile can be taken:
+#   'sample'   - a SIGPROF interval timer interrupts the process every interval
+#                seconds of CPU time and the stack of the main thread is
+#                counted.  The cost is one stack walk per sample, whatever the
+#                code does.  Written as <name>.stacks (one "outer;...;inner
+#                count" line per stack, the collapsed format of flamegraph.pl)
+#                and <name>.txt (the functions with the most samples).
+#   'cprofile' - cProfile of the main thread, written as <name>.prof (for
+#                pstats) and <name>.txt (sorted by cumulative time).  Exact
+#                call counts, but every call is slowed down.
+# <name> is profile_<start time>_<pid>_<n>, where n counts the profiles of the
+# process, so profiles started in the same second do not overwrite each other.
+class SignalProfiler:
+    # Constructor:
+
+    # log_dir - directory the profiles are written to
+    # mode - 'sample' or 'cprofile'
+    # interval - seconds of CPU time between samples in 'sample' mode
+    # out - file the status and messages are written to (stderr by default)
+
+    # queue_sources - functions returning a list of (name, depth) pairs
+    # running - 1 while profiling
+    # stack_counts - number of samples of each stack (tuple of frames, outer first)
+    # profile - the cProfile.Profile in 'cprofile' mode
+    # num_profiles - number of profiles stopped so far
+    def __init__(self, log_dir, mode='sample', interval=0.005, out=None):
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError('mode must be sample or cprofile')
+        self.log_dir = log_dir
+        self.mode = mode
+        self.interval = interval
+        self.out = out
+
+        self.queue_sources = []
+        self.running = 0
+        self.start_time = None
+        self.stack_counts = {}
+        self.num_samples = 0
+        self.profile = None
+        self.num_profiles = 0
+
+    ############
+    # Methods
+    ############
+
+    # Add a function returning the current depth of some queues as a list of
+    # (name, depth) pairs, e.g. RssListener.get_queue_depths.  It is only called
+    # when the status is written.
+    def add_queue_source(self, func):
+        self.queue_sources.append(func)
+
+    # Toggle profiling on toggle_signum and write the status on status_signum
+    # (replacing latency_class.install_dump_signal).  Does nothing where the
+    # signals do not exist.
+    def install(self, toggle_signum=None, status_signum=None):
+        if toggle_signum is None:
+            toggle_signum = getattr(signal, 'SIGUSR1', None)
+        if status_signum is None:
+            status_signum = getattr(signal, 'SIGUSR2', None)
+        if toggle_signum is not None:
+            signal.signal(toggle_signum, lambda sig, frame: self.toggle())
+            signal.siginterrupt(toggle_signum, False)
+        if status_signum is not None:
+            signal.signal(status_signum, lambda sig, frame: self.write_status())
+            signal.siginterrupt(status_signum, False)
+
+    # Start profiling if it is off, otherwise stop it and write the profile
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    # Start profiling
+    def start(self):
+        if self.running:
+            return
+        self.start_time = time.time()
+        if self.mode == 'sample':
+            self.stack_counts = {}
+            self.num_samples = 0
+            signal.signal(signal.SIGPROF, self.__sample)
+            signal.siginterrupt(signal.SIGPROF, False)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.running = 1
+        self.__write('profiling started (' + self.mode + ')\n')
+
+    # Stop profiling and write the profile.  Returns the names of the files
+    # written.
+    def stop(self):
+        if not self.running:
+            return []
+        self.running = 0
+        if self.mode == 'sample':
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        else:
+            self.profile.disable()
+
+        self.num_profiles += 1
+        base = os.path.join(self.log_dir, 'profile_%s_%d_%d' % (time.strftime('%Y_%m_%d_%H%M%S', time.localtime(self.start_time)),
+                                                                os.getpid(), self.num_profiles))
+        secs = time.time() - self.start_time
+        # the recorder keeps running even if the profile cannot be written
+        try:
+            if self.mode == 'sample':
+                fnames = self.__write_samples(base, secs)
+            else:
+                fnames = self.__write_cprofile(base, secs)
+        except (IOError, OSError) as e:
+            self.__write('profiling stopped after %.1f s, could not write the profile: %s\n' % (secs, e))
+            return []
+        finally:
+            self.profile = None
+            self.stack_counts = {}
+        self.__write('profiling stopped after %.1f s, wrote %s\n' % (secs, ' '.join(fnames)))
+        return fnames
+
+    # Return the latency summary and the queue depths as a string
+    def status(self):
+        out = [aLatency.get_tracker().summary()]
+        depths = []
+        for func in self.queue_sources:
+            depths.extend(func())
+        if len(depths) > 0:
+            out.append('queues: ' + ' '.join(['%s=%d' % (name, depth) for name, depth in depths]) + '\n')
+        if self.running:
+            out.append('profiling (%s) for %.1f s\n' % (self.mode, time.time() - self.start_time))
+        return ''.join(out)
+
+    # Write status() to out
+    def write_status(self):
+        self.__write(self.status())
+
+    def __write(self, text):
+        if self.out is None:
+            sys.stderr.write(text)
+        else:
+            self.out.write(text)
+
+    # SIGPROF handler: count the stack of the interrupted frame
+    def __sample(self, sig, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        stack = tuple(reversed(stack))
+        self.stack_counts[stack] = self.stack_counts.get(stack, 0) + 1
+        self.num_samples += 1
+
+    def __write_samples(self, base, secs):
+        self_counts = {}
+        total_counts = {}
+        with open(base + '.stacks', 'w') as f:
+            for stack, count in sorted(self.stack_counts.items(), key=lambda item: -item[1]):
+                names = ['%s:%s' % func for func in stack]
+                f.write(';'.join(names) + ' ' + str(count) + '\n')
+                self_counts[names[-1]] = self_counts.get(names[-1], 0) + count
+                for name in set(names):
+                    total_counts[name] = total_counts.get(name, 0) + count
+
+        num = max(self.num_samples, 1)
+        with open(base + '.txt', 'w') as f:
+            f.write('%d samples every %g s of CPU time over %.1f s\n' % (self.num_samples, self.interval, secs))
+            for title, counts in [('self', self_counts), ('total', total_counts)]:
+                f.write('\n%8s %7s  function (%s)\n' % ('samples', '%', title))
+                for name, count in sorted(counts.items(), key=lambda item: -item[1])[:40]:
+                    f.write('%8d %6.1f%%  %s\n' % (count, 100.*count/num, name))
+        return [base + '.stacks', base + '.txt']
+
+    def __write_cprofile(self, base, secs):
+        self.profile.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w') as f:
+            f.write('cProfile over %.1f s\n' % secs)
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(60)
+        return [base + '.prof', base + '.txt']
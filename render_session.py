@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+
+# This script renders plots of a recorded session (text rss_*.txt, binary
+# *.rssd or columnar *.rssc) straight to PNG files or a video, without a
+# display.  Each frame shows the last --window lines of the selected links,
+# ending --step lines after the previous frame:
+#   --kind lines   - one line per link against sample number, like MYPLOTTER
+#   --kind heatmap - links x samples image of the RSS
+#
+# Frames are split into contiguous ranges, one per worker process.  Each worker
+# only loads the lines its frames show (text sessions seek with their index,
+# which is built once first if the file has none), uses the Agg backend,
+# builds its figure once and only updates the data of the artists for every
+# frame.  With --video the PNG frames are encoded with ffmpeg (which must be on
+# the PATH) and removed afterwards unless --keep-frames is given.
+#
+# Operation:
+#   python render_session.py data/rss_id1_2016_01_27_000.rssd frames --node-list 1,4 --ch-list 6,7,8,9,10
+#   python render_session.py data/rss_id1_2016_01_27_000.txt out --num-ch 16 --kind heatmap --video session.mp4 --fps 30
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+import multiprocessing
+import numpy as np
+import session_io as aSession
+import network_class_v1 as aNetwork
+
+FRAME_PATTERN = 'frame_%06d.png'
+
+# Return (rss, times) of the selected links for lines i0 <= line < i1 of a
+# session as float, with nan for missed packets.  index is the SessionIndex of
+# a text session (None to load or build it).
+def load_links(fname, link_idx, i0, i1, index=None):
+    if aSession.is_binary_session(fname):
+        session = aSession.BinarySession(fname)
+        rss_sel = np.asarray(session.rss[i0:i1, :][:, link_idx], dtype=float)
+        times = np.asarray(session.time[i0:i1])
+    elif aSession.is_column_session(fname):
+        rss_block, times = aSession.ColumnSession(fname).get_sample_range(link_idx, i0, i1)
+        rss_sel = rss_block.astype(float)
+    else:
+        reader = aSession.TextSessionReader(fname)
+        reader.index = index
+        rss_block, times = reader.get_sample_range(i0, i1)
+        rss_sel = rss_block[:, link_idx].astype(float)
+    rss_sel[rss_sel == 127] = np.nan
+    return rss_sel, times
+
+# Return (number of lines, time of the first line, index) of a session.  index
+# is the SessionIndex of a text session (built in one pass if it has none), so
+# the workers can seek with it, and None for other sessions.
+def session_extent(fname):
+    if aSession.is_binary_session(fname):
+        session = aSession.BinarySession(fname)
+        if session.num_samples == 0:
+            return 0, None, None
+        return session.num_samples, float(session.time[0]), None
+    if aSession.is_column_session(fname):
+        session = aSession.ColumnSession(fname)
+        if session.num_samples == 0:
+            return 0, None, None
+        return session.num_samples, float(session.time[0]), None
+    reader = aSession.TextSessionReader(fname)
+    if reader.num_links is None:
+        return 0, None, None
+    index = reader.get_index()
+    if index.samples.size == 0:
+        return 0, None, None
+    num_lines = int(index.samples[-1])
+    for rss_block, time_block, offsets in reader.iter_chunks_with_offsets(int(index.offsets[-1])):
+        num_lines += time_block.size
+    return num_lines, float(reader.to_seconds(index.times[:1])[0]), index
+
+# Render frames [k0, k1).  Returns the number of frames written.
+def render_range(task):
+    fname, link_idx, out_dir, k0, k1, num_lines, first_time, index, opts = task
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    win = opts['window']
+    step = opts['step']
+    num_links = len(link_idx)
+
+    # the lines shown by frames k0 to k1-1
+    i0 = max((k0+1)*step - win, 0)
+    i1 = min(k1*step, num_lines)
+    rss_sel, times = load_links(fname, link_idx, i0, i1, index)
+
+    fig, ax = plt.subplots(figsize=(opts['width']/float(opts['dpi']), opts['height']/float(opts['dpi'])), dpi=opts['dpi'])
+    title = ax.set_title('')
+    if opts['kind'] == 'lines':
+        x_vals = np.arange(win) - win
+        artists = [ax.plot(x_vals, np.nan*np.ones(win), lw=1.5)[0] for ll in range(num_links)]
+        ax.set_xlim(x_vals[0], x_vals[-1])
+        ax.set_ylim(opts['vmin'], opts['vmax'])
+        ax.set_xlabel('Sample')
+        ax.set_ylabel('RSS (dBm)')
+        ax.grid(True)
+    else:
+        image = ax.imshow(np.nan*np.ones((num_links, win)), aspect='auto', interpolation='nearest',
+                          vmin=opts['vmin'], vmax=opts['vmax'], extent=(-win, 0, num_links-0.5, -0.5))
+        fig.colorbar(image, ax=ax, label='RSS (dBm)')
+        ax.set_xlabel('Sample')
+        ax.set_ylabel('Link')
+
+    # frame k shows the window of lines ending at line (k+1)*step
+    for k in range(k0, k1):
+        end = min((k+1)*step, num_lines)
+        start = max(end - win, 0)
+        block = np.nan*np.ones((win, num_links))
+        block[win-(end-start):, :] = rss_sel[start-i0:end-i0, :]
+
+        if opts['kind'] == 'lines':
+            for ll in range(num_links):
+                artists[ll].set_ydata(block[:, ll])
+        else:
+            image.set_data(block.T)
+        title.set_text('t = %.2f s' % (times[end-1-i0] - first_time))
+        fig.savefig(os.path.join(out_dir, FRAME_PATTERN % k), dpi=opts['dpi'])
+
+    plt.close(fig)
+    return k1 - k0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render plots of a recorded session to PNG frames or a video")
+    parser.add_argument("session", help="text session file or binary/columnar session directory")
+    parser.add_argument("out_dir", help="directory for the PNG frames")
+    parser.add_argument("--kind", default='lines', choices=['lines', 'heatmap'], help="plot type (default lines)")
+    parser.add_argument("--node-list", default="1,2", help="comma separated node ids to plot (default 1,2)")
+    parser.add_argument("--ch-list", default="1,2", help="comma separated channel numbers to plot (default 1,2)")
+    parser.add_argument("--link-order", default='f', choices=['f', 'b', 'fb', 'a'], help="link order choice (default f)")
+    parser.add_argument("--num-ch", type=int, help="number of channels programmed on the nodes (default: from the session)")
+    parser.add_argument("--window", type=int, default=80, help="lines shown in each frame (default 80)")
+    parser.add_argument("--step", type=int, default=1, help="lines between frames (default 1)")
+    parser.add_argument("--max-frames", type=int, help="stop after this many frames")
+    parser.add_argument("--vmin", type=float, default=-100., help="lowest RSS shown (default -100)")
+    parser.add_argument("--vmax", type=float, default=-20., help="highest RSS shown (default -20)")
+    parser.add_argument("--width", type=int, default=800, help="frame width in pixels (default 800)")
+    parser.add_argument("--height", type=int, default=600, help="frame height in pixels (default 600)")
+    parser.add_argument("--dpi", type=int, default=100, help="frame dpi (default 100)")
+    parser.add_argument("--video", help="also encode the frames to this video file with ffmpeg")
+    parser.add_argument("--fps", type=float, default=25., help="video frame rate (default 25)")
+    parser.add_argument("--keep-frames", action="store_true", help="keep the PNG frames after encoding the video")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    ###############################
+    # Set up network
+    ###############################
+    if aSession.is_binary_session(args.session):
+        session = aSession.BinarySession(args.session)
+        num_links, channel_list = session.num_links, session.meta.get('channel_list')
+    elif aSession.is_column_session(args.session):
+        session = aSession.ColumnSession(args.session)
+        num_links, channel_list = session.num_links, session.meta.get('channel_list')
+    else:
+        num_links, channel_list = aSession.TextSessionReader(args.session).num_links, None
+    num_lines, first_time, index = session_extent(args.session)
+    if not num_lines:
+        sys.stderr.write('Error: no lines in ' + args.session + '\n')
+        return
+    num_ch = args.num_ch or (len(channel_list) if channel_list else None)
+    if num_ch is None:
+        sys.stderr.write('Error: --num-ch is needed for text sessions\n')
+        return
+    num_nodes = aSession.infer_num_nodes(num_links, num_ch)
+    if num_nodes is None:
+        sys.stderr.write('Error: ' + str(num_links) + ' links does not match ' + str(num_ch) + ' channels\n')
+        return
+    node_list = np.array([int(n) for n in args.node_list.split(',')])
+    ch_list = np.array([int(c) for c in args.ch_list.split(',')])
+    myNetwork = aNetwork.aNetwork(np.zeros((num_nodes,2)), num_nodes, num_ch, node_list, ch_list, args.link_order)
+
+    ###############################
+    # Split the frames over the workers
+    ###############################
+    num_frames = int(np.ceil(num_lines/float(args.step)))
+    if args.max_frames is not None:
+        num_frames = min(num_frames, args.max_frames)
+    if not os.path.isdir(args.out_dir):
+        os.makedirs(args.out_dir)
+    opts = {'kind': args.kind, 'window': args.window, 'step': args.step, 'vmin': args.vmin, 'vmax': args.vmax,
+            'width': args.width, 'height': args.height, 'dpi': args.dpi}
+    bounds = np.linspace(0, num_frames, args.jobs + 1).astype(int)
+    tasks = [(args.session, myNetwork.master_indexes, args.out_dir, bounds[ii], bounds[ii+1], num_lines, first_time, index, opts)
+             for ii in range(args.jobs) if bounds[ii+1] > bounds[ii]]
+    sys.stderr.write('Rendering ' + str(num_frames) + ' frame(s) of ' + str(myNetwork.num_links_subset) +
+                     ' link(s) with ' + str(len(tasks)) + ' process(es)\n')
+
+    t_start = time.time()
+    pool = multiprocessing.Pool(len(tasks))
+    num_done = sum(pool.map(render_range, tasks))
+    pool.close()
+    pool.join()
+    secs = time.time() - t_start
+    sys.stderr.write('Rendered %d frame(s) in %.1f s (%.1f frames/s)\n' % (num_done, secs, num_done/max(secs, 1e-9)))
+
+    if args.video:
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(args.fps),
+               '-i', os.path.join(args.out_dir, FRAME_PATTERN), '-pix_fmt', 'yuv420p',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', args.video]
+        try:
+            subprocess.check_call(cmd)
+        except OSError:
+            sys.stderr.write('Error: ffmpeg was not found, the frames are in ' + args.out_dir + '\n')
+            return
+        sys.stderr.write('Wrote ' + args.video + '\n')
+        if not args.keep_frames:
+            for fname in glob.glob(os.path.join(args.out_dir, 'frame_*.png')):
+                os.remove(fname)
+
+
+if __name__ == '__main__':
+    main()
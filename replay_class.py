@@ -0,0 +1,203 @@
+import time
+import numpy as np
+import rss as rss
+import session_io as aSession
+
+##############################################
+# A class for replaying a recorded session as if it came from the listen node
+#
+# The session can be a text session (rss_*.txt), a binary session (*.rssd) or
+# a columnar session (*.rssc).
+# next_line() returns one RSS vector of all links and its time at a time, so it
+# can be fed to RssEditor.observe_rss() and from there to MYPLOTTER or any
+# analytics, exactly like a live line.  Pacing:
+#   speed = 1.0  - lines are released at the rate they were recorded
+#   speed = N    - N times faster than real time
+#   speed = 0    - as fast as possible (to measure the capacity of the pipeline)
+# seek() jumps to a time in the session.  Binary and columnar sessions seek
+# with a binary search on their time column.  Text sessions find the line with
+# their index (session_io.SessionIndex, built in memory on the first seek if
+# the file has none) and read from its byte offset.
+#
+# The achieved line rate and speed (session seconds per wall second) are kept,
+# along with how far behind the pacing schedule the consumer fell.
+class SessionReplay:
+    # Constructor:
+
+    # fname - the session file (text) or directory (binary or columnar)
+    # speed - the replay speed (see above)
+    # start_time - the session time (s) to start from.  Default: the beginning
+    # end_time - the session time (s) to stop at.  Default: the end
+    # chunk_rows - number of lines read at a time from a binary session
+    #              (a columnar session is read a chunk of the session at a time)
+
+    # num_links - number of links per line
+    # channel_list - the channels programmed on the nodes, if the session knows
+    # num_lines - lines released since the start or the last seek
+    # max_lag - the largest delay (s) behind the pacing schedule
+    def __init__(self, fname, speed=1.0, start_time=None, end_time=None, chunk_rows=5000):
+        self.fname = fname
+        self.speed = speed
+        self.end_time = end_time
+        self.chunk_rows = chunk_rows
+
+        self.is_binary = aSession.is_binary_session(fname)
+        self.is_column = aSession.is_column_session(fname)
+        if self.is_binary:
+            self.session = aSession.BinarySession(fname)
+            self.num_links = self.session.num_links
+            self.channel_list = self.session.meta.get('channel_list')
+        elif self.is_column:
+            self.session = aSession.ColumnSession(fname)
+            self.num_links = self.session.num_links
+            self.channel_list = self.session.channel_list
+        else:
+            self.session = aSession.TextSessionReader(fname)
+            self.num_links = self.session.num_links
+            self.channel_list = None
+
+        self.source = None
+        self.block_rss = None
+        self.block_time = None
+        self.block_idx = 0
+
+        self.num_lines = 0
+        self.first_wall = None
+        self.first_time = None
+        self.last_time = None
+        self.max_lag = 0.
+
+        self.seek(start_time)
+
+    ############
+    # Methods
+    ############
+
+    # Return (rss, cur_time) of the next line, after waiting until it is due.
+    # rss is a float vector of all links (127 for a missed packet) and cur_time
+    # is in s.  Returns None at the end of the session.
+    def next_line(self):
+        if self.block_idx >= self.block_time.size:
+            if not self.__next_block():
+                return None
+        ii = self.block_idx
+        cur_time = self.block_time[ii]
+        if self.end_time is not None and cur_time >= self.end_time:
+            return None
+        self.block_idx += 1
+
+        self.__pace(cur_time)
+        self.num_lines += 1
+        self.last_time = cur_time
+        return self.block_rss[ii, :].astype(float), cur_time
+
+    # Jump to the first line at or after cur_time (s).  None goes back to the
+    # start.  The rate statistics start over.
+    def seek(self, cur_time=None):
+        if self.is_binary:
+            i0 = 0 if cur_time is None else self.session.index_for_time(cur_time)
+            self.source = self.__binary_blocks(i0)
+        elif self.is_column:
+            i0 = 0 if cur_time is None else self.session.index_for_time(cur_time)
+            self.source = self.__column_blocks(i0)
+        else:
+            self.source = self.__text_blocks(cur_time)
+        self.block_rss = np.zeros((0, self.num_links or 0), dtype=np.int8)
+        self.block_time = np.zeros(0)
+        self.block_idx = 0
+        self.__reset_stats()
+
+    # Change the replay speed.  The pacing restarts from the current line.
+    def set_speed(self, speed):
+        self.speed = speed
+        self.__reset_stats()
+
+    # Return (lines per second, achieved speed) since the start or last seek
+    def get_rate(self):
+        if self.first_wall is None:
+            return (0., 0.)
+        wall = max(rss.monotonic_time() - self.first_wall, 1e-9)
+        return (self.num_lines/wall, (self.last_time - self.first_time)/wall)
+
+    # Return a one line report of the achieved rate
+    def summary(self):
+        lines_per_s, achieved = self.get_rate()
+        target = 'max' if not self.speed else '%gx' % self.speed
+        return ('replay: %d lines, %.1f lines/s, %.2fx real time (target %s), max lag %.3f s\n' %
+                (self.num_lines, lines_per_s, achieved, target, self.max_lag))
+
+    def __iter__(self):
+        while True:
+            line = self.next_line()
+            if line is None:
+                return
+            yield line
+
+    # Wait until the line recorded at cur_time is due
+    def __pace(self, cur_time):
+        now = rss.monotonic_time()
+        if self.first_wall is None:
+            self.first_wall = now
+            self.first_time = cur_time
+            return
+        if not self.speed:
+            return
+        due = self.first_wall + (cur_time - self.first_time)/float(self.speed)
+        if due > now:
+            time.sleep(due - now)
+        else:
+            self.max_lag = max(self.max_lag, now - due)
+
+    def __reset_stats(self):
+        self.num_lines = 0
+        self.first_wall = None
+        self.first_time = None
+        self.last_time = None
+        self.max_lag = 0.
+
+    # Load the next block of lines.  Returns 0 at the end of the session.
+    def __next_block(self):
+        for rss_block, time_block in self.source:
+            if time_block.size > 0:
+                self.block_rss = rss_block
+                self.block_time = time_block
+                self.block_idx = 0
+                return 1
+        return 0
+
+    def __binary_blocks(self, i0):
+        for ii in range(i0, self.session.num_samples, self.chunk_rows):
+            yield (np.asarray(self.session.rss[ii:ii+self.chunk_rows, :]),
+                   np.asarray(self.session.time[ii:ii+self.chunk_rows]))
+
+    # Yield the chunks of a columnar session from line i0 on, as lines x links
+    def __column_blocks(self, i0):
+        chunk_len = self.session.chunk_len
+        for c in range(i0 // chunk_len, self.session.num_chunks):
+            lo = max(i0 - c*chunk_len, 0)
+            hi = min(self.session.num_samples - c*chunk_len, chunk_len)
+            yield (np.asarray(self.session.rss[c][:, lo:hi]).T,
+                   np.asarray(self.session.time[c*chunk_len+lo:c*chunk_len+hi]))
+
+    # Yield the chunks of a text session from the first line at or after
+    # cur_time (the start if None).  The read starts at the byte offset of the
+    # index entry before that line and the lines up to it are dropped.
+    def __text_blocks(self, cur_time):
+        offset = None
+        skip = 0
+        if cur_time is not None and self.num_links is not None:
+            i0 = self.session.index_for_time(cur_time)
+            index = self.session.get_index()
+            j = np.searchsorted(index.samples, i0, side='right') - 1
+            if j >= 0:
+                offset = int(index.offsets[j])
+                skip = i0 - int(index.samples[j])
+            else:
+                skip = i0
+        for rss_block, time_block, offsets in self.session.iter_chunks_with_offsets(offset):
+            if skip > 0:
+                num = min(skip, time_block.size)
+                rss_block = rss_block[num:, :]
+                time_block = time_block[num:]
+                skip -= num
+            yield rss_block, self.session.to_seconds(time_block)
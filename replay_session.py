@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+
+# This script replays a recorded session (text rss_*.txt or binary *.rssd)
+# through the same RssEditor and MYPLOTTER path as plot_any_link.py, instead of
+# reading the listen node.  Use it to reproduce an incident from a recording or,
+# with --speed 0 and --no-plot, to measure how many lines per second the
+# pipeline can take.  The achieved rate is written to stderr every few seconds
+# and at the end.  --change switches the plotted nodes and channels at a time in
+# the session (aNetwork.update_subset()), keeping the history of the links that
+# remain in the plot.
+#
+# Operation:
+#   python replay_session.py data/rss_id1_2016_01_27_000.txt --num-ch 16 --node-list 1,4 --ch-list 6,7,8,9,10
+#   python replay_session.py data/rss_id1_2016_01_27_000.rssd --speed 10 --start 600 --end 900
+#   python replay_session.py data/rss_id1_2016_01_27_000.rssd --speed 0 --no-plot
+#   python replay_session.py data/rss_id1_2016_01_27_000.rssd --change 60:1,2,3:6,7 --change 120:1,4:6,7,8
+#
+# Version History:
+#
+# Version 1.0:  Initial Release
+
+import sys
+import argparse
+import numpy as np
+import rss as rss
+import network_class_v1 as aNetwork
+import rss_editor_class as aRssEdit
+import latency_class as aLatency
+import replay_class as aReplay
+import session_io as aSession
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session through the plotting path")
+    parser.add_argument("session", help="text session file or binary session directory")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed: 1 real time, N for N times faster, 0 as fast as possible")
+    parser.add_argument("--start", type=float, help="seconds from the beginning of the session to start at")
+    parser.add_argument("--end", type=float, help="seconds from the beginning of the session to stop at")
+    parser.add_argument("--node-list", default="1,2", help="comma separated node ids to plot (default 1,2)")
+    parser.add_argument("--ch-list", default="1,2", help="comma separated channel numbers to plot (default 1,2)")
+    parser.add_argument("--link-order", default='f', choices=['f', 'b', 'fb', 'a'], help="link order choice (default f)")
+    parser.add_argument("--num-ch", type=int, help="number of channels programmed on the nodes (default: from the session)")
+    parser.add_argument("--num-samples", type=int, default=80, help="number of samples shown in the plot (default 80)")
+    parser.add_argument("--no-plot", action="store_true", help="do not plot, only run the RssEditor")
+    parser.add_argument("--change", action="append", default=[], metavar="SECONDS:NODES:CHANNELS",
+                        help="from SECONDS after the start of the session, use the comma separated NODES and CHANNELS (may be repeated)")
+    parser.add_argument("--report-period", type=float, default=5.0, help="seconds between rate reports (default 5)")
+    args = parser.parse_args()
+
+    changes = []
+    for change in args.change:
+        try:
+            secs, nodes, chs = change.split(':')
+            changes.append((float(secs), np.array([int(n) for n in nodes.split(',')]),
+                            np.array([int(c) for c in chs.split(',')])))
+        except ValueError:
+            sys.stderr.write('Error: --change must be SECONDS:NODES:CHANNELS, not ' + change + '\n')
+            return
+    changes.sort(key=lambda change: change[0])
+
+    replay = aReplay.SessionReplay(args.session, speed=0)
+    if replay.num_links is None:
+        sys.stderr.write('Error: no lines in ' + args.session + '\n')
+        return
+    first_line = replay.next_line()
+    if first_line is None:
+        sys.stderr.write('Error: no lines in ' + args.session + '\n')
+        return
+    first_time = first_line[1]
+    start_time = None if args.start is None else first_time + args.start
+    end_time = None if args.end is None else first_time + args.end
+    replay = aReplay.SessionReplay(args.session, args.speed, start_time, end_time)
+
+    ###############################
+    # Set up network
+    ###############################
+    num_ch = args.num_ch or (len(replay.channel_list) if replay.channel_list else None)
+    if num_ch is None:
+        sys.stderr.write('Error: --num-ch is needed for text sessions\n')
+        return
+    num_nodes = aSession.infer_num_nodes(replay.num_links, num_ch)
+    if num_nodes is None:
+        sys.stderr.write('Error: ' + str(replay.num_links) + ' links does not match ' + str(num_ch) + ' channels\n')
+        return
+    node_locs = np.random.random((num_nodes,2))
+    node_list = np.array([int(n) for n in args.node_list.split(',')])
+    ch_list = np.array([int(c) for c in args.ch_list.split(',')])
+    myNetwork = aNetwork.aNetwork(node_locs, num_nodes, num_ch, node_list, ch_list, args.link_order)
+
+    ################################
+    # Set up RSS editor and plotter
+    ################################
+    myRssEdit = aRssEdit.RssEditor(myNetwork)
+    plot_obj = None
+    if not args.no_plot:
+        import myPlotter as aPlotter
+        plot_obj = aPlotter.MYPLOTTER(myRssEdit, args.num_samples)
+
+    latency = aLatency.get_tracker()
+    aLatency.install_dump_signal()
+
+    sys.stderr.write('Replaying ' + args.session + ' (' + str(replay.num_links) + ' links, ' +
+                     str(myNetwork.num_links_subset) + ' selected)\n')
+    next_report = rss.monotonic_time() + args.report_period
+    for rss_all, cur_time in replay:
+        # switch to the next subset once its time is reached
+        while len(changes) > 0 and cur_time >= first_time + changes[0][0]:
+            secs, nodes, chs = changes.pop(0)
+            old_pos, new_pos = myNetwork.update_subset(nodes, chs)
+            myRssEdit.remap(old_pos, new_pos)
+            if plot_obj is not None:
+                plot_obj.remap(old_pos, new_pos)
+            sys.stderr.write('At %g s: nodes %s, channels %s (%d links, %d kept)\n' %
+                             (secs, nodes.tolist(), chs.tolist(), myNetwork.num_links_subset, new_pos.size))
+
+        rxTime = rss.monotonic_time()
+        myRssEdit.observe_rss(rss_all, cur_time, rxTime)
+
+        if plot_obj is not None:
+            plot_obj.plot_current_image(myRssEdit.get_rss(), myRssEdit.get_rx_time())
+        else:
+            myRssEdit.get_rss()
+        doneTime = rss.monotonic_time()
+        latency.record('vector_to_consumer', doneTime - rxTime)
+        latency.record('frame_to_consumer', doneTime - rxTime)
+
+        if doneTime >= next_report:
+            sys.stderr.write(replay.summary())
+            next_report = doneTime + args.report_period
+
+    sys.stderr.write(replay.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import sys
+import numpy as np
+
+##############################################
+# A class for putting RSS vectors on a uniform time grid
+#
+# A line of RSS is emitted whenever a link repeats, so the time between lines
+# changes with packet loss and with the number of channels.  Consumers that
+# assume a fixed sample rate (FFTs, myCircBuff windows, plots against sample
+# number) should be fed the output of this class instead: one RSS vector every
+# period seconds, at times start_time + k*period.
+#
+# A 127 (missed packet) in an input vector means "no measurement" for that link
+# at that time, not a value.  For every link and grid time g we use the newest
+# real measurement at or before g (v0 at t0) and, for the 'linear' method, the
+# next one after g (v1 at t1):
+#   'hold'   - the value is v0
+#   'linear' - the value is interpolated between v0 and v1 when t1 - t0 <= max_gap,
+#              otherwise it is v0
+# The output is 127 when the link has no measurement yet or g - t0 > max_gap,
+# so long dropouts stay visible as missed packets.
+#
+# Live use: call observe() with each vector and its time.  It returns the grid
+# points that are final.  With 'hold' that is every grid time before the newest
+# input; with 'linear' the output lags by max_gap, since a later measurement
+# within max_gap could still change a value.  Batch use: observe_block() with a
+# whole session (or chunks of it) followed by flush(), or the resample()
+# function below.  Both give the same values.  All the work is vectorized over
+# the links.
+class RssResampler:
+    # Constructor:
+
+    # num_links - the number of links in each RSS vector
+    # period - the grid spacing (s)
+    # method - 'hold' or 'linear'
+    # max_gap - measurements older than this (s) are not used.  Must be given
+    #           for 'linear'; None means hold forever with 'hold'.
+    # start_time - the first grid time.  Defaults to the time of the first input.
+
+    # next_k - the index of the next grid point to emit
+    # buf_rss, buf_time - the inputs that may still be needed
+    # carry_val, carry_time - for each link, the newest measurement that was
+    #                         dropped from buf_rss (time is nan if none)
+    # num_out_of_order - inputs dropped because their time went backwards
+    def __init__(self, num_links, period, method='hold', max_gap=1.0, start_time=None):
+        if method not in ['hold', 'linear']:
+            sys.stderr.write('Error in RssResampler: method must be hold or linear\n')
+        if method == 'linear' and max_gap is None:
+            sys.stderr.write('Error in RssResampler: linear needs a max_gap\n')
+        self.num_links = num_links
+        self.period = float(period)
+        self.method = method
+        self.max_gap = max_gap
+        self.start_time = start_time
+
+        self.next_k = 0
+        self.buf_rss = np.zeros((0, num_links))
+        self.buf_time = np.zeros(0)
+        self.carry_val = 127.0*np.ones(num_links)
+        self.carry_time = np.nan*np.ones(num_links)
+        self.num_out_of_order = 0
+
+    ############
+    # Methods - We assume that rss vectors are numpy arrays
+    ############
+
+    # Add one RSS vector taken at cur_time (s).  Returns (rss, times) of the
+    # grid points that are now final: rss is k x num_links and k may be 0.
+    def observe(self, cur_rss, cur_time):
+        return self.observe_block(np.asarray(cur_rss, dtype=float).reshape(1, -1), np.array([cur_time], dtype=float))
+
+    # Add a block of RSS vectors (n x num_links) with increasing times.
+    # Returns the grid points that are now final, like observe().
+    def observe_block(self, rss_block, times):
+        rss_block = np.asarray(rss_block, dtype=float)
+        times = np.asarray(times, dtype=float)
+
+        # inputs must not go back in time
+        newest = self.buf_time[-1] if self.buf_time.size else -np.inf
+        keep = times >= np.maximum.accumulate(np.append(newest, times))[1:]
+        if not np.all(keep):
+            self.num_out_of_order += int(np.sum(~keep))
+            rss_block = rss_block[keep, :]
+            times = times[keep]
+        if times.size == 0:
+            return self.__empty()
+
+        if self.start_time is None:
+            self.start_time = times[0]
+        self.buf_rss = np.concatenate((self.buf_rss, rss_block))
+        self.buf_time = np.concatenate((self.buf_time, times))
+
+        # the newest time for which no later input can change the output
+        final_time = self.buf_time[-1]
+        if self.method == 'linear':
+            final_time -= self.max_gap
+        return self.__emit_before(final_time, 0)
+
+    # Emit every remaining grid point up to the last input.  Use at the end of
+    # a batch.
+    def flush(self):
+        if self.buf_time.size == 0:
+            return self.__empty()
+        return self.__emit_before(self.buf_time[-1], 1)
+
+    # Return the time of grid point k
+    def get_grid_time(self, k):
+        return self.start_time + k*self.period
+
+    # Emit the grid points g < final_time (g <= final_time if inclusive) and
+    # drop the inputs that are no longer needed
+    def __emit_before(self, final_time, inclusive):
+        num_k = int(np.floor((final_time - self.start_time)/self.period)) + 1
+        grid = self.get_grid_time(np.arange(self.next_k, max(self.next_k, num_k)))
+        if inclusive:
+            grid = grid[grid <= final_time]
+        else:
+            grid = grid[grid < final_time]
+        if grid.size == 0:
+            return self.__empty()
+
+        out = self.__values_at(grid)
+        self.next_k += grid.size
+        self.__trim(grid[-1])
+        return out, grid
+
+    # Compute the value of every link at each grid time
+    def __values_at(self, grid):
+        R = self.buf_rss
+        T = self.buf_time
+        n = T.size
+        L = self.num_links
+        rows = np.arange(n).reshape(-1, 1)
+        cols = np.arange(L).reshape(1, -1)
+        valid = R != 127
+
+        # newest measurement at or before each grid time
+        pos = np.searchsorted(T, grid, side='right') - 1
+        last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        prev_row = np.where(pos.reshape(-1, 1) >= 0, last_valid[np.maximum(pos, 0), :], -1)
+        have_prev = prev_row >= 0
+        prev_val = np.where(have_prev, R[np.maximum(prev_row, 0), cols], self.carry_val)
+        prev_time = np.where(have_prev, T[np.maximum(prev_row, 0)], self.carry_time)
+
+        g = grid.reshape(-1, 1)
+        missing = np.isnan(prev_time)
+        if self.max_gap is not None:
+            missing[~missing] = (g - prev_time)[~missing] > self.max_gap
+        out = 1.0*prev_val
+
+        if self.method == 'linear':
+            # oldest measurement after each grid time
+            next_valid = np.minimum.accumulate(np.where(valid, rows, n)[::-1, :], axis=0)[::-1, :]
+            next_valid = np.vstack((next_valid, n*np.ones((1, L), dtype=next_valid.dtype)))
+            next_row = next_valid[pos + 1, :]
+            have_next = next_row < n
+            next_val = R[np.minimum(next_row, n-1), cols]
+            next_time = T[np.minimum(next_row, n-1)]
+
+            interp = have_next & ~missing
+            interp[interp] = (next_time - prev_time)[interp] <= self.max_gap
+            frac = (np.broadcast_to(g, out.shape)[interp] - prev_time[interp])/(next_time - prev_time)[interp]
+            out[interp] = prev_val[interp] + frac*(next_val - prev_val)[interp]
+
+        out[missing] = 127.0
+        return out
+
+    # Drop the inputs at or before the last emitted grid time, keeping the
+    # newest measurement of each link in carry_val/carry_time
+    def __trim(self, last_grid):
+        m = int(np.searchsorted(self.buf_time, last_grid, side='right'))
+        if m == 0:
+            return
+        valid = self.buf_rss[:m, :] != 127
+        last_row = m - 1 - np.argmax(valid[::-1, :], axis=0)
+        has_val = np.any(valid, axis=0)
+        self.carry_val[has_val] = self.buf_rss[last_row[has_val], np.nonzero(has_val)[0]]
+        self.carry_time[has_val] = self.buf_time[last_row[has_val]]
+        self.buf_rss = self.buf_rss[m:, :]
+        self.buf_time = self.buf_time[m:]
+
+    def __empty(self):
+        return np.zeros((0, self.num_links)), np.zeros(0)
+
+
+# Resample a whole session (n x num_links RSS with times in s) in one call.
+# Returns (rss, times) on the grid.
+def resample(rss, times, period, method='hold', max_gap=1.0, start_time=None):
+    resampler = RssResampler(np.shape(rss)[1], period, method, max_gap, start_time)
+    rss_a, times_a = resampler.observe_block(rss, times)
+    rss_b, times_b = resampler.flush()
+    return np.concatenate((rss_a, rss_b)), np.concatenate((times_a, times_b))
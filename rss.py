@@ -3,7 +3,6 @@ import platform
 import glob
 import numpy.ma as ma
 import numpy as np
-import serial
 import time
 from struct import unpack
 
@@ -41,6 +40,10 @@ class FixedLenMaskedBuffer:
 # ########################################        
     
 def run_sniffer():
+    # pyserial is only needed here, so it is not loaded by scripts that just
+    # use the link numbering helpers
+    import serial
+
     # Establish a serial connection and clear the buffer
     serial_filename = serialFileName()
     sys.stderr.write('Using USB port file: ' + serial_filename + '\n')
@@ -83,6 +86,43 @@ def run_sniffer():
     return (len(node_list),sorted(channel_list))
 
 
+# ########################################
+# Monotonic clock for timestamping frames.  Unlike time.time(), it never jumps
+# when the system clock is set (e.g. by NTP after a BeagleBone boots), so
+# differences between two stamps are true elapsed times.
+def _get_monotonic_func():
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+        ts = timespec()
+
+        def monotonic():
+            clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(ts))
+            return ts.tv_sec + ts.tv_nsec*1e-9
+        monotonic()
+        return monotonic
+    except (OSError, AttributeError, TypeError):
+        sys.stderr.write('Warning: no monotonic clock, using time.time()\n')
+        return time.time
+
+monotonic_time = _get_monotonic_func()
+
+# Returns the offset to add to a monotonic_time() stamp to get wall-clock time
+def monotonic_to_wall_offset():
+    return time.time() - monotonic_time()
+# ########################################
+
+
 
 
 # Convert Tx, Rx, and Ch numbers to link number
@@ -123,6 +163,10 @@ def hex2signedint(he):
     # Convert from hexidecimal 2's complement to signed 8 bit integer
     return (int(he,16) + 2**7) % 2**8 - 2**7
 
+def byte2signedint(b):
+    # Convert an unsigned byte value (0-255) to a signed 8 bit integer
+    return (b + 2**7) % 2**8 - 2**7
+
 def prevChannel(channelList, ch_now):
     if (channelList.count(ch_now) > 0):
         i = channelList.index(ch_now)
@@ -1,4 +1,5 @@
 import numpy as np
+import sparse_line as aSparse
 
 ##############################################
 # A class for manipulating lines of RSS from linkAllLinks.py
@@ -17,32 +18,68 @@ class RssEditor:
     
     # cur_line_all - the str that contains the RSS and time for one row
     # cur_time - the current time
+    # cur_rx_time - the monotonic receive time of the newest frame in the line
     # cur_rss_all - the current rss values from the line
     # most_recent_non_missed_rss_all - saves the most recent non-missed-packet RSS for all links
     # all_nonmiss_flag - a flag that indicates if all links have a non-missed-packet RSS
+    # cur_sparse_links - the links set by the last sparse update (None after a full line)
     
     def __init__(self, my_network):
         self.network = my_network
         
         self.cur_line_all = None
         self.cur_time = None
+        self.cur_rx_time = None
         self.cur_rss_all = None
         
         self.most_recent_non_missed_rss_all = 127.0*np.ones(self.network.num_links_all)
         self.all_nonmiss_flag = 0
+        self.cur_sparse_links = None
     
     ############
     # Methods - We assume that rss_line is a numpy array
     ############       
     
     # This takes a current line (as a string) from the file and parses it into
-    # rss and time
-    def observe(self,line):
+    # rss and time.  rx_time is the monotonic receive time of the line, if known.
+    # Sparse lines (<link>:<rss> pairs, see sparse_line.py) are applied with
+    # observe_sparse().
+    def observe(self,line,rx_time=None):
+        if aSparse.is_sparse_line(line):
+            links, rss_vals, cur_time = aSparse.parse_sparse_line(line)
+            self.observe_sparse(links,rss_vals,cur_time,rx_time)
+            self.cur_line_all = line
+            return
         self.cur_line_all = line
+        self.cur_rx_time = rx_time
+        self.cur_sparse_links = None
         lineList         = [float(i) for i in line.split()]
         self.cur_time    = lineList.pop(-1)  # remove last element
         self.cur_rss_all = np.array(lineList) # get all rss values       
     
+    # Same as observe(), but for an RSS vector of all links that is already
+    # parsed (e.g. from a recorded session), so no string is built and split
+    def observe_rss(self,rss_all,cur_time,rx_time=None):
+        self.cur_line_all = None
+        self.cur_rx_time = rx_time
+        self.cur_sparse_links = None
+        self.cur_time    = cur_time
+        self.cur_rss_all = np.asarray(rss_all,dtype=float)
+    
+    # Same as observe(), but for a sparse line: links are the link numbers heard
+    # in the line and rss_vals their RSS.  All other links are 127.  Only the
+    # links of this and the previous sparse line are written.
+    def observe_sparse(self,links,rss_vals,cur_time,rx_time=None):
+        if self.cur_sparse_links is None:
+            self.cur_rss_all = 127.0*np.ones(self.network.num_links_all)
+        else:
+            self.cur_rss_all[self.cur_sparse_links] = 127.0
+        self.cur_sparse_links = np.asarray(links,dtype=int)
+        self.cur_rss_all[self.cur_sparse_links] = rss_vals
+        self.cur_line_all = None
+        self.cur_rx_time = rx_time
+        self.cur_time    = cur_time
+    
     # Return to the user the rss values requested
     def get_rss(self):
         return self.cur_rss_all[self.network.master_indexes]
@@ -50,8 +87,12 @@ class RssEditor:
     # Return to the user the rss values requested.  If the current measurement
     # is a missed packet, exchange it with the most recent non-missed RSS value
     def get_nonmiss_rss(self):
-        nonmiss_idx = self.cur_rss_all != 127.0
-        self.most_recent_non_missed_rss_all[nonmiss_idx] = self.cur_rss_all[nonmiss_idx]
+        if self.cur_sparse_links is not None:
+            nonmiss_links = self.cur_sparse_links[self.cur_rss_all[self.cur_sparse_links] != 127.0]
+            self.most_recent_non_missed_rss_all[nonmiss_links] = self.cur_rss_all[nonmiss_links]
+        else:
+            nonmiss_idx = self.cur_rss_all != 127.0
+            self.most_recent_non_missed_rss_all[nonmiss_idx] = self.cur_rss_all[nonmiss_idx]
         
         if (self.all_nonmiss_flag == 0) & (np.sum(self.most_recent_non_missed_rss_all[self.network.master_indexes] == 127.0) == 0):
             self.all_nonmiss_flag = 1
@@ -65,6 +106,16 @@ class RssEditor:
     # Return the current time
     def get_time(self):
         return self.cur_time
+    
+    # Return the monotonic receive time of the current line (None if unknown)
+    def get_rx_time(self):
+        return self.cur_rx_time
+    
+    # Call after network.update_subset() with the (old_pos, new_pos) it
+    # returned.  The RSS is kept for all links, so only all_nonmiss_flag has to
+    # be checked again for the new subset.
+    def remap(self,old_pos,new_pos):
+        self.all_nonmiss_flag = int(np.sum(self.most_recent_non_missed_rss_all[self.network.master_indexes] == 127.0) == 0)
         
         
             
@@ -0,0 +1,179 @@
+import os
+import sys
+import hashlib
+import numpy as np
+
+##############################################
+# A class for radio tomographic imaging (RTI) of the links in a network
+#
+# The ellipse model weights pixel p for link l with 1/sqrt(d_l) when the pixel
+# lies inside the ellipse with foci at the tx and rx, i.e. when
+# d_tx,p + d_rx,p < d_l + excess_path_len.  The image is the Tikhonov
+# regularized least squares estimate
+#
+#     x = (W^T W + alpha I)^-1 W^T y
+#
+# where y is the attenuation of every link selected by the network.  All the
+# channels (and both directions) of a node pair share the same row of W, so we
+# build the sparse weight matrix once per node pair (link line) and fold the
+# channels into a sparse sum matrix A (link lines x links):
+#
+#     W^T W = W_l^T diag(c) W_l,   W^T y = W_l^T A y
+#
+# where c is the number of selected links on each link line.  The projection
+# P = (W_l^T diag(c) W_l + alpha I)^-1 W_l^T is precomputed once and cached on
+# disk, keyed by the node locations, node list, link indexes, pixel size and
+# model parameters.  Each frame then costs one fold of the links onto their
+# link lines (A y, done with np.bincount) and one dense product with P.
+#
+# scipy.sparse is only imported when the projection has to be built, so a
+# cached geometry loads with NumPy alone.
+class RtiEngine:
+    # Constructor:
+
+    # network - an aNetwork object.  Its master_indexes decide the links we use
+    # pixel_size - the width of a square pixel (same units as the node locations)
+    # excess_path_len - the excess path length of the ellipse model
+    # alpha - the Tikhonov regularization parameter
+    # margin - how far the image extends beyond the nodes
+    # cache_dir - the directory where projection matrices are saved.  Use None
+    #             to always build the projection
+
+    # x_vals, y_vals - the pixel center coordinates along each axis
+    # line_nodes - the (tx,rx) node ids of each link line, with tx < rx
+    # line_of_link - the link line of each selected link
+    # A - the sparse link line x link sum matrix, built on first use
+    # P - the pixel x link line projection matrix
+    def __init__(self, network, pixel_size=0.5, excess_path_len=0.1, alpha=10.0,
+                 margin=0.5, cache_dir='rti_cache'):
+        self.network = network
+        self.pixel_size = pixel_size
+        self.excess_path_len = excess_path_len
+        self.alpha = alpha
+        self.margin = margin
+        self.cache_dir = cache_dir
+
+        self.x_vals = None
+        self.y_vals = None
+        self.line_nodes = None
+        self.line_of_link = None
+        self.A = None
+        self.P = None
+
+        self.__set_links()
+        self.__set_grid()
+
+        cache_fname = self.get_cache_fname()
+        if (cache_fname is not None) and os.path.isfile(cache_fname):
+            self.P = np.load(cache_fname)['P']
+        else:
+            self.P = self.__build_projection()
+            if cache_fname is not None:
+                if not os.path.isdir(self.cache_dir):
+                    os.makedirs(self.cache_dir)
+                np.savez(cache_fname, P=self.P)
+
+    ############
+    # Methods - We assume that atten is a numpy array of the selected links
+    ############
+
+    # Return the image (ny x nx) for a vector of link attenuations
+    def get_image(self, atten):
+        line_atten = np.bincount(self.line_of_link, weights=atten, minlength=self.line_nodes.shape[0])
+        return self.P.dot(line_atten).reshape(self.y_vals.size, self.x_vals.size)
+
+    # Return the image for the current rss and the baseline rss of the
+    # selected links.  Missed packets (127) contribute no attenuation.
+    def observe(self, cur_rss, base_rss):
+        atten = np.asarray(base_rss, dtype=float) - cur_rss
+        atten[(cur_rss == 127) | np.isnan(atten)] = 0.
+        return self.get_image(atten)
+
+    # Return the (x,y) location of the brightest pixel of an image
+    def get_max_loc(self, image):
+        row, col = np.unravel_index(np.argmax(image), image.shape)
+        return (self.x_vals[col], self.y_vals[row])
+
+    # Return the weight matrix for all selected links (links x pixels)
+    def get_weight_matrix(self):
+        return self.__get_sum_matrix().T.dot(self.__build_line_weights()).tocsr()
+
+    # Return the name of the cache file for this geometry, or None if caching
+    # is turned off
+    def get_cache_fname(self):
+        if self.cache_dir is None:
+            return None
+
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(self.network.node_locs_all, dtype=float).tobytes())
+        h.update(np.ascontiguousarray(self.network.node_list, dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(self.network.master_indexes, dtype=np.int64).tobytes())
+        h.update(repr((self.pixel_size, self.excess_path_len, self.alpha, self.margin)).encode())
+        return os.path.join(self.cache_dir, 'rti_' + h.hexdigest() + '.npz')
+
+    # Find the link lines of the selected links
+    def __set_links(self):
+        link_info = self.network.link_ch_database[self.network.master_indexes, :]
+        tx = np.minimum(link_info[:, 1], link_info[:, 2])
+        rx = np.maximum(link_info[:, 1], link_info[:, 2])
+
+        pair_code = tx*(self.network.num_nodes_all+1) + rx
+        unique_codes, self.line_of_link = np.unique(pair_code, return_inverse=True)
+        self.line_nodes = np.array([unique_codes // (self.network.num_nodes_all+1),
+                                    unique_codes % (self.network.num_nodes_all+1)]).T
+
+    # Return the sum matrix A, building it the first time
+    def __get_sum_matrix(self):
+        if self.A is None:
+            import scipy.sparse as sparse
+            num_lines = self.line_nodes.shape[0]
+            num_links = self.line_of_link.size
+            self.A = sparse.csr_matrix((np.ones(num_links), (self.line_of_link, np.arange(num_links))),
+                                       shape=(num_lines, num_links))
+        return self.A
+
+    # Set the pixel centers from the locations of the selected nodes
+    def __set_grid(self):
+        locs = self.network.node_locs_subset
+        x_min, y_min = locs.min(axis=0) - self.margin
+        x_max, y_max = locs.max(axis=0) + self.margin
+        self.x_vals = np.arange(x_min + self.pixel_size/2., x_max, self.pixel_size)
+        self.y_vals = np.arange(y_min + self.pixel_size/2., y_max, self.pixel_size)
+
+    # Build the sparse link line x pixel weight matrix with the ellipse model
+    def __build_line_weights(self):
+        import scipy.sparse as sparse
+        xx, yy = np.meshgrid(self.x_vals, self.y_vals)
+        pix = np.array([xx.flatten(), yy.flatten()]).T
+
+        rows = []
+        cols = []
+        vals = []
+        for ll in range(self.line_nodes.shape[0]):
+            tx_loc = self.network.node_locs_all[self.line_nodes[ll, 0]-1, :]
+            rx_loc = self.network.node_locs_all[self.line_nodes[ll, 1]-1, :]
+            d_link = np.sqrt(np.sum((tx_loc - rx_loc)**2))
+            d_tx = np.sqrt(np.sum((pix - tx_loc)**2, axis=1))
+            d_rx = np.sqrt(np.sum((pix - rx_loc)**2, axis=1))
+
+            in_ellipse = np.nonzero(d_tx + d_rx < d_link + self.excess_path_len)[0]
+            rows.append(ll*np.ones(in_ellipse.size, dtype=int))
+            cols.append(in_ellipse)
+            vals.append(np.ones(in_ellipse.size)/np.sqrt(max(d_link, self.pixel_size)))
+
+        return sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                 shape=(self.line_nodes.shape[0], pix.shape[0]))
+
+    # Compute the regularized inverse projection for the link lines
+    def __build_projection(self):
+        import scipy.sparse as sparse
+        W_l = self.__build_line_weights()
+        counts = np.bincount(self.line_of_link, minlength=self.line_nodes.shape[0]).astype(float)
+
+        WtW = W_l.T.dot(sparse.diags(counts, 0)).dot(W_l).toarray()
+        WtW[np.diag_indices_from(WtW)] += self.alpha
+
+        if np.sum(W_l.sum(axis=1) == 0) > 0:
+            sys.stderr.write('Warning in RtiEngine: some links cross no pixels\n')
+
+        return np.linalg.solve(WtW, W_l.T.toarray())
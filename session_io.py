@@ -0,0 +1,740 @@
+import os
+import sys
+import time
+import json
+import shutil
+import datetime
+import numpy as np
+import network_class_v1 as aNetwork
+
+##############################################
+# Reading and writing recorded RSS sessions
+#
+# Text sessions are what listenAllLinks.py and junk_mod.py write: one line per
+# RSS vector, with the RSS of every link (127 for a missed packet) followed by
+# a time stamp.  junk_mod.py starts the file with a "Started at: <datetime>"
+# header and stamps lines with ms since start.  listenAllLinks.py has no header
+# and stamps lines with seconds since the epoch.
+#
+# Binary sessions are directories (<name>.rssd) with one file per column:
+#   rss.bin   - int8, num_samples x num_links, row-major
+#   time.bin  - float64, num_samples.  Seconds since the epoch when the start
+#               time is known, otherwise seconds since the start of the file.
+#               Sorted, so it is the index for seeking by time.
+#   meta.json - num_samples, num_links, num_nodes, channel_list, start_time and
+#               the size/mtime of the text file it was converted from.
+# meta.json is written last, so a directory without it is incomplete.
+#
+# Columnar sessions (<name>.rssc) hold the same data for link-centric queries.
+# The lines are cut into chunks of chunk_len lines and each chunk is stored
+# link-major, so the RSS of one link over one chunk is chunk_len contiguous
+# bytes.  Links are in the order of aNetwork.link_ch_database (the column order
+# of the text files).
+#   rss.bin     - int8, num_chunks x num_links x chunk_len (the last chunk is
+#                 padded with 127)
+#   time.bin    - float64, num_samples, as for binary sessions
+#   summary.bin - min and max of the RSS heard (int8) and the number of lines
+#                 heard (int32) for each chunk and link, num_chunks x num_links
+#   meta.json   - as for binary sessions, plus layout, chunk_len and num_chunks
+# A query for a few links over a time range only reads the chunks that overlap
+# the range and in which the links were heard.
+#
+# Sparse lines (only the links heard in each line, see sparse_line.py) are
+# written by listenAllLinks.py with outputFormat 'sparse' or 'sparse_binary'.
+#
+# A text session can have a sparse time index next to it (<name>.txt.idx):
+#   # rss session index: every <K>
+#   <sample> <byte offset> <time stamp as written>
+# with one line for every K-th data line (samples 0, K, 2K, ...).
+# TextSessionWriter writes it while recording and build_index() writes it for
+# older files in one pass (index_sessions.py).  TextSessionReader uses it to
+# seek by time or sample with a binary search and reads at most K lines it does
+# not need.  For a file without one it builds the index in memory and leaves
+# the data directory alone.
+
+TIME_EPOCH_S = 'epoch_s'
+TIME_MS_SINCE_START = 'ms_since_start'
+
+HEADER_PREFIX = 'Started at: '
+BINARY_EXT = '.rssd'
+COLUMN_EXT = '.rssc'
+COLUMN_LAYOUT = 'column'
+DEFAULT_CHUNK_LEN = 4096
+SUMMARY_DTYPE = np.dtype([('min', np.int8), ('max', np.int8), ('valid', np.int32)])
+INDEX_EXT = '.idx'
+INDEX_PREFIX = '# rss session index: every '
+DEFAULT_INDEX_EVERY = 1000
+
+# Parse the "Started at: " header of a text session.  Returns a datetime, or
+# None if line is not a header.
+def parse_header(line):
+    if isinstance(line, bytes) and not isinstance(line, str):
+        line = line.decode('ascii', 'replace')
+    if not line.startswith(HEADER_PREFIX):
+        return None
+    stamp = line[len(HEADER_PREFIX):].strip()
+    for fmt in ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S']:
+        try:
+            return datetime.datetime.strptime(stamp, fmt)
+        except ValueError:
+            pass
+    return None
+
+# Convert a local datetime (as written by datetime.datetime.now()) to seconds
+# since the epoch
+def datetime_to_epoch(dt):
+    return time.mktime(dt.timetuple()) + dt.microsecond*1e-6
+
+# Return the number of nodes N such that num_links = N*(N-1)*num_ch, or None
+def infer_num_nodes(num_links, num_ch):
+    if num_ch <= 0 or num_links % num_ch != 0:
+        return None
+    pairs = num_links // num_ch
+    N = int(round((1 + np.sqrt(1 + 4*pairs))/2.))
+    if N*(N-1) == pairs:
+        return N
+    return None
+
+
+class TextSessionReader:
+    # Constructor:
+
+    # fname - the text session file
+    # chunk_bytes - approximate number of bytes parsed per chunk
+
+    # start_time - the datetime of the "Started at:" header, or None
+    # time_format - TIME_MS_SINCE_START or TIME_EPOCH_S, guessed from the
+    #               header and the first time stamp
+    # num_links - number of RSS values per line
+    # data_offset - byte offset of the first data line
+    # index - the SessionIndex used for seeking, loaded (or built) when first needed
+    def __init__(self, fname, chunk_bytes=8*1024*1024):
+        self.fname = fname
+        self.chunk_bytes = chunk_bytes
+        self.start_time = None
+        self.time_format = None
+        self.num_links = None
+        self.data_offset = 0
+        self.index = None
+
+        self.__read_first_lines()
+
+    # Yield (rss, times) for consecutive chunks of the file.  rss is int8,
+    # lines x num_links and times is float64 as written in the file.  Lines
+    # with the wrong number of values (e.g. the last line of a session cut by
+    # a power loss) are skipped.
+    def iter_chunks(self):
+        for rss_block, time_block, offsets in self.iter_chunks_with_offsets():
+            yield rss_block, time_block
+
+    # Same as iter_chunks(), but also yield the byte offset of each line.  Start
+    # at start_offset (the offset of a data line) if given.
+    def iter_chunks_with_offsets(self, start_offset=None, chunk_bytes=None):
+        if self.num_links is None:
+            return
+        if start_offset is None:
+            start_offset = self.data_offset
+        if chunk_bytes is None:
+            chunk_bytes = self.chunk_bytes
+        f = open(self.fname, 'rb')
+        f.seek(start_offset)
+        block_offset = start_offset
+        leftover = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if len(block) == 0:
+                break
+            block = leftover + block
+            cut = block.rfind(b'\n')
+            if cut < 0:
+                leftover = block
+                continue
+            leftover = block[cut+1:]
+            yield self.__parse_block(block[:cut+1], block_offset)
+            block_offset += cut + 1
+        if len(leftover.strip()) > 0:
+            yield self.__parse_block(leftover + b'\n', block_offset)
+        f.close()
+
+    # Read the whole file.  Returns (rss, times)
+    def read_all(self):
+        rss_list = []
+        time_list = []
+        for rss_block, time_block in self.iter_chunks():
+            rss_list.append(rss_block)
+            time_list.append(time_block)
+        if len(rss_list) == 0:
+            return np.zeros((0, self.num_links or 0), dtype=np.int8), np.zeros(0)
+        return np.concatenate(rss_list), np.concatenate(time_list)
+
+    # Return the SessionIndex of the file.  The sidecar index is used if it
+    # matches the file, otherwise the index is built in one pass (and saved
+    # when save is 1).
+    def get_index(self, save=0):
+        if self.index is None:
+            self.index = load_index(self.fname, self.data_offset)
+        if self.index is None:
+            self.index = build_index(self.fname, chunk_bytes=self.chunk_bytes, save=save)
+        return self.index
+
+    # Return the index of the first line with a time (s) at or after t
+    def index_for_time(self, t):
+        end = 0
+        for sample, rss_block, time_block in self.__iter_from_time(t):
+            ahead = np.nonzero(self.to_seconds(time_block) >= t)[0]
+            if ahead.size > 0:
+                return sample + int(ahead[0])
+            end = sample + time_block.size
+        return end
+
+    # Return (rss, times) for lines with t0 <= time < t1 (s), assuming the
+    # time stamps increase through the file
+    def get_time_range(self, t0, t1):
+        rss_list = []
+        time_list = []
+        for sample, rss_block, time_block in self.__iter_from_time(t0):
+            secs = self.to_seconds(time_block)
+            keep = (secs >= t0) & (secs < t1)
+            rss_list.append(rss_block[keep])
+            time_list.append(secs[keep])
+            if secs.size > 0 and secs[-1] >= t1:
+                break
+        return self.__join(rss_list, time_list)
+
+    # Return (rss, times) for lines i0 <= sample < i1, with times in seconds
+    def get_sample_range(self, i0, i1):
+        rss_list = []
+        time_list = []
+        if i1 <= i0 or self.num_links is None:
+            return self.__join(rss_list, time_list)
+        index = self.get_index()
+        j = np.searchsorted(index.samples, i0, side='right') - 1
+        for sample, rss_block, time_block in self.__iter_from_entry(j):
+            lo = max(i0 - sample, 0)
+            hi = min(i1 - sample, time_block.size)
+            if hi > lo:
+                rss_list.append(rss_block[lo:hi])
+                time_list.append(self.to_seconds(time_block[lo:hi]))
+            if sample + time_block.size >= i1:
+                break
+        return self.__join(rss_list, time_list)
+
+    # Convert time stamps as written in the file to seconds: since the epoch if
+    # the start time is known, otherwise since the start of the file
+    def to_seconds(self, times):
+        if self.time_format == TIME_EPOCH_S:
+            return times
+        if self.start_time is not None:
+            return datetime_to_epoch(self.start_time) + times/1000.
+        return times/1000.
+
+    # Return the chunks (sample, rss, times) starting at the index entry
+    # just before the first line at or after t (s)
+    def __iter_from_time(self, t):
+        if self.num_links is None:
+            return iter([])
+        index = self.get_index()
+        j = np.searchsorted(self.to_seconds(index.times), t, side='left') - 1
+        return self.__iter_from_entry(j)
+
+    # Yield (sample, rss, times) for chunks starting at index entry j
+    # (the start of the data if j < 0).  sample is the number of the first line
+    # of the chunk.  The chunks are about two index intervals long.
+    def __iter_from_entry(self, j):
+        index = self.get_index()
+        if j < 0 or index.samples.size == 0:
+            sample, offset = 0, self.data_offset
+        else:
+            sample, offset = int(index.samples[j]), int(index.offsets[j])
+        chunk_bytes = min(self.chunk_bytes, max(64*1024, int(2*index.every*index.get_line_bytes())))
+        for rss_block, time_block, offsets in self.iter_chunks_with_offsets(offset, chunk_bytes):
+            yield sample, rss_block, time_block
+            sample += time_block.size
+
+    def __join(self, rss_list, time_list):
+        if len(rss_list) == 0:
+            return np.zeros((0, self.num_links or 0), dtype=np.int8), np.zeros(0)
+        return np.concatenate(rss_list), np.concatenate(time_list)
+
+    # Find the header, the first data line and guess the time format
+    def __read_first_lines(self):
+        f = open(self.fname, 'rb')
+        offset = 0
+        for line in f:
+            dt = parse_header(line)
+            if dt is not None:
+                self.start_time = dt
+            elif len(line.strip()) > 0:
+                vals = line.split()
+                self.num_links = len(vals) - 1
+                first_time = float(vals[-1])
+                self.data_offset = offset
+                break
+            offset += len(line)
+        f.close()
+
+        if self.num_links is None:
+            return
+        if self.start_time is not None or first_time < 1e9:
+            self.time_format = TIME_MS_SINCE_START
+        else:
+            self.time_format = TIME_EPOCH_S
+
+    # Parse a block of whole lines with one vectorized call.  Fall back to one
+    # line at a time when the block has a malformed line.
+    def __parse_block(self, block, block_offset):
+        ncols = self.num_links + 1
+        line_lens = np.diff(np.append(-1, np.nonzero(np.frombuffer(block, dtype=np.uint8) == 10)[0]))
+        offsets = block_offset + np.append(0, np.cumsum(line_lens)[:-1])
+
+        vals = np.fromstring(block, sep=' ')
+        if vals.size == line_lens.size*ncols:
+            vals = vals.reshape(-1, ncols)
+            return vals[:, :-1].astype(np.int8), vals[:, -1], offsets
+
+        rows = []
+        keep = []
+        for ii, line in enumerate(block.split(b'\n')[:line_lens.size]):
+            tmp = line.split()
+            if len(tmp) != ncols:
+                continue
+            try:
+                rows.append([float(x) for x in tmp])
+                keep.append(ii)
+            except ValueError:
+                continue
+        sys.stderr.write('Warning: skipped ' + str(line_lens.size - len(rows)) + ' malformed line(s) in ' + self.fname + '\n')
+        vals = np.array(rows, dtype=float).reshape(-1, ncols)
+        return vals[:, :-1].astype(np.int8), vals[:, -1], offsets[keep]
+
+
+class SessionIndex:
+    # Constructor:
+
+    # every - number of lines between index entries
+    # samples - line number of each entry (0, every, 2*every, ...)
+    # offsets - byte offset of each entry's line in the text session
+    # times - time stamp of each entry's line as written in the file
+    def __init__(self, every, samples, offsets, times):
+        self.every = every
+        self.samples = np.asarray(samples, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.times = np.asarray(times, dtype=float)
+
+    # Return the average number of bytes per line between the entries
+    def get_line_bytes(self):
+        if self.samples.size < 2:
+            return 1024.
+        return (self.offsets[-1] - self.offsets[0])/float(self.samples[-1] - self.samples[0])
+
+    # Write the index to fname (via a temporary file renamed in place)
+    def save(self, fname):
+        tmp_fname = fname + '.tmp'
+        f = open(tmp_fname, 'w')
+        f.write(INDEX_PREFIX + str(self.every) + '\n')
+        for ii in range(self.samples.size):
+            f.write('%d %d %r\n' % (self.samples[ii], self.offsets[ii], float(self.times[ii])))
+        f.close()
+        os.rename(tmp_fname, fname)
+
+
+class TextSessionWriter:
+    # Constructor:
+
+    # fname - the text session file to create
+    # every - write an index entry every this many lines (0 for no index)
+
+    # offset - byte offset of the next line in the file
+    # num_samples - data lines written
+    # f_index - the sidecar index file, or None
+    def __init__(self, fname, every=DEFAULT_INDEX_EVERY):
+        self.fname = fname
+        self.every = every
+        self.offset = 0
+        self.num_samples = 0
+        self.f_out = open(fname, 'w')
+        self.f_index = None
+        if every > 0:
+            self.f_index = open(index_name_for(fname), 'w')
+            self.f_index.write(INDEX_PREFIX + str(every) + '\n')
+            self.f_index.flush()
+
+    # Write text that is not a data line (e.g. the "Started at: " header)
+    def write(self, text):
+        self.f_out.write(text)
+        self.offset += len(text)
+
+    # Write one data line (ending with '\n') whose time stamp is time_stamp,
+    # and an index entry if it is the every-th line
+    def write_line(self, line, time_stamp):
+        if self.f_index is not None and self.num_samples % self.every == 0:
+            self.f_index.write('%d %d %s\n' % (self.num_samples, self.offset, time_stamp))
+            self.f_index.flush()
+        self.f_out.write(line)
+        self.offset += len(line)
+        self.num_samples += 1
+
+    def close(self):
+        self.f_out.close()
+        if self.f_index is not None:
+            self.f_index.close()
+
+
+class BinarySessionWriter:
+    # Constructor:
+
+    # dirname - the session directory to create (<name>.rssd).  It is written
+    #           as <dirname>.tmp and renamed when closed.
+    # num_links - number of links per line
+    # meta - a dict of extra metadata saved in meta.json
+    def __init__(self, dirname, num_links, meta=None):
+        self.dirname = dirname
+        self.tmp_dirname = dirname + '.tmp'
+        self.num_links = num_links
+        self.meta = dict(meta or {})
+        self.num_samples = 0
+
+        if os.path.isdir(self.tmp_dirname):
+            shutil.rmtree(self.tmp_dirname)
+        os.makedirs(self.tmp_dirname)
+        self.f_rss = open(os.path.join(self.tmp_dirname, 'rss.bin'), 'wb')
+        self.f_time = open(os.path.join(self.tmp_dirname, 'time.bin'), 'wb')
+
+    # Append a block of lines (lines x num_links) and their times (s)
+    def write(self, rss_block, times):
+        rss_block = np.ascontiguousarray(rss_block, dtype=np.int8)
+        self.f_rss.write(rss_block.tobytes())
+        self.f_time.write(np.ascontiguousarray(times, dtype=np.float64).tobytes())
+        self.num_samples += rss_block.shape[0]
+
+    # Write meta.json and move the directory in place
+    def close(self):
+        self.f_rss.close()
+        self.f_time.close()
+        self.meta['num_samples'] = self.num_samples
+        self.meta['num_links'] = self.num_links
+        f = open(os.path.join(self.tmp_dirname, 'meta.json'), 'w')
+        json.dump(self.meta, f, indent=1, sort_keys=True)
+        f.close()
+
+        if os.path.isdir(self.dirname):
+            shutil.rmtree(self.dirname)
+        os.rename(self.tmp_dirname, self.dirname)
+
+
+class BinarySession:
+    # Constructor:
+
+    # dirname - the session directory (<name>.rssd)
+
+    # meta - the contents of meta.json
+    # rss - memory-mapped int8 array, num_samples x num_links
+    # time - memory-mapped float64 array, num_samples
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.meta = read_meta(dirname)
+
+        self.num_samples = self.meta['num_samples']
+        self.num_links = self.meta['num_links']
+        if self.num_samples > 0:
+            self.rss = np.memmap(os.path.join(dirname, 'rss.bin'), dtype=np.int8, mode='r',
+                                 shape=(self.num_samples, self.num_links))
+            self.time = np.memmap(os.path.join(dirname, 'time.bin'), dtype=np.float64, mode='r',
+                                  shape=(self.num_samples,))
+        else:
+            self.rss = np.zeros((0, self.num_links), dtype=np.int8)
+            self.time = np.zeros(0)
+
+    # Return the index of the first sample at or after time t (s)
+    def index_for_time(self, t):
+        return int(np.searchsorted(self.time, t))
+
+    # Return (rss, times) for samples with t0 <= time < t1
+    def get_time_range(self, t0, t1):
+        i0 = self.index_for_time(t0)
+        i1 = self.index_for_time(t1)
+        return self.rss[i0:i1, :], self.time[i0:i1]
+
+    # Return (rss, times) for samples i0 <= sample < i1
+    def get_sample_range(self, i0, i1):
+        return self.rss[i0:i1, :], self.time[i0:i1]
+
+
+class ColumnSessionWriter:
+    # Constructor:
+
+    # dirname - the session directory to create (<name>.rssc).  It is written
+    #           as <dirname>.tmp and renamed when closed.
+    # num_links - number of links per line
+    # chunk_len - number of lines per chunk
+    # meta - a dict of extra metadata saved in meta.json
+
+    # buf - the lines of the chunk being filled, chunk_len x num_links
+    # buf_len - number of lines in buf
+    def __init__(self, dirname, num_links, chunk_len=DEFAULT_CHUNK_LEN, meta=None):
+        self.dirname = dirname
+        self.tmp_dirname = dirname + '.tmp'
+        self.num_links = num_links
+        self.chunk_len = chunk_len
+        self.meta = dict(meta or {})
+        self.num_samples = 0
+        self.num_chunks = 0
+
+        self.buf = np.zeros((chunk_len, num_links), dtype=np.int8)
+        self.buf_len = 0
+
+        if os.path.isdir(self.tmp_dirname):
+            shutil.rmtree(self.tmp_dirname)
+        os.makedirs(self.tmp_dirname)
+        self.f_rss = open(os.path.join(self.tmp_dirname, 'rss.bin'), 'wb')
+        self.f_time = open(os.path.join(self.tmp_dirname, 'time.bin'), 'wb')
+        self.f_summary = open(os.path.join(self.tmp_dirname, 'summary.bin'), 'wb')
+
+    # Append a block of lines (lines x num_links) and their times (s)
+    def write(self, rss_block, times):
+        rss_block = np.asarray(rss_block, dtype=np.int8)
+        self.f_time.write(np.ascontiguousarray(times, dtype=np.float64).tobytes())
+        self.num_samples += rss_block.shape[0]
+        start = 0
+        while start < rss_block.shape[0]:
+            num = min(self.chunk_len - self.buf_len, rss_block.shape[0] - start)
+            self.buf[self.buf_len:self.buf_len+num, :] = rss_block[start:start+num, :]
+            self.buf_len += num
+            start += num
+            if self.buf_len == self.chunk_len:
+                self.__write_chunk()
+
+    # Write the last chunk, meta.json and move the directory in place
+    def close(self):
+        if self.buf_len > 0:
+            self.buf[self.buf_len:, :] = 127
+            self.__write_chunk()
+        self.f_rss.close()
+        self.f_time.close()
+        self.f_summary.close()
+        self.meta['layout'] = COLUMN_LAYOUT
+        self.meta['num_samples'] = self.num_samples
+        self.meta['num_links'] = self.num_links
+        self.meta['chunk_len'] = self.chunk_len
+        self.meta['num_chunks'] = self.num_chunks
+        f = open(os.path.join(self.tmp_dirname, 'meta.json'), 'w')
+        json.dump(self.meta, f, indent=1, sort_keys=True)
+        f.close()
+
+        if os.path.isdir(self.dirname):
+            shutil.rmtree(self.dirname)
+        os.rename(self.tmp_dirname, self.dirname)
+
+    # Write buf link-major with its summary
+    def __write_chunk(self):
+        self.f_rss.write(np.ascontiguousarray(self.buf.T).tobytes())
+        heard = self.buf != 127
+        summary = np.zeros(self.num_links, dtype=SUMMARY_DTYPE)
+        summary['valid'] = heard.sum(axis=0)
+        summary['min'] = np.where(heard, self.buf, 127).min(axis=0)
+        summary['max'] = np.where(heard, self.buf, -128).max(axis=0)
+        summary['max'][summary['valid'] == 0] = 127
+        self.f_summary.write(summary.tobytes())
+        self.num_chunks += 1
+        self.buf_len = 0
+
+
+class ColumnSession:
+    # Constructor:
+
+    # dirname - the session directory (<name>.rssc)
+
+    # meta - the contents of meta.json
+    # rss - memory-mapped int8 array, num_chunks x num_links x chunk_len
+    # time - memory-mapped float64 array, num_samples
+    # summary - memory-mapped SUMMARY_DTYPE array, num_chunks x num_links
+    # link_ch_database - the (id, tx, rx, ch) of each link, from aNetwork.  ch
+    #                    is the position in the channel list, starting at 1.
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.meta = read_meta(dirname)
+
+        self.num_samples = self.meta['num_samples']
+        self.num_links = self.meta['num_links']
+        self.chunk_len = self.meta['chunk_len']
+        self.num_chunks = self.meta['num_chunks']
+        if self.num_chunks > 0:
+            self.rss = np.memmap(os.path.join(dirname, 'rss.bin'), dtype=np.int8, mode='r',
+                                 shape=(self.num_chunks, self.num_links, self.chunk_len))
+            self.time = np.memmap(os.path.join(dirname, 'time.bin'), dtype=np.float64, mode='r',
+                                  shape=(self.num_samples,))
+            self.summary = np.memmap(os.path.join(dirname, 'summary.bin'), dtype=SUMMARY_DTYPE, mode='r',
+                                     shape=(self.num_chunks, self.num_links))
+        else:
+            self.rss = np.zeros((0, self.num_links, self.chunk_len), dtype=np.int8)
+            self.time = np.zeros(0)
+            self.summary = np.zeros((0, self.num_links), dtype=SUMMARY_DTYPE)
+
+        self.channel_list = self.meta.get('channel_list')
+        self.num_nodes = self.meta.get('num_nodes')
+        self.link_ch_database = None
+        if self.num_nodes:
+            num_ch = self.num_links // (self.num_nodes*(self.num_nodes-1))
+            network = aNetwork.aNetwork(np.zeros((self.num_nodes, 2)), self.num_nodes, num_ch,
+                                        np.arange(1, self.num_nodes+1), np.arange(1, num_ch+1), 'a')
+            self.link_ch_database = network.link_ch_database
+
+    # Return the link id of (tx, rx, ch).  ch is a channel number from the
+    # channel list of the session, or the position in the channel list
+    # (starting at 1) when the session has none.
+    def link_id(self, tx, rx, ch):
+        if self.link_ch_database is None:
+            raise ValueError('the number of nodes of ' + self.dirname + ' is not known')
+        if self.channel_list:
+            ch = list(self.channel_list).index(ch) + 1
+        db = self.link_ch_database
+        found = np.nonzero((db[:, 1] == tx) & (db[:, 2] == rx) & (db[:, 3] == ch))[0]
+        if found.size == 0:
+            raise ValueError('no link tx=' + str(tx) + ' rx=' + str(rx) + ' ch=' + str(ch))
+        return int(db[found[0], 0])
+
+    # Return the index of the first sample at or after time t (s)
+    def index_for_time(self, t):
+        return int(np.searchsorted(self.time, t))
+
+    # Return (rss, times) of one link, given by (tx, rx, ch), for samples with
+    # t0 <= time < t1 (the whole session when t0/t1 are None).  rss is int8.
+    def get_link(self, tx, rx, ch, t0=None, t1=None):
+        rss_sel, times = self.get_links([self.link_id(tx, rx, ch)], t0, t1)
+        return rss_sel[:, 0], times
+
+    # Return (rss, times) of the links with ids link_ids for samples with
+    # t0 <= time < t1.  rss is samples x len(link_ids).  Only chunks that
+    # overlap the range and in which a link was heard are read.
+    def get_links(self, link_ids, t0=None, t1=None):
+        i0 = 0 if t0 is None else self.index_for_time(t0)
+        i1 = self.num_samples if t1 is None else self.index_for_time(t1)
+        return self.get_sample_range(link_ids, i0, i1)
+
+    # Return (rss, times) of the links with ids link_ids for samples
+    # i0 <= sample < i1, read as for get_links()
+    def get_sample_range(self, link_ids, i0, i1):
+        link_ids = np.asarray(link_ids, dtype=int)
+        i1 = min(i1, self.num_samples)
+        out = 127*np.ones((max(i1 - i0, 0), link_ids.size), dtype=np.int8)
+        for c in range(i0 // self.chunk_len, (i1 + self.chunk_len - 1) // self.chunk_len):
+            c0 = c*self.chunk_len
+            lo = max(i0 - c0, 0)
+            hi = min(i1 - c0, self.chunk_len)
+            heard = np.nonzero(self.summary['valid'][c, link_ids] > 0)[0]
+            if heard.size > 0:
+                out[c0+lo-i0:c0+hi-i0, heard] = self.rss[c][link_ids[heard], lo:hi].T
+        return out, np.asarray(self.time[i0:i1])
+
+    # Return (min, max, valid) of the links with ids link_ids over the chunks
+    # that overlap t0 <= time < t1, from the chunk summaries only.  min/max are
+    # 127 for links never heard (and for all links if the range is empty).
+    def get_summary(self, link_ids, t0=None, t1=None):
+        link_ids = np.asarray(link_ids, dtype=int)
+        i0 = 0 if t0 is None else self.index_for_time(t0)
+        i1 = self.num_samples if t1 is None else self.index_for_time(t1)
+        if i1 <= i0:
+            none_heard = 127*np.ones(link_ids.size, dtype=np.int8)
+            return none_heard, none_heard.copy(), np.zeros(link_ids.size, dtype=np.int64)
+        c0 = i0 // self.chunk_len
+        c1 = (i1 + self.chunk_len - 1) // self.chunk_len
+        summary = np.asarray(self.summary[c0:c1, :][:, link_ids])
+        valid = summary['valid'].sum(axis=0)
+        heard = summary['valid'] > 0
+        min_rss = np.where(heard, summary['min'], 127).min(axis=0, initial=127)
+        max_rss = np.where(heard, summary['max'], -128).max(axis=0, initial=-128)
+        max_rss[valid == 0] = 127
+        return min_rss.astype(np.int8), max_rss.astype(np.int8), valid
+
+
+# Return the contents of meta.json of a binary or columnar session
+def read_meta(dirname):
+    f = open(os.path.join(dirname, 'meta.json'), 'r')
+    meta = json.load(f)
+    f.close()
+    return meta
+
+# Return 1 if fname is a (row-major) binary session directory
+def is_binary_session(fname):
+    if not (os.path.isdir(fname) and os.path.isfile(os.path.join(fname, 'meta.json'))):
+        return 0
+    return int(read_meta(fname).get('layout') != COLUMN_LAYOUT)
+
+# Return 1 if fname is a columnar session directory
+def is_column_session(fname):
+    if not (os.path.isdir(fname) and os.path.isfile(os.path.join(fname, 'meta.json'))):
+        return 0
+    return int(read_meta(fname).get('layout') == COLUMN_LAYOUT)
+
+# Return the name of the binary session (or of the columnar session when ext
+# is COLUMN_EXT) for a text session in out_dir (the directory of the text
+# session if out_dir is None)
+def binary_name_for(fname, out_dir=None, ext=BINARY_EXT):
+    if out_dir is None:
+        out_dir = os.path.dirname(fname)
+    base = os.path.splitext(os.path.basename(fname))[0]
+    return os.path.join(out_dir, base + ext)
+
+# Return the name of the sidecar index of a text session
+def index_name_for(fname):
+    return fname + INDEX_EXT
+
+# Load the sidecar index of a text session.  Entries past the end of the file
+# (written before a crash lost the end of the data) are dropped.  Returns a
+# SessionIndex, or None if there is no index or it does not match the file
+# (its first entry is not at data_offset).
+def load_index(fname, data_offset=None):
+    idx_name = index_name_for(fname)
+    if not os.path.isfile(idx_name):
+        return None
+    f = open(idx_name, 'r')
+    first = f.readline()
+    rows = []
+    for line in f:
+        vals = line.split()
+        if len(vals) != 3:
+            continue
+        try:
+            rows.append((int(vals[0]), int(vals[1]), float(vals[2])))
+        except ValueError:
+            continue
+    f.close()
+    if not first.startswith(INDEX_PREFIX):
+        return None
+
+    size = os.path.getsize(fname)
+    rows = [row for row in rows if row[1] < size]
+    if len(rows) == 0 or (data_offset is not None and rows[0][1] != data_offset):
+        return None
+    samples, offsets, times = zip(*rows)
+    return SessionIndex(int(first[len(INDEX_PREFIX):]), samples, offsets, times)
+
+# Build the index of a text session in one pass over the file, and save it as
+# the sidecar index when save is 1.  If the index cannot be written (e.g. a
+# read-only share) a warning is printed and the index is only kept in memory.
+# Returns the SessionIndex.
+def build_index(fname, every=DEFAULT_INDEX_EVERY, chunk_bytes=8*1024*1024, save=1):
+    reader = TextSessionReader(fname, chunk_bytes)
+    samples = []
+    offsets = []
+    times = []
+    sample = 0
+    for rss_block, time_block, line_offsets in reader.iter_chunks_with_offsets():
+        pick = np.nonzero((sample + np.arange(time_block.size)) % every == 0)[0]
+        samples.append(sample + pick)
+        offsets.append(line_offsets[pick])
+        times.append(time_block[pick])
+        sample += time_block.size
+
+    if len(samples) > 0:
+        index = SessionIndex(every, np.concatenate(samples), np.concatenate(offsets), np.concatenate(times))
+    else:
+        index = SessionIndex(every, [], [], [])
+    if save:
+        try:
+            index.save(index_name_for(fname))
+        except (IOError, OSError) as e:
+            sys.stderr.write('Warning: could not save the index of ' + fname + ': ' + str(e) + '\n')
+            if os.path.isfile(index_name_for(fname) + '.tmp'):
+                os.remove(index_name_for(fname) + '.tmp')
+    return index
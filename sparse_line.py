@@ -0,0 +1,57 @@
+import struct
+import numpy as np
+
+##############################################
+# Functions for sparse lines of RSS
+#
+# A sparse line holds only the links heard since the previous line, as
+# <link>:<rss> pairs followed by the time stamp (a line with no link heard is
+# just the time stamp).  The binary form of a sparse line is a record of the
+# time (float64), the number of pairs (uint32), the link numbers (uint16) and
+# the RSS (int8), little-endian.
+#
+# These only need NumPy, so the real-time classes (RssEditor) can use them
+# without loading session_io.py.
+
+SPARSE_RECORD_FMT = '<dI'
+
+# Return 1 if line (a str) is a sparse line: it has <link>:<rss> pairs, or is
+# just a time stamp (no whitespace inside it).  A dense line is not split.
+def is_sparse_line(line):
+    return int(':' in line or ' ' not in line.strip())
+
+# Return the text of a sparse line for the heard links and their RSS
+def format_sparse_line(links, rss_vals, t):
+    pairs = ['%d:%d' % (link, val) for link, val in zip(np.asarray(links).tolist(), np.asarray(rss_vals).tolist())]
+    return ' '.join(pairs + [str(t)]) + '\n'
+
+# Parse a sparse line.  Returns (links, rss, t) with links int and rss float
+def parse_sparse_line(line):
+    tokens = line.split()
+    t = float(tokens.pop(-1))
+    if len(tokens) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0), t
+    pairs = np.array(':'.join(tokens).split(':'), dtype=float).reshape(-1, 2)
+    return pairs[:, 0].astype(int), pairs[:, 1], t
+
+# Return the binary record of a sparse line
+def pack_sparse_record(links, rss_vals, t):
+    links = np.asarray(links)
+    if links.size > 0 and links.max() > 65535:
+        raise ValueError('link numbers over 65535 do not fit a sparse record')
+    return (struct.pack(SPARSE_RECORD_FMT, t, links.size) + links.astype('<u2').tobytes() +
+            np.asarray(rss_vals, dtype=np.int8).tobytes())
+
+# Read one sparse record from the file f.  Returns (links, rss, t) with links
+# int and rss int8, or None at the end of the file.
+def read_sparse_record(f):
+    head = f.read(struct.calcsize(SPARSE_RECORD_FMT))
+    if len(head) < struct.calcsize(SPARSE_RECORD_FMT):
+        return None
+    t, num_pairs = struct.unpack(SPARSE_RECORD_FMT, head)
+    body = f.read(3*num_pairs)
+    if len(body) < 3*num_pairs:
+        return None
+    links = np.frombuffer(body, dtype='<u2', count=num_pairs).astype(int)
+    rss_vals = np.frombuffer(body, dtype=np.int8, offset=2*num_pairs)
+    return links, rss_vals, t
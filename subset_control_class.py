@@ -0,0 +1,119 @@
+import os
+import sys
+import numpy as np
+import rss as rss
+
+##############################################
+# A class for changing the network subset of a running listen script
+#
+# The node list, channel list and link order choice of a script are set when it
+# starts, so looking at other links meant a restart: the sniffer runs again and
+# the history of every link is lost.  This class watches a small control file.
+# When the file is written, the network is switched to the subset it names with
+# aNetwork.update_subset() and the remap() of every object holding per-link
+# state (RssEditor, MYPLOTTER, RssDetector, ChannelSelector) is called, so the
+# links that remain keep their history.  The control file holds one line
+#   NODES:CHANNELS[:ORDER]
+# e.g. "1,2,3:6,7" or "1,4:6,7,8:fb", with node ids and channels (positions in
+# the channel list) starting at 1, like node_list and ch_list in the scripts.
+# A file that is already there when the script starts is left alone.
+#
+# check() is meant to be added as the first consumer of an RssListener, so the
+# subset only changes between two lines.  It looks at the control file at most
+# once every check_period seconds, so the cost per line is one clock read.
+class SubsetControl:
+    # Constructor:
+
+    # network - the aNetwork whose subset is changed
+    # fname - the control file
+    # check_period - seconds between looks at the control file
+    # out - file the changes and errors are written to (stderr by default)
+
+    # consumers - objects with a remap(old_pos, new_pos) method, in calling order
+    # last_stat - (mtime, size) of the control file when it was last read
+    # next_check - monotonic time of the next look at the control file
+    def __init__(self, network, fname, check_period=1.0, out=None):
+        self.network = network
+        self.fname = fname
+        self.check_period = check_period
+        self.out = out
+
+        self.consumers = []
+        self.last_stat = self.__get_stat()
+        self.next_check = rss.monotonic_time() + check_period
+
+    ############
+    # Methods
+    ############
+
+    # Add an object whose remap(old_pos, new_pos) is called after every change
+    def add_consumer(self, consumer):
+        self.consumers.append(consumer)
+
+    # Apply the control file if it was written since it was last read.  The
+    # arguments are the (line, rx_time) of an RssListener consumer and are not
+    # used.  Returns 1 if the subset changed.
+    def check(self, line=None, rx_time=None):
+        now = rss.monotonic_time()
+        if now < self.next_check:
+            return 0
+        self.next_check = now + self.check_period
+        cur_stat = self.__get_stat()
+        if cur_stat is None or cur_stat == self.last_stat:
+            return 0
+        self.last_stat = cur_stat
+
+        try:
+            f = open(self.fname, 'r')
+            text = f.read()
+            f.close()
+            node_list, ch_list, link_order_choice = self.parse(text)
+        except (IOError, OSError, ValueError) as e:
+            self.__write('Subset not changed, ' + self.fname + ': ' + str(e) + '\n')
+            return 0
+        self.apply(node_list, ch_list, link_order_choice)
+        return 1
+
+    # Switch the network to node_list, ch_list and link_order_choice (None
+    # keeps the current one) and remap the consumers
+    def apply(self, node_list, ch_list, link_order_choice=None):
+        old_pos, new_pos = self.network.update_subset(node_list, ch_list, link_order_choice)
+        for consumer in self.consumers:
+            consumer.remap(old_pos, new_pos)
+        self.__write('Subset changed: nodes %s, channels %s, order %s (%d links, %d kept)\n' %
+                     (self.network.node_list.tolist(), self.network.ch_list.tolist(),
+                      self.network.link_order_choice, self.network.num_links_subset, new_pos.size))
+
+    # Return (node_list, ch_list, link_order_choice) from the text of a control
+    # file.  link_order_choice is None if the file does not give one.  Raises
+    # ValueError if the text does not name a valid subset of the network.
+    def parse(self, text):
+        fields = text.strip().split(':')
+        if len(fields) not in (2, 3):
+            raise ValueError('expected NODES:CHANNELS[:ORDER], not ' + repr(text.strip()))
+        node_list = np.array([int(n) for n in fields[0].split(',')])
+        ch_list = np.array([int(c) for c in fields[1].split(',')])
+        link_order_choice = fields[2].strip() if len(fields) == 3 else None
+
+        if (node_list.size < 2 or np.unique(node_list).size != node_list.size or
+                node_list.min() < 1 or node_list.max() > self.network.num_nodes_all):
+            raise ValueError('need at least two distinct node ids between 1 and ' + str(self.network.num_nodes_all))
+        if np.unique(ch_list).size != ch_list.size or ch_list.min() < 1 or ch_list.max() > self.network.num_ch_all:
+            raise ValueError('channels must be distinct and between 1 and ' + str(self.network.num_ch_all))
+        if link_order_choice is not None and link_order_choice not in ('f', 'b', 'fb', 'a'):
+            raise ValueError('link order must be f, b, fb or a, not ' + link_order_choice)
+        return node_list, ch_list, link_order_choice
+
+    # Return (mtime, size) of the control file, or None if there is none
+    def __get_stat(self):
+        try:
+            st = os.stat(self.fname)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def __write(self, text):
+        if self.out is None:
+            sys.stderr.write(text)
+        else:
+            self.out.write(text)
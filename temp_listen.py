@@ -1,9 +1,13 @@
-import time
 import datetime
 import serial
 import sys
 import platform
 import glob
+import rss as rss
+import latency_class as aLatency
+import metrics_class as aMetrics
+import listener_class as aListener
+import formatter_class as aFormatter
 
 ################################
 # This class is responsible for reading in a new line 
@@ -18,6 +22,7 @@ class rss_measurement():
         self.f_out = None
         self.bbb_id = 'id1'
         self.__init_ser()
+        self.__init_metrics()
         
     # Initialize serial
     def __init_ser(self):    
@@ -32,33 +37,9 @@ class rss_measurement():
         
         self.ser = serial.Serial(serial_filename,38400)
         
-    # Get previous channel
-    def __prevChannel(self,channelList,ch_now):
-        if (channelList.count(ch_now) > 0):
-            i = channelList.index(ch_now)
-            rval = channelList[(i-1) % len(channelList)]
-        else:
-            rval = -1  # Key for bad ch_now input
-        return rval
-    
-    # Hex to signed int
-    def __hex2signedint(self,he):
-        # Convert from hexidecimal 2's complement to signed 8 bit integer
-        return (int(he,16) + 2**7) % 2**8 - 2**7
-    
-    # Get the link number for a given tx, rx, ch
-    def __linkNumForTxRxChLists(self,tx, rx, ch, nodeList, channelList):
-        if (nodeList.count(tx) == 0) or (nodeList.count(rx) == 0) or (channelList.count(ch) == 0):
-            sys.stderr.write('Error in linkNumForTxRx: tx, rx, or ch number invalid')
-        rx_enum = nodeList.index(rx)
-        tx_enum = nodeList.index(tx)
-        ch_enum = channelList.index(ch)
-        nodes = len(nodeList)
-        links = nodes*(nodes-1)
-        linknum = ch_enum*links + tx_enum*(nodes-1) + rx_enum
-        if (rx_enum > tx_enum):
-            linknum -= 1
-        return linknum
+    # Initialize the runtime counters updated by the listener in observe()
+    def __init_metrics(self):
+        self.metrics = aMetrics.add_acquisition_metrics()
         
     # Get the next file number
     def __get_next_file_name(self):
@@ -119,98 +100,37 @@ class rss_measurement():
         # USER:  THIS SHOULD NOT BE CHANGED, IT IS 6 FOR ALL GROUPS IN OUR CLASS
         maxNodes      = 2
         
-        # Parameters that are due to our implementation of the listen node.
-        startTime     = time.time()
-        numNodes      = len(nodeList)
-        numChs        = len(channelList)
-        numLinks      = numNodes*(numNodes-1)*numChs
-        rssIndex      = 3
-        string_length = maxNodes + 7
-        suffix        = ['ef','be']  # "0xBEEF"
-        
-        # Initialize data, output file
-        nodeSet       = set(nodeList)
-        channelSet    = set(channelList)
-        currentLine   = []  # Init serial data buffer "currentLine" as empty.
-        currentLinkRSS = [127] * numLinks
-        
-        # Find the last file number, and add one
-#         self.fname = self.__get_next_file_name()
-#         self.f_out = open(self.fname,'w')
-        
-        # Put in a header line
-#         first_line = 'Started at: ' + str(datetime.datetime.now()) + '\n'
-#         self.f_out.write(first_line)
-        
-        # Run forever, adding one integer at a time from the serial port, 
-        #   whenever an integer is available.
-        while(1):
-            
-            tempInt = self.ser.read().encode('hex')
-            currentLine.append(tempInt)
-        
-            # Whenever the end-of-line sequence is read, operate on the "packet" of data.
-            if currentLine[-2:] == suffix:
-                if len(currentLine) != string_length:
-                    sys.stderr.write('packet corrupted - wrong string length\n')
-                    del currentLine[:]
-                    continue
-                currentLineInt = [int(x, 16) for x in currentLine]
-                rxId = currentLineInt[2]
-                currentCh = currentLineInt[-4]
-                #print [currentLineInt[0:3], [hex2signedint(he) for he in currentLine[3:9]], currentLineInt[9:]]
-                #print rxId
-                if (rxId not in nodeSet) or (currentCh not in channelSet):
-                    del currentLine[:]
-                    continue
-                timeStampSec = time.time()
-                            
-                
-                # Each line in the serial data has RSS values for multiple txids.
-                # Output one line per txid, rxid, ch combo.
-                for txId in nodeList:
-                    # If the rxId is after the txId, then no problem -- currentCh
-                    # is also the channel that node txId was transmitting on when
-                    # node rxId made the measurement, because nodes transmit on a
-                    # channel in increasing order.
-                    if rxId > txId: 
-                        ch = currentCh
-                    else: 
-                        ch = self.__prevChannel(channelList, currentCh)
-                    
-                    # If the link (tx, rx, ch) is one we are supposed to watch
-                    if txId != rxId:  
-                        i = self.__linkNumForTxRxChLists(txId, rxId, ch, nodeList, channelList)
-                        
-                        # If the RSS has already been recorded for this link on 
-                        # this "line", then output the line first, and then restart 
-                        # with a new line.
-                        if currentLinkRSS[i] < 127:
-                            # Calc time in ms since start of script
-                            timeDiff_ms = int((time.time() - startTime)*1000)
-                            # Calc the ADC value of RIP belts
-                            
-                            # Output currentLinkRSS vector
-                            sys.stdout.write(' '.join(map(str,currentLinkRSS)) + ' ' + str(timeDiff_ms) + '\n')
-                            sys.stdout.flush()
-                            
-                            # Write to file
-#                             self.f_out.write(' '.join(map(str,currentLinkRSS)) + ' ' + str(timeDiff_ms) + '\n')
-                            
-                            # If the button has been pressed, close the file and
-                            # get out of observe.
-#                             if not self.start_stop_obj.is_listen_state_on():
-#                                 self.f_out.close()
-#                                 return 0
-                            
-                            # Restart with a new line by resetting currentLinkRSS
-                            currentLinkRSS = [127] * numLinks
-                        
-                        # Store the RSS 
-                        currentLinkRSS[i] = self.__hex2signedint(currentLine[rssIndex+txId-1])
-        
-                # Remove serial data from the buffer.
-                currentLine = []
+        # Times are written in ms since the start of the recording
+        startTime     = rss.monotonic_time()
+        
+        # The listener reads the serial port in bulk, finds and stamps the frames
+        # (with the estimated monotonic time their last byte was received),
+        # decodes them into lines of RSS and hands each line to write_line().
+        # A line is stamped with the receive time of its newest frame.
+        listener      = aListener.RssListener(self.ser, maxNodes, nodeList, channelList, self.metrics)
+        
+        # Lines are made from a table of the text of every int8 RSS and written
+        # in batches.  The flush thread checks every 12.5 ms, so a line reaches
+        # stdout at most about 62.5 ms after it was made, also when no more
+        # data comes in.
+        formatter     = aFormatter.RssLineFormatter(listener.num_links)
+        writer        = aFormatter.BufferedLineWriter(sys.stdout, 0.05)
+        writer.start_flush_thread()
+        
+        # Output the currentLinkRSS vector with the time in ms since the start
+        # of the script
+        def write_line(line, lineNewestRxTime):
+            timeDiff_ms = int((lineNewestRxTime - startTime)*1000)
+            writer.write(formatter.format_line(line, timeDiff_ms))
+        listener.add_consumer(write_line, 'writer')
+        listener.add_idle_callback(writer.flush_if_due)
+        
+        # Run forever, writing lines whenever bytes are available
+        try:
+            listener.run()
+        finally:
+            writer.flush()
+        
 
 
 ################################
@@ -219,6 +139,13 @@ class rss_measurement():
 # Create start-stop object
 my_rss_measurement_obj = rss_measurement()
 
+# Print the latency histograms on SIGUSR2
+aLatency.install_dump_signal()
+
+# Print a metrics summary periodically and serve the metrics on localhost
+aMetrics.get_registry().start_summary_thread(10.0)
+aMetrics.get_registry().start_http_server(9110)
+
 
 # Loop forever
 while True: